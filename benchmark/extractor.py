@@ -0,0 +1,93 @@
+"""
+fixture 페이지에서 같은 schema 로 BeautifulSoup(SoupExtractor) 과 lxml(LxmlExtractor) 이 파싱한 트리의 추출 결과가 같은지 확인하고,
+페이지당 파싱 시간을 비교한다
+결과가 다른 페이지가 있으면 exit code 1 로 종료한다
+
+python -m benchmark.extractor --repeat 50
+"""
+import os
+import sys
+import time
+import argparse
+
+from danawa import spec
+from danawa.extractor import EXTRACTORS
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# (이름, fixture 파일, extractor method, page type)
+PAGES = [
+    ('search', 'search.html', 'search_page', 'search'),
+    ('product', 'product.html', 'product_page', 'product'),
+    ('review_counts', 'danawa_review.html', 'review_counts', 'danawa_review'),
+    ('danawa_review', 'danawa_review.html', 'danawa_review', 'danawa_review'),
+    ('danawa_review_empty', 'danawa_review_empty.html', 'danawa_review', 'danawa_review'),
+    ('mall_review', 'mall_review.html', 'mall_review', 'mall_review')
+]
+
+
+def fixture(filename: str) -> bytes:
+    with open(os.path.join(FIXTURE_DIR, filename), 'rb') as f:
+        return f.read()
+
+
+def extract(extractor, method: str, content: bytes, page: str = None):
+    return getattr(extractor, method)(extractor.document(content, page))
+
+
+def measure(extractor, method: str, content: bytes, repeat: int, page: str = None) -> float:
+    """
+    페이지 하나를 파싱하고 값을 추출하는 평균 시간(ms)을 반환한다
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        extract(extractor, method, content, page)
+
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(repeat: int) -> bool:
+    baseline = EXTRACTORS['bs4']()
+    candidates = [extractor() for name, extractor in EXTRACTORS.items() if name != 'bs4']
+
+    matched = True
+    for name, filename, method, _ in PAGES:
+        content = fixture(filename)
+        expected = extract(baseline, method, content)
+        baseline_ms = measure(baseline, method, content, repeat)
+
+        for candidate in candidates:
+            result = extract(candidate, method, content)
+            if result != expected:
+                matched = False
+                print(f'{name:<20} | {candidate.name:<5} | MISMATCH\n  bs4: {expected}\n  {candidate.name}: {result}')
+                continue
+
+            candidate_ms = measure(candidate, method, content, repeat)
+            print(f'{name:<20} | {candidate.name:<5} | parity ok | bs4: {baseline_ms:8.3f}ms'
+                  f' | {candidate.name}: {candidate_ms:8.3f}ms | speedup: {baseline_ms / candidate_ms:5.1f}x')
+
+    return matched
+
+
+def print_field_stats() -> None:
+    """
+    lxml schema 의 field 별 평균 추출 시간과 miss 수를 출력한다
+    """
+    for schema, field, calls, misses, average_ms in spec.field_stats.snapshot():
+        print(f'{schema + "." + field:<45} | calls: {calls:6} | misses: {misses:6} | avg: {average_ms * 1000:7.2f}us')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--fields', action='store_true', help='field 별 추출 시간과 miss 수를 출력한다')
+    args = parser.parse_args()
+
+    # 반복 측정 중에 field 통계가 초기화되지 않도록 한다
+    spec.field_stats.settings = dict(spec.field_stats.settings, STATS_LOG_INTERVAL=float('inf'))
+    parity = run(args.repeat)
+    if args.fields:
+        print_field_stats()
+
+    sys.exit(0 if parity else 1)
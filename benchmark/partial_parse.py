@@ -0,0 +1,72 @@
+"""
+page type 별로 전체 파싱과 부분 파싱(config.PARSER['PARTIAL'])의 추출 결과가 같은지 확인하고,
+페이지당 파싱 시간과 메모리를 비교한다. 결과가 다른 페이지가 있으면 exit code 1 로 종료한다
+
+lxml 트리는 C 에서 할당되어 tracemalloc 으로 측정되지 않으므로, 파싱한 HTML 크기와 요소 수를 함께 출력한다
+
+python -m benchmark.partial_parse --repeat 50
+"""
+import sys
+import argparse
+import tracemalloc
+
+from benchmark.extractor import PAGES, fixture, extract, measure
+from danawa.extractor import EXTRACTORS, decode, partial_markup
+
+
+def element_count(document) -> int:
+    if hasattr(document, 'find_all'):
+        return len(document.find_all(True))
+
+    return sum(1 for _ in document.iter())
+
+
+def peak_memory(extractor, content: bytes, page: str = None) -> float:
+    """
+    파싱한 트리를 유지하는 동안의 최대 Python 메모리 할당량(KB)을 반환한다
+    """
+    tracemalloc.start()
+    document = extractor.document(content, page)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del document
+
+    return peak / 1024
+
+
+def run(repeat: int) -> bool:
+    matched = True
+    for extractor_class in EXTRACTORS.values():
+        extractor = extractor_class()
+        for name, filename, method, page in PAGES:
+            content = fixture(filename)
+            expected = extract(extractor, method, content)
+            result = extract(extractor, method, content, page)
+            if result != expected:
+                matched = False
+                print(f'{extractor.name:<5} | {name:<20} | MISMATCH\n  full: {expected}\n  partial: {result}')
+                continue
+
+            markup = partial_markup(decode(content), page)
+            markup_size = len(markup) if markup is not None else len(decode(content))
+            full_ms = measure(extractor, method, content, repeat)
+            partial_ms = measure(extractor, method, content, repeat, page)
+            full_kb = peak_memory(extractor, content)
+            partial_kb = peak_memory(extractor, content, page)
+
+            print(f'{extractor.name:<5} | {name:<20} | parity ok'
+                  f' | time: {full_ms:8.3f}ms -> {partial_ms:8.3f}ms ({1 - partial_ms / full_ms:6.1%} saved)'
+                  f' | memory: {full_kb:8.1f}KB -> {partial_kb:8.1f}KB'
+                  f' | html: {len(decode(content)):6} -> {markup_size:6} chars'
+                  f' | elements: {element_count(extractor.document(content)):5}'
+                  f' -> {element_count(extractor.document(content, page)):5}')
+
+    return matched
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    sys.exit(0 if run(args.repeat) else 1)
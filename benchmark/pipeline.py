@@ -0,0 +1,388 @@
+"""
+stand-in 서버를 대상으로 검색 -> enqueue -> 상품 -> 리뷰 전체 pipeline 을 실행하여 처리량을 측정한다
+검색은 main.main 으로, Queue 의 job 은 같은 프로세스의 rq SimpleWorker 로 모두 처리할 때까지 실행한다
+Redis, MongoDB 는 --redis-url, --mongo-url 로 로컬 서버를 지정하거나, 지정하지 않으면 fakeredis, mongomock 을 사용한다
+
+python -m benchmark.pipeline --keywords 2 --latency 0.01 --items 30 --error-rate 0.02
+python -m benchmark.pipeline --recrawl
+"""
+import sys
+import time
+import logging
+import resource
+import argparse
+import functools
+
+from benchmark import standin
+
+import config
+
+# 횟수를 세는 MongoDB 명령
+MONGO_OPERATIONS = {'find', 'find_one', 'insert_one', 'insert_many', 'update_one', 'update_many', 'replace_one',
+                    'bulk_write', 'count_documents', 'delete_one', 'delete_many', 'create_index',
+                    'find_one_and_update', 'aggregate'}
+# 반환값도 횟수를 세도록 감싸는 method
+MONGO_CHILDREN = {'get_database', 'get_collection', 'with_options'}
+BLANK_NAME = 'benchmark'
+# 파싱 시간을 측정하는 extractor method
+PARSE_METHODS = ('document', 'search_page', 'product_page', 'review_counts', 'danawa_review', 'mall_review')
+
+
+class Counter:
+    def __init__(self):
+        self.counts = {}
+
+    def add(self, name: str, value: int = 1) -> None:
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def get(self, name: str) -> int:
+        return self.counts.get(name, 0)
+
+
+class CountingMongo:
+    """
+    MongoClient, Database, Collection 을 감싸 MONGO_OPERATIONS 호출 횟수를 센다
+    설정에서 비워둔 database, collection 이름은 MongoDB 에서 사용할 수 없으므로 BLANK_NAME 으로 바꾼다
+    """
+    def __init__(self, target, counter: Counter):
+        self._target = target
+        self._counter = counter
+
+    def __getitem__(self, name):
+        return CountingMongo(self._target[name or BLANK_NAME], self._counter)
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if name in MONGO_OPERATIONS:
+            @functools.wraps(value)
+            def counted(*args, **kwargs):
+                self._counter.add('mongo')
+                return value(*args, **kwargs)
+
+            return counted
+
+        if name in MONGO_CHILDREN:
+            return lambda *args, **kwargs: CountingMongo(value(*args, **kwargs), self._counter)
+
+        return value
+
+
+def count_redis(client, counter: Counter, name: str):
+    """
+    Redis 명령과 pipeline 실행 횟수를 센다. pipeline 은 한번의 왕복이므로 1 번으로 센다
+    """
+    execute_command = client.execute_command
+    pipeline = client.pipeline
+
+    def counted_command(*args, **kwargs):
+        counter.add(name)
+        return execute_command(*args, **kwargs)
+
+    def counted_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        def counted_execute(*execute_args, **execute_kwargs):
+            counter.add(name)
+            return execute(*execute_args, **execute_kwargs)
+
+        pipe.execute = counted_execute
+        return pipe
+
+    client.execute_command = counted_command
+    client.pipeline = counted_pipeline
+
+    return client
+
+
+class ParseTimer:
+    """
+    extractor 의 파싱, 추출 시간과 파싱한 페이지 수를 기록한다
+    """
+    def __init__(self):
+        self.seconds = 0.0
+        self.pages = 0
+
+    def wrap(self, owner, name: str, page: bool = False) -> None:
+        attribute = owner.__dict__[name]
+        is_static = isinstance(attribute, staticmethod)
+        func = attribute.__func__ if is_static else attribute
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.seconds += time.perf_counter() - start
+                self.pages += page
+
+        setattr(owner, name, staticmethod(timed) if is_static else timed)
+
+    def stream(self, stream_reviews):
+        """
+        worker.stream_reviews 를 감싸, 응답을 기다린 시간을 제외한 스트리밍 파싱 시간을 기록한다
+        """
+        timer = self
+
+        class TimedStream:
+            def __init__(self, response, page, chunk_size, tee=None):
+                self.waited = 0.0
+                self.stream = stream_reviews(self._Response(self, response), page, chunk_size, tee)
+
+            class _Response:
+                def __init__(self, owner, response):
+                    self.owner = owner
+                    self.response = response
+
+                def __getattr__(self, name):
+                    # headers, encoding 등은 원래 응답의 값을 사용한다
+                    return getattr(self.response, name)
+
+                def iter_content(self, chunk_size):
+                    chunks = self.response.iter_content(chunk_size=chunk_size)
+                    while True:
+                        start = time.perf_counter()
+                        chunk = next(chunks, None)
+                        self.owner.waited += time.perf_counter() - start
+                        if chunk is None:
+                            return
+                        yield chunk
+
+            @property
+            def empty(self):
+                return self.stream.empty
+
+            @property
+            def seconds(self):
+                return self.stream.seconds
+
+            def __iter__(self):
+                comments = iter(self.stream)
+                timer.pages += 1
+                while True:
+                    start = time.perf_counter()
+                    waited = self.waited
+                    try:
+                        comment = next(comments)
+                    except StopIteration:
+                        return
+                    finally:
+                        timer.seconds += time.perf_counter() - start - (self.waited - waited)
+
+                    yield comment
+
+        return TimedStream
+
+
+def connect(args: argparse.Namespace, counter: Counter) -> tuple:
+    """
+    (앱이 사용하는 Redis, rq 가 사용하는 Redis, MongoClient)를 생성한다
+    """
+    if args.redis_url:
+        from redis import Redis
+        redis = Redis.from_url(args.redis_url, decode_responses=True)
+        rq_redis = Redis.from_url(args.redis_url)
+        if args.flush:
+            redis.flushdb()
+    else:
+        try:
+            import fakeredis
+        except ImportError:
+            sys.exit('--redis-url 을 지정하거나 fakeredis 를 설치해야 합니다')
+        server = fakeredis.FakeServer()
+        redis = fakeredis.FakeStrictRedis(server=server, decode_responses=True)
+        rq_redis = fakeredis.FakeStrictRedis(server=server)
+        # fakeredis 는 rq 가 job 결과를 저장하는 XADD MAXLEN ~ 를 지원하지 않으므로, stream 이 없는 Redis 로 알린다
+        setattr(rq_redis, '__rq_redis_server_version', (4, 0, 0))
+
+    if args.mongo_url:
+        from pymongo import MongoClient
+        mongo = MongoClient(args.mongo_url)
+        if args.flush:
+            mongo.drop_database(config.MONGODB['COLLECTION'] or BLANK_NAME)
+    else:
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit('--mongo-url 을 지정하거나 mongomock 을 설치해야 합니다')
+        mongo = mongomock.MongoClient()
+
+    return count_redis(redis, counter, 'redis'), count_redis(rq_redis, counter, 'rq'), CountingMongo(mongo, counter)
+
+
+def configure(server: standin.StandIn) -> None:
+    """
+    모든 요청이 stand-in 서버로 가도록 설정하고, 요청 한도와 리뷰 페이지 지연을 없앤다
+    """
+    config.URL.update(server.urls())
+    config.PROXY['API_URL'] = server.proxy_api_url()
+    config.RATE_LIMIT.update(HOST_RATE=1000000, HOST_BURST=1000000, PROXY_RATE=1000000, PROXY_BURST=1000000)
+    config.SCHEDULE['REVIEW_PAGE_DELAY'] = 0
+
+
+def archive_pages(path: str) -> None:
+    """
+    모든 page type 의 응답 원문을 path 에 보관한다
+    """
+    config.ARCHIVE.update(PAGES=('product', 'danawa_review', 'mall_review'), PATH=path)
+
+
+def recrawl(redis) -> None:
+    """
+    크롤링한 상품의 재방문 시간을 지금으로 바꾸고 dedupe Bloom filter 를 비워, 모든 상품 페이지를 다시 요청하도록 한다
+    """
+    from utils.dedupe import ProductDedupe
+    from utils.revisit import RevisitScheduler
+
+    due = {pcode: 0 for pcode in redis.zrange(RevisitScheduler.queue_key, 0, -1)}
+    if due:
+        redis.zadd(RevisitScheduler.queue_key, due)
+    for key in redis.scan_iter(ProductDedupe.bloom_key.format(bucket='*')):
+        redis.delete(key)
+
+
+def drain(rq_redis) -> tuple:
+    """
+    예약된 job 을 Queue 로 옮기고 Queue 가 빌 때까지 job 을 처리한다. (처리한 job 수, 실패한 job 수)를 반환한다
+    """
+    from rq import Queue, SimpleWorker
+    from rq.registry import FailedJobRegistry, FinishedJobRegistry
+    from rq_scheduler import Scheduler
+
+    queues = [Queue('high', connection=rq_redis), Queue('low', connection=rq_redis)]
+    scheduler = Scheduler(connection=rq_redis)
+
+    while True:
+        scheduler.enqueue_jobs()
+        if not any(len(queue) for queue in queues):
+            if not scheduler.count():
+                break
+            time.sleep(0.01)
+            continue
+
+        SimpleWorker(queues, connection=rq_redis).work(burst=True, logging_level='WARNING')
+
+    finished = sum(len(FinishedJobRegistry(queue=queue)) for queue in queues)
+    failed = sum(len(FailedJobRegistry(queue=queue)) for queue in queues)
+
+    return finished + failed, failed
+
+
+def run(args: argparse.Namespace) -> None:
+    counter = Counter()
+    redis, rq_redis, mongo = connect(args, counter)
+
+    from connector.connector import registry, ensure_indexes
+    registry.clients['redis'] = redis
+    registry.clients['mongo'] = mongo
+    registry.persistent = True
+
+    server = standin.StandIn(standin.settings_from(args)).start()
+    configure(server)
+    if args.archive:
+        archive_pages(args.archive)
+
+    from rq import Connection
+    with Connection(rq_redis):
+        import main
+        import worker
+    from connector.sink import product_sink
+    from danawa.crawler import DanawaCrawler
+    from danawa.extractor import EXTRACTORS
+
+    timer = ParseTimer()
+    for extractor_class in EXTRACTORS.values():
+        for name in PARSE_METHODS:
+            timer.wrap(extractor_class, name, page=name == 'document')
+    timer.wrap(DanawaCrawler, 'parsed_html_script')
+    worker.stream_reviews = timer.stream(worker.stream_reviews)
+
+    ensure_indexes()
+    counter.counts = {}
+
+    start = time.time()
+    for index in range(args.keywords):
+        main.main(f'keyword{index}')
+    search_seconds = time.time() - start
+
+    with Connection(rq_redis):
+        processed, failed = drain(rq_redis)
+    product_sink().flush()
+    elapsed = time.time() - start
+
+    report(server.stats, counter, timer, processed, failed, search_seconds, elapsed)
+
+    if args.recrawl:
+        # 가격정보가 바뀌지 않은 상품을 다시 크롤링하는 재방문 pass 만 따로 측정한다
+        from utils.metrics import metrics
+        server.stats.clear()
+        counter.counts = {}
+        timer.seconds, timer.pages = 0.0, 0
+        metrics().histograms.clear()
+        metrics().counters.clear()
+
+        recrawl(redis)
+        start = time.time()
+        main.revisit_dispatch()
+        dispatch_seconds = time.time() - start
+        with Connection(rq_redis):
+            total_processed, total_failed = drain(rq_redis)
+        product_sink().flush()
+        elapsed = time.time() - start
+
+        print('\nrecrawl:')
+        report(server.stats, counter, timer, total_processed - processed, total_failed - failed,
+               dispatch_seconds, elapsed)
+
+    server.stop()
+
+
+def report(stats: dict, counter: Counter, timer: ParseTimer, processed: int, failed: int,
+           search_seconds: float, elapsed: float) -> None:
+    requests = sum(stat['requests'] for stat in stats.values())
+    products = max(stats.get('product', {}).get('requests', 0) - stats.get('product', {}).get('errors', 0), 1)
+
+    print(f'elapsed: {elapsed:.2f}s (search: {search_seconds:.2f}s) | jobs: {processed} | failed jobs: {failed}')
+    for endpoint, stat in sorted(stats.items()):
+        print(f'  {endpoint:<20} | requests: {stat["requests"]:6} | errors: {stat["errors"]:5}'
+              f' | {stat["bytes"] / 1024:9.1f}KB')
+    print(f'pages/sec: {requests / elapsed:.1f} | parse: {timer.seconds / max(timer.pages, 1) * 1000:.2f}ms/page'
+          f' ({timer.pages} pages)')
+    print(f'per product({products}): mongo ops: {counter.get("mongo") / products:.2f}'
+          f' | redis ops: {counter.get("redis") / products:.2f} | rq redis ops: {counter.get("rq") / products:.2f}')
+    print(f'peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f}MB')
+
+    from utils.metrics import metrics
+    stages = {}
+    for name, labels, count, total in metrics().snapshot():
+        label = labels.get('endpoint') or labels.get('page') or labels.get('target') or labels.get('func') or ''
+        stage = stages.setdefault((name, label), [0, 0.0])
+        stage[0] += count
+        stage[1] += total
+    for (name, label), (count, total) in sorted(stages.items()):
+        print(f'  {name:<16} {label:<28} | count: {count:6} | total: {total:8.2f}s | avg: {total / count * 1000:8.2f}ms')
+
+    changes = {name: value for (name, _), value in metrics().counters.items()
+               if name in ('products_changed', 'products_unchanged', 'product_writes_skipped',
+                           'review_jobs_skipped', 'reviews_unchanged')}
+    if changes:
+        print('  ' + ' | '.join(f'{name}: {value}' for name, value in sorted(changes.items())))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    standin.settings_arguments(parser)
+    parser.add_argument('--keywords', type=int, default=2, help='검색할 키워드 수')
+    parser.add_argument('--redis-url', help='로컬 Redis(eg. redis://localhost:6379/15), 없으면 fakeredis')
+    parser.add_argument('--mongo-url', help='로컬 MongoDB(eg. mongodb://localhost:27017), 없으면 mongomock')
+    parser.add_argument('--flush', action='store_true', help='실행 전에 Redis db 와 MongoDB database 를 비운다')
+    parser.add_argument('--archive', help='응답 원문을 보관할 디렉터리, 없으면 보관하지 않는다')
+    parser.add_argument('--recrawl', action='store_true', help='모든 상품을 한번 더 크롤링하는 재방문 pass 를 측정한다')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    run(args)
@@ -0,0 +1,110 @@
+"""
+리뷰 페이지의 댓글 수를 늘려가며, 전체 트리 파싱(LxmlExtractor)과 스트리밍 파싱(ReviewStream)의
+결과가 같은지 확인하고 시간과 peak RSS 를 비교한다
+libxml2 의 메모리는 tracemalloc 으로 측정되지 않으므로, 경우마다 새 프로세스에서 파싱하고 RSS 증가량을 측정한다
+결과가 다른 페이지가 있으면 exit code 1 로 종료한다
+
+python -m benchmark.review_stream --comments 10 1000 10000
+"""
+import re
+import sys
+import time
+import resource
+import argparse
+import multiprocessing
+
+from benchmark.extractor import fixture
+from danawa.extractor import EXTRACTORS
+from danawa.stream import ReviewStream
+
+# (page type, fixture 파일, LxmlExtractor method)
+PAGES = [
+    ('danawa_review', 'danawa_review.html', 'danawa_review'),
+    ('mall_review', 'mall_review.html', 'mall_review')
+]
+COMMENT_PATTERN = re.compile(rb'<li class="danawa-prodBlog.*?</li>', re.S)
+CHUNK_SIZE = 16384
+
+
+def review_page(filename: str, comments: int) -> bytes:
+    """
+    fixture 의 댓글 li 를 반복하여 댓글이 comments 개인 페이지를 만든다
+    """
+    content = fixture(filename)
+    items = COMMENT_PATTERN.findall(content)
+    start = content.index(items[0])
+    end = content.index(items[-1]) + len(items[-1])
+
+    # 댓글마다 id 와 내용이 달라지도록 번호를 바꾼다
+    repeated = b''.join(re.sub(rb'-(\d+)"', f'-{index}"'.encode(), items[index % len(items)])
+                        for index in range(comments))
+
+    return content[:start] + repeated + content[end:]
+
+
+def chunks(content: bytes):
+    for index in range(0, len(content), CHUNK_SIZE):
+        yield content[index:index + CHUNK_SIZE]
+
+
+def parse(mode: str, page: str, method: str, content: bytes) -> list:
+    if mode == 'stream':
+        return list(ReviewStream(chunks(content), page))
+
+    extractor = EXTRACTORS['lxml']()
+
+    return getattr(extractor, method)(extractor.document(content, page))
+
+
+def _measure(mode: str, page: str, method: str, content: bytes, queue) -> None:
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if mode == 'stream':
+        # worker 처럼 댓글을 모아두지 않고 읽은 만큼 버린다
+        count = sum(1 for _ in ReviewStream(chunks(content), page))
+    else:
+        count = len(parse(mode, page, method, content))
+    elapsed = (time.perf_counter() - start) * 1000
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    queue.put((elapsed, (after - before) / 1024, count))
+
+
+def measure(mode: str, page: str, method: str, content: bytes) -> tuple:
+    """
+    새 프로세스에서 페이지를 파싱하여 (시간(ms), peak RSS 증가량(MB), 댓글 수)를 반환한다
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_measure, args=(mode, page, method, content, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+
+    return result
+
+
+def run(comment_counts: list) -> bool:
+    matched = True
+    for page, filename, method in PAGES:
+        for comments in comment_counts:
+            content = review_page(filename, comments)
+            expected = parse('tree', page, method, content)
+            if parse('stream', page, method, content) != expected:
+                matched = False
+                print(f'{page:<15} | comments: {comments:6} | MISMATCH')
+                continue
+
+            tree_ms, tree_mb, _ = measure('tree', page, method, content)
+            stream_ms, stream_mb, _ = measure('stream', page, method, content)
+            print(f'{page:<15} | comments: {len(expected):6} | html: {len(content) / 1024:9.1f}KB | parity ok'
+                  f' | tree: {tree_ms:8.1f}ms {tree_mb:7.1f}MB | stream: {stream_ms:8.1f}ms {stream_mb:7.1f}MB')
+
+    return matched
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--comments', type=int, nargs='+', default=[10, 1000, 10000])
+    args = parser.parse_args()
+
+    sys.exit(0 if run(args.comments) else 1)
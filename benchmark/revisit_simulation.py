@@ -0,0 +1,136 @@
+"""
+가격 변경 이력을 합성하여 고정 주기 재방문과 RevisitScheduler 의 적응형 재방문을 비교한다
+
+python -m benchmark.revisit_simulation --products 2000 --days 60
+"""
+import math
+import bisect
+import random
+import argparse
+
+import config
+from utils.revisit import next_interval
+
+
+def change_history(rate: float, horizon: float, rng: random.Random) -> list:
+    """
+    시간당 rate 번 바뀌는 상품의 변경 시각 목록을 Poisson process 로 생성한다
+    """
+    changes = []
+    t = rng.expovariate(rate)
+    while t < horizon:
+        changes.append(t)
+        t += rng.expovariate(rate)
+
+    return changes
+
+
+def simulate(changes: list, horizon: float, interval_policy) -> tuple:
+    """
+    재방문 정책으로 크롤링했을 때 크롤링 횟수와 저장된 상품 정보가 최신인 시간 비율을 반환한다
+    """
+    crawls = 0
+    stale_time = 0.0
+    t = 0.0
+    while t < horizon:
+        crawls += 1
+        interval = interval_policy(changes, t)
+        next_t = min(t + interval, horizon)
+
+        # 크롤링 이후 처음 바뀐 시각부터 다음 크롤링까지는 저장된 정보가 최신이 아니다
+        index = bisect.bisect_right(changes, t)
+        if index < len(changes) and changes[index] < next_t:
+            stale_time += next_t - changes[index]
+
+        t = next_t
+
+    return crawls, 1 - stale_time / horizon
+
+
+def fixed_policy(interval: float):
+    def policy(changes, t):
+        return interval
+
+    return policy
+
+
+def adaptive_policy(settings: dict):
+    """
+    RevisitScheduler.record_crawl 과 같은 방식으로 방문 간격을 정한다
+    """
+    state = {}
+    last_crawl = []
+
+    def policy(changes, t):
+        if not last_crawl:
+            state['interval'] = settings['INITIAL_INTERVAL']
+        else:
+            # 직전 크롤링 이후 변경이 있었는지 확인한다
+            changed = bisect.bisect_right(changes, t) > bisect.bisect_right(changes, last_crawl[-1])
+            state.update(next_interval(state, changed, t - last_crawl[-1], settings))
+        last_crawl.append(t)
+
+        return state['interval']
+
+    return policy
+
+
+def run(products: int, days: int, seed: int, volatile_ratio: float) -> float:
+    """
+    적응형 재방문과 같은 freshness 를 내는 고정 주기 재방문보다 줄인 크롤링 비율을 반환한다
+    """
+    rng = random.Random(seed)
+    horizon = days * 86400.0
+    settings = config.REVISIT
+
+    # 대부분의 상품은 1일 ~ 90일에 한번, volatile_ratio 비율의 상품은 1시간 ~ 1일에 한번 바뀌도록
+    # 변경 주기를 log-uniform 으로 뽑는다
+    histories = []
+    for _ in range(products):
+        if rng.random() < volatile_ratio:
+            low, high = 3600, 86400
+        else:
+            low, high = 86400, 90 * 86400
+        rate = 1 / math.exp(rng.uniform(math.log(low), math.log(high)))
+        histories.append(change_history(rate, horizon, rng))
+
+    def evaluate(policy_factory) -> tuple:
+        crawls = 0
+        freshness = 0.0
+        for changes in histories:
+            product_crawls, product_freshness = simulate(changes, horizon, policy_factory())
+            crawls += product_crawls
+            freshness += product_freshness
+
+        return crawls, freshness / len(histories)
+
+    adaptive_crawls, adaptive_freshness = evaluate(lambda: adaptive_policy(settings))
+    print(f'adaptive | crawls: {adaptive_crawls} | freshness: {adaptive_freshness:.4f}')
+
+    # 적응형과 같은 freshness 를 내는 가장 긴 고정 주기를 찾는다
+    low, high = settings['MIN_INTERVAL'] / 4, settings['MAX_INTERVAL']
+    for _ in range(30):
+        middle = (low + high) / 2
+        _, fixed_freshness = evaluate(lambda: fixed_policy(middle))
+        if fixed_freshness >= adaptive_freshness:
+            low = middle
+        else:
+            high = middle
+
+    fixed_crawls, fixed_freshness = evaluate(lambda: fixed_policy(low))
+    print(f'fixed    | crawls: {fixed_crawls} | freshness: {fixed_freshness:.4f} | interval: {low / 3600:.2f}h')
+    saved = 1 - adaptive_crawls / fixed_crawls
+    print(f'crawl budget saved at equal freshness: {saved:.1%}')
+
+    return saved
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--volatile-ratio', type=float, default=0.1)
+    args = parser.parse_args()
+
+    run(args.products, args.days, args.seed, args.volatile_ratio)
@@ -0,0 +1,107 @@
+"""
+상품 페이지 inline script 의 변수 파싱을 이전 방식(변수별 정규식 + hjson)과 비교한다
+결과가 다른 페이지가 있으면 exit code 1 로 종료한다
+
+python -m benchmark.script_parse --repeat 1000 [상품 페이지 HTML 파일 ...]
+"""
+import re
+import ast
+import sys
+import time
+import argparse
+
+import hjson
+
+from benchmark.extractor import fixture
+from danawa import crawler
+from danawa.extractor import extractor
+
+LEGACY_PATTERNS = {
+    'current_navigation': re.compile(r'var\s+oCurrentNavigation\s+=\s+(.*?);'),
+    'price_compare': re.compile(r'var\s+oPriceCompareSetting\s+=\s+(.*?);'),
+    'product_description': re.compile(r'var\s+oProductDescriptionInfo\s+=\s+(.*?);'),
+    'global_setting': re.compile(r'var\s+oGlobalSetting\s+=\s+(.*?);'),
+    'physical_category': re.compile(r'var\s+oPhysicalCategoryNameList\s+=\s+(.*?);')
+}
+
+
+def legacy_script_variables(script_data: list) -> dict:
+    """
+    script 마다 공백을 제거한 복사본에서 변수별 정규식을 실행하고 hjson 으로 변환하던 이전 방식
+    """
+    ret = {}
+    for script in script_data:
+        scripted = script.replace('\r', '').replace('\n', '').replace('\t', '')
+        for key, pattern in LEGACY_PATTERNS.items():
+            if ret.get(key):
+                continue
+
+            match = pattern.search(scripted)
+            if not match:
+                continue
+
+            if key == 'physical_category':
+                ret[key] = [i.replace('\\', '').strip() for i in ast.literal_eval(match.group(1))]
+            else:
+                data = hjson.loads(match.group(1))
+                ret[key] = dict(data) if data else False
+
+    return ret
+
+
+def measure(func, script_data: list, repeat: int) -> float:
+    """
+    페이지 하나의 script 변수를 파싱하는 평균 시간(us)을 반환한다
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(script_data)
+
+    return (time.perf_counter() - start) / repeat * 1000000
+
+
+def run(pages: list, repeat: int) -> bool:
+    matched = True
+    for name, content in pages:
+        page_extractor = extractor()
+        script_data = page_extractor.product_page(page_extractor.document(content, 'product'))['scripts']
+
+        expected = legacy_script_variables(script_data)
+        result = crawler.script_variables(script_data)
+        if result != expected:
+            matched = False
+            print(f'{name:<30} | MISMATCH\n  legacy: {expected}\n  scanner: {result}')
+            continue
+
+        legacy_us = measure(legacy_script_variables, script_data, repeat)
+
+        # cate 별 캐시를 비운 경우와 같은 카테고리 상품을 연속으로 파싱하는 경우를 따로 측정한다
+        def uncached(scripts):
+            crawler.decode_category_variable.cache_clear()
+            return crawler.script_variables(scripts)
+
+        uncached_us = measure(uncached, script_data, repeat)
+        cached_us = measure(crawler.script_variables, script_data, repeat)
+
+        print(f'{name:<30} | parity ok | scripts: {len(script_data):3} | legacy: {legacy_us:8.1f}us'
+              f' | scanner: {uncached_us:8.1f}us ({legacy_us / uncached_us:4.1f}x)'
+              f' | cached: {cached_us:8.1f}us ({legacy_us / cached_us:4.1f}x)')
+
+    return matched
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=1000)
+    parser.add_argument('files', nargs='*', help='비교할 상품 페이지 HTML 파일, 없으면 fixture 를 사용한다')
+    args = parser.parse_args()
+
+    if args.files:
+        pages = []
+        for filename in args.files:
+            with open(filename, 'rb') as f:
+                pages.append((filename, f.read()))
+    else:
+        pages = [('fixtures/product.html', fixture('product.html'))]
+
+    sys.exit(0 if run(pages, args.repeat) else 1)
@@ -0,0 +1,264 @@
+"""
+실제 사이트에 요청하지 않고 처리량을 측정하기 위한 다나와 stand-in HTTP 서버
+config.URL 의 다섯 endpoint 와 상품 페이지를 fixture 로 응답하고, proxy 목록 API 와 HTTP proxy 역할도 한다
+응답 지연, 오류 비율, 키워드별 상품 수, 상품별 리뷰 수를 설정할 수 있다
+
+python -m benchmark.standin --port 8765 --latency 0.05 --error-rate 0.01
+"""
+import re
+import zlib
+import random
+import asyncio
+import argparse
+import threading
+
+from aiohttp import web
+
+import config
+from benchmark.extractor import fixture
+
+STANDIN = {
+    'HOST': '127.0.0.1',
+    'PORT': 8765,
+    # 응답 지연(초), 실제 지연은 0.5 ~ 1.5 배 사이에서 정한다
+    'LATENCY': 0.05,
+    # 503 으로 응답하는 요청의 비율
+    'ERROR_RATE': 0.0,
+    # 키워드별 검색 상품 수, 상품별 다나와 리뷰 수와 쇼핑몰 리뷰 수
+    'ITEMS': 180,
+    'DANAWA_REVIEWS': 25,
+    'MALL_REVIEWS': 25
+}
+
+# 검색 결과 한 페이지의 상품 수
+SEARCH_PAGE_ITEMS = 90
+PRODUCT_HOST = 'http://prod.danawa.com'
+PRODUCT_PATH = '/info/'
+PROXY_LIST_PATH = '/proxy/list'
+
+
+def _split(content: str, item_start: str, items_end: str) -> tuple:
+    """
+    fixture 를 (목록 앞부분, 항목 목록, 목록 뒷부분)으로 나눈다
+    """
+    starts = [match.start() for match in re.finditer(re.escape(item_start), content)]
+    end = content.index(items_end, starts[-1])
+    items = [content[start:next_start] for start, next_start in zip(starts, starts[1:] + [end])]
+
+    return content[:starts[0]], items, content[end:]
+
+
+class Fixtures:
+    """
+    fixture 를 한번만 읽어 검색, 상품, 리뷰 페이지를 만든다
+    """
+    def __init__(self):
+        self.search_head, self.search_items, self.search_tail = _split(
+            fixture('search.html').decode(), '<li class="prod_item', '<li class="prod_ad_item">')
+        self.product = fixture('product.html').decode()
+
+        danawa_review = fixture('danawa_review.html').decode()
+        self.review_tabs = danawa_review[:danawa_review.index('<div class="danawa_review">')]
+        _, comments, _ = _split(danawa_review, '<li class="danawa-prodBlog', '</ul>')
+        self.danawa_comment = comments[0]
+
+        self.mall_head, comments, self.mall_tail = _split(fixture('mall_review.html').decode(),
+                                                          '<li class="danawa-prodBlog', '</ul>')
+        self.mall_comment = comments[0]
+
+    @staticmethod
+    def pcode_base(keyword: str) -> int:
+        # 키워드마다 다른 상품 번호 범위를 사용한다
+        return 1000000 + (zlib.crc32(keyword.encode()) % 9000) * 10000
+
+    def search(self, keyword: str, page: int, item_count: int) -> str:
+        start = (page - 1) * SEARCH_PAGE_ITEMS
+        items = self.search_items[:max(min(SEARCH_PAGE_ITEMS, item_count - start), 0)]
+        base = self.pcode_base(keyword) + (page - 1) * 1000
+
+        def pcode(match):
+            return f'pcode={base + int(match.group(1)) - 1000000}'
+
+        head = re.sub(r'data-count="\d+"', f'data-count="{item_count}"', self.search_head)
+
+        return head + ''.join(re.sub(r'pcode=(\d+)', pcode, item) for item in items) + self.search_tail
+
+    def product_page(self, pcode: str) -> str:
+        return self.product.replace('1000000', pcode)
+
+    def review_tab(self, danawa_count: int, mall_count: int) -> str:
+        return self.review_tabs.replace('1,234', f'{danawa_count:,}').replace('12,345', f'{mall_count:,}')
+
+    def danawa_review(self, page: int, limit: int, danawa_count: int, mall_count: int) -> str:
+        tabs = self.review_tab(danawa_count, mall_count)
+        indexes = range((page - 1) * limit, min(page * limit, danawa_count))
+        if not indexes:
+            return tabs + 'NO_CONTENT'
+
+        comments = ''.join(self.danawa_comment.replace('5000', str(5000 + index))
+                           .replace('사용자0', f'사용자{index}').replace('맛있어요 0', f'맛있어요 {index}')
+                           for index in indexes)
+
+        return f'{tabs}<div class="danawa_review"><div class="post_comments"><ul>{comments}</ul></div></div>'
+
+    def mall_review(self, page: int, limit: int, mall_count: int) -> str:
+        indexes = range((page - 1) * limit, min(page * limit, mall_count))
+        comments = ''.join(self.mall_comment.replace('7000', str(7000 + index))
+                           .replace('구매자0', f'구매자{index}').replace('좋아요 0', f'좋아요 {index}')
+                           for index in indexes)
+
+        return self.mall_head + comments + self.mall_tail
+
+
+class StandIn:
+    """
+    endpoint 별 요청 수, 오류 수, 응답 크기를 기록하는 stand-in 서버
+    proxy 로 받은 요청(absolute-form)도 path 로 같은 handler 에서 처리한다
+    """
+    def __init__(self, settings: dict = None):
+        self.settings = dict(STANDIN, **(settings or {}))
+        self.fixtures = Fixtures()
+        self.stats = {}
+        self.url = f'http://{self.settings["HOST"]}:{self.settings["PORT"]}'
+
+    def urls(self) -> dict:
+        """
+        config.URL 의 host 를 stand-in 서버로 바꾼 URL 목록을 반환한다
+        """
+        return {name: re.sub(r'^https?://[^/]+', self.url, url) for name, url in config.URL.items()}
+
+    def proxy_api_url(self) -> str:
+        return self.url + PROXY_LIST_PATH
+
+    def _record(self, endpoint: str, key: str, value: int = 1) -> None:
+        stat = self.stats.setdefault(endpoint, {'requests': 0, 'errors': 0, 'bytes': 0})
+        stat[key] += value
+
+    async def _respond(self, endpoint: str, body) -> web.Response:
+        self._record(endpoint, 'requests')
+
+        latency = self.settings['LATENCY']
+        if latency:
+            await asyncio.sleep(latency * random.uniform(0.5, 1.5))
+
+        if random.random() < self.settings['ERROR_RATE']:
+            self._record(endpoint, 'errors')
+            return web.Response(status=503, text='Service Unavailable')
+
+        text = body() if callable(body) else body
+        self._record(endpoint, 'bytes', len(text.encode()))
+
+        return web.Response(text=text, content_type='text/html')
+
+    async def search(self, request: web.Request) -> web.Response:
+        data = await request.post()
+
+        # 상품 페이지도 stand-in 서버에 요청하도록 상품 URL 의 host 를 바꾼다
+        return await self._respond('search', lambda: self.fixtures.search(
+            data.get('query', ''), int(data.get('page', 1)), self.settings['ITEMS']).replace(PRODUCT_HOST, self.url))
+
+    async def product(self, request: web.Request) -> web.Response:
+        return await self._respond('product', lambda: self.fixtures.product_page(request.query.get('pcode', '0')))
+
+    async def danawa_review(self, request: web.Request) -> web.Response:
+        query = request.query
+
+        return await self._respond('danawa_review', lambda: self.fixtures.danawa_review(
+            int(query.get('page', 1)), int(query.get('limit', 10)),
+            self.settings['DANAWA_REVIEWS'], self.settings['MALL_REVIEWS']))
+
+    async def mall_review(self, request: web.Request) -> web.Response:
+        query = request.query
+
+        return await self._respond('mall_review', lambda: self.fixtures.mall_review(
+            int(query.get('page', 1)), int(query.get('limit', 10)), self.settings['MALL_REVIEWS']))
+
+    async def price_compare(self, request: web.Request) -> web.Response:
+        # 기록된 응답이 없으므로 빈 가격비교 목록을 응답한다
+        return await self._respond('price_compare', '<div class="mall_list"><table><tbody></tbody></table></div>')
+
+    async def product_description(self, request: web.Request) -> web.Response:
+        return await self._respond('product_description', '<div class="detail_cont"></div>')
+
+    async def proxy_list(self, request: web.Request) -> web.Response:
+        # stand-in 서버 자신을 유일한 proxy 로 응답한다
+        return web.json_response([{'protocol': 'http', 'user': 'standin', 'password': 'standin',
+                                   'ip': self.settings['HOST'], 'port': self.settings['PORT']}])
+
+    def app(self) -> web.Application:
+        handlers = {
+            'search': ('POST', self.search),
+            'danawa_review': ('GET', self.danawa_review),
+            'mall_review': ('GET', self.mall_review),
+            'price_compare': ('POST', self.price_compare),
+            'product_description': ('POST', self.product_description)
+        }
+
+        app = web.Application()
+        for name, (method, handler) in handlers.items():
+            path = re.sub(r'^https?://[^/]+', '', config.URL[name]).split('?')[0]
+            app.router.add_route(method, path, handler)
+        app.router.add_get(PRODUCT_PATH, self.product)
+        app.router.add_get(PROXY_LIST_PATH, self.proxy_list)
+
+        return app
+
+    def start(self) -> 'StandIn':
+        """
+        별도 thread 의 event loop 에서 서버를 시작한다
+        """
+        started = threading.Event()
+        self.loop = asyncio.new_event_loop()
+
+        async def serve():
+            self.runner = web.AppRunner(self.app())
+            await self.runner.setup()
+            await web.TCPSite(self.runner, self.settings['HOST'], self.settings['PORT']).start()
+            started.set()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(serve())
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        started.wait()
+
+        return self
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+def settings_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--port', type=int, default=STANDIN['PORT'])
+    parser.add_argument('--latency', type=float, default=STANDIN['LATENCY'], help='응답 지연(초)')
+    parser.add_argument('--error-rate', type=float, default=STANDIN['ERROR_RATE'], help='503 으로 응답하는 비율')
+    parser.add_argument('--items', type=int, default=STANDIN['ITEMS'], help='키워드별 검색 상품 수')
+    parser.add_argument('--danawa-reviews', type=int, default=STANDIN['DANAWA_REVIEWS'])
+    parser.add_argument('--mall-reviews', type=int, default=STANDIN['MALL_REVIEWS'])
+
+
+def settings_from(args: argparse.Namespace) -> dict:
+    return {
+        'PORT': args.port,
+        'LATENCY': args.latency,
+        'ERROR_RATE': args.error_rate,
+        'ITEMS': args.items,
+        'DANAWA_REVIEWS': args.danawa_reviews,
+        'MALL_REVIEWS': args.mall_reviews
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    settings_arguments(parser)
+    standin = StandIn(settings_from(parser.parse_args()))
+
+    print(f'stand-in server: {standin.url}')
+    for name, url in standin.urls().items():
+        print(f'  {name}: {url}')
+    web.run_app(standin.app(), host=standin.settings['HOST'], port=standin.settings['PORT'], print=None)
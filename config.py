@@ -14,6 +14,134 @@ URL = {
     'product_description': 'http://prod.danawa.com/info/ajax/getProductDescription.ajax.php'
 }
 
+# HTTP Session Configuration
+HTTP = {
+    'POOL_CONNECTIONS': 10,
+    'POOL_MAXSIZE': 10,
+    # 응답 상태에 따른 재시도는 요청마다 요청 한도를 확인하도록 adapter 가 아닌 SessionPool 에서 한다
+    'RETRY_TOTAL': 3,
+    'RETRY_BACKOFF_FACTOR': 0.5,
+    'RETRY_STATUS_FORCELIST': (500, 502, 503, 504),
+    'CONNECT_TIMEOUT': 5,
+    'READ_TIMEOUT': 15
+}
+
+# Async Search Configuration
+SEARCH = {
+    # 동시에 진행하는 검색 요청 수
+    'CONCURRENCY': 256,
+    # RATE_LIMIT['MAX_WAIT'] 안에 토큰을 얻지 못한 검색 요청이 다시 기다리는 횟수
+    'RATE_LIMIT_RETRIES': 3,
+    # 검색 결과를 파싱하는 process 수
+    'PARSE_PROCESSES': os.cpu_count(),
+    # page 수를 알고 나면 page 2 부터는 동시에 요청한다
+    'FAN_OUT': True,
+    # 동기 검색(main.main)에서 page 를 동시에 요청하는 thread 수
+    'FAN_OUT_THREADS': 8
+}
+
+# Page Parser Configuration
+PARSER = {
+    # 페이지 값 추출에 사용하는 backend(lxml, bs4)
+    'BACKEND': 'lxml',
+    # page type 별로 값을 추출하는 요소만 잘라내어 파싱한다
+    'PARTIAL': True,
+    # schema 별로 이 횟수만큼 추출할 때마다 field 별 miss 와 추출 시간을 로그로 남긴다
+    'STATS_LOG_INTERVAL': 1000,
+    # 값이 없는 경우가 많아 항상 비어 있어도 경고하지 않는 field
+    'OPTIONAL_FIELDS': ('product.price_summary.benefit', 'product.price_summary.option',
+                        'danawa_review.comment.likeCount'),
+    # 상품 페이지 script 의 카테고리 변수를 cate 별로 보관하는 개수
+    'SCRIPT_CACHE_SIZE': 1024,
+    # 리뷰 페이지 단위 job 에서 응답 전체를 트리로 만들지 않고, chunk 단위로 읽으며 댓글을 저장한다
+    'STREAM_REVIEWS': True,
+    'STREAM_CHUNK_SIZE': 16384
+}
+
+# Proxy Pool Configuration
+PROXY = {
+    'API_URL': '',
+    'API_TOKEN': '',
+    # Redis 에 캐싱된 proxy 목록의 만료 시간
+    'CACHE_TTL': 3600,
+    # 캐싱된 proxy 목록을 백그라운드에서 갱신하는 주기
+    'REFRESH_INTERVAL': 600,
+    # 프로세스 로컬 캐시 유지 시간
+    'LOCAL_TTL': 30,
+    # proxy 상태를 집계하는 window 와 로컬 캐시 유지 시간
+    'HEALTH_WINDOW': 3600,
+    'HEALTH_TTL': 5,
+    # 요청 실패 시 proxy 를 제외하는 시간
+    'COOLDOWN': 120,
+    'DEFAULT_LATENCY': 1.0
+}
+
+# Rate Limit Configuration
+# 초당 요청 수(RATE)와 순간적으로 허용하는 요청 수(BURST)
+RATE_LIMIT = {
+    'HOST_RATE': 1.0,
+    'HOST_BURST': 5,
+    'PROXY_RATE': 0.2,
+    'PROXY_BURST': 1,
+    # 토큰을 기다리는 최대 시간, 넘으면 RateLimitExceeded 를 발생시킨다
+    # deferrable job 에서는 기다리지 않고 토큰이 채워지는 시간 이후로 job 을 다시 예약한다
+    'MAX_WAIT': 120
+}
+
+# Job Schedule Configuration
+SCHEDULE = {
+    'JOB_TIMEOUT': 1800,
+    'RESULT_TTL': 86400,
+    # 리뷰 페이지 job 사이의 지연 시간(초)과 한 job 에서 크롤링하는 페이지 수
+    'REVIEW_PAGE_DELAY': 60,
+    'REVIEW_PAGE_BATCH': 1,
+    # 예약 시각을 분산하기 위해 지연 시간에 더하는 비율
+    'JITTER': 0.1,
+    # 리뷰 cursor 만료 시간과 job 실패로 판단하는 cursor 미갱신 시간
+    'REVIEW_CURSOR_TTL': 86400,
+    'REVIEW_CURSOR_STALL': 3600,
+    # Redis 에 저장되는 job 인자의 최대 크기(bytes)
+    'MAX_JOB_PAYLOAD': 4096
+}
+
+# Review Crawling Configuration
+REVIEW = {
+    # 최신순 리뷰에서 이미 저장된 댓글만 있는 페이지를 만나면 크롤링을 중단한다
+    'INCREMENTAL': True,
+    # 리뷰 페이지 하나의 댓글 수. 진행 중인 cursor 의 페이지 번호가 달라지므로 cursor 가 없을 때 변경한다
+    'PAGE_SIZE': 10,
+    # 스트리밍으로 읽은 댓글을 이 개수씩 insert 한다
+    'SAVE_BATCH': 100
+}
+
+# Product Dedupe Configuration
+DEDUPE = {
+    # 같은 상품을 다시 크롤링하지 않는 시간(초)
+    'WINDOW': 21600,
+    # Bloom filter bit 수와 hash 함수 개수(약 1,000,000 상품에서 false positive 1% 미만)
+    'BITS': 2 ** 24,
+    'HASHES': 7
+}
+
+# Revisit Schedule Configuration
+REVISIT = {
+    # 재방문 간격(초)의 최초값, 최소값, 최대값
+    'INITIAL_INTERVAL': 86400,
+    'MIN_INTERVAL': 3600,
+    'MAX_INTERVAL': 86400 * 14,
+    # 한번 방문할 때 늘리거나 줄이는 간격의 최대 비율
+    'BACKOFF': 1.5,
+    'SPEEDUP': 0.5,
+    # 방문 한번의 비용(초). freshness 를 최대로 하는 방문 간격의 Lagrange 승수로, 클수록 모든 상품의 방문 간격이 길어진다
+    'VISIT_COST': 7200,
+    # 변경 빈도 추정에 더하는 가상의 방문 수. 방문 기록이 적은 상품의 추정값이 한번의 변경으로 크게 흔들리지 않도록 한다
+    'PRIOR_VISITS': 1,
+    # 변경 빈도 추정에 사용하는 이전 방문 기록의 감쇠 비율
+    'DECAY': 0.97,
+    # 한번에 Queue 에 넣는 재방문 상품 수
+    'DISPATCH_BATCH': 500
+}
+
 # Redis Configuration
 REDIS = {
     'HOST': '',
@@ -35,6 +163,30 @@ MONGODB = {
     'COLLECTION': ''
 }
 
+# Product Sink Configuration
+PRODUCT_SINK = {
+    # 버퍼를 저장하는 상품 개수와 시간(초) 기준
+    'FLUSH_SIZE': 100,
+    'FLUSH_INTERVAL': 10,
+    'WRITE_CONCERN_W': 1,
+    'WRITE_CONCERN_J': False
+}
+
+# Metrics Configuration
+METRICS = {
+    'ENABLED': True,
+    # 소요 시간 histogram 의 bucket 상한(초)
+    'BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+    'PREFIX': 'danawa',
+    # fetch histogram 에 proxy 별 label 을 붙인다. proxy 수만큼 series 가 늘어난다
+    'PROXY_LABEL': True,
+    # /metrics 로 Prometheus text 를 노출하는 port, 0 이면 노출하지 않는다
+    'PROMETHEUS_PORT': 0,
+    # 값을 기록할 때마다 UDP 로 보낼 statsd 서버, 비어 있으면 보내지 않는다
+    'STATSD_HOST': '',
+    'STATSD_PORT': 8125
+}
+
 # Logging Configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 LOG_CFG = os.path.join(BASE_DIR, 'logging.json')
@@ -44,4 +196,39 @@ LOG_FILENAME = f'{LOG_PATH}/danawa_crawling.log'
 if not os.path.exists(LOG_PATH):
     os.mkdir(LOG_PATH)
 
+# Job Profiling Configuration
+PROFILE = {
+    # profiling 할 job 의 비율(0 ~ 1), job meta 에 'profile' 이 있으면 비율과 관계없이 그 값을 따른다
+    'SAMPLE_RATE': float(os.environ.get('DANAWA_PROFILE_RATE', 0)),
+    # sampling 된 job 의 profiling 방식(cpu: cProfile, memory: tracemalloc, all: 모두)
+    'MODE': os.environ.get('DANAWA_PROFILE_MODE', 'cpu'),
+    # tracemalloc 이 할당 위치마다 저장하는 stack frame 수
+    'TRACEMALLOC_FRAMES': 10,
+    'PATH': os.environ.get('DANAWA_PROFILE_PATH', os.path.join(BASE_DIR, 'profiles'))
+}
+
+# Raw Page Archive Configuration
+ARCHIVE = {
+    # 응답 원문을 보관할 page type(product, danawa_review, mall_review), 비어 있으면 보관하지 않는다
+    'PAGES': (),
+    'PATH': os.path.join(BASE_DIR, 'archive'),
+    # segment 파일이 이 크기(bytes)를 넘으면 index 를 쓰고 새 segment 를 시작한다
+    'SEGMENT_SIZE': 256 * 1024 * 1024,
+    # 압축 codec(zstd, zlib). zstandard 가 설치되어 있지 않으면 zlib 으로 압축한다
+    'CODEC': 'zstd',
+    'LEVEL': 3,
+    # 이어 쓰는 segment 는 이 개수의 record 마다 부분 index 를 쓴다
+    'JOURNAL_INDEX_INTERVAL': 256,
+    # replay 에서 process 하나가 추출하는 record 수
+    'REPLAY_BATCH': 1000
+}
 
+# Product Change Detection Configuration
+FINGERPRINT = {
+    # 상품명, 제조사, 가격정보가 바뀌지 않은 상품은 상품 문서 저장과 리뷰 job 을 생략한다
+    'ENABLED': True,
+    # fingerprint 를 보관하는 시간(초). 바뀌지 않은 상품도 이 시간마다 한번은 다시 저장한다
+    'TTL': 86400 * 7,
+    # 리뷰 수는 리뷰 페이지에서만 알 수 있으므로, 바뀌지 않은 상품도 이 간격(초)마다 리뷰 job 을 넣어 리뷰 수를 확인한다
+    'REVIEW_CHECK_INTERVAL': 86400
+}
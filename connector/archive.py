@@ -0,0 +1,726 @@
+"""
+크롤링한 페이지 응답 원문을 압축하여 append-only segment 파일에 보관하고, 보관한 페이지로 추출을 다시 실행한다
+파서를 고친 후 다시 크롤링하지 않고 보관한 페이지에서 값을 다시 추출할 수 있다
+
+persistent worker 의 segment({생성 시각}-{host}-{pid}-{순번}.seg)는 프로세스마다 따로 쓰므로 lock 이 필요하지 않다
+job 마다 fork 하는 worker 는 work horse 마다 segment 를 만들지 않도록, host 의 하루 segment({날짜}-{host}-{codec}-{순번}.seg)에
+flock 을 잡고 이어 쓰며 record 마다 journal(.jnl)에 (key digest, offset)을 남긴다
+record 마다 따로 압축하므로 index 의 offset 으로 페이지 하나만 읽을 수 있다
+segment 가 SEGMENT_SIZE 를 넘거나 프로세스가 끝나면 key digest 순으로 정렬한 index(.idx)를 쓰고, 조회할 때 mmap 으로 읽는다
+이어 쓰는 segment 는 JOURNAL_INDEX_INTERVAL 개의 record 마다 journal 을 정렬한 부분 index(.pdx)를 쓰므로,
+조회할 때 부분 index 를 mmap 으로 찾고 그 이후의 journal entry 만 읽는다
+index 와 journal 이 모두 없는 segment(비정상 종료)는 record 를 처음부터 읽어 조회한다
+
+python -m connector.archive get product 1000000 > product.html
+python -m connector.archive replay --pages product danawa_review --processes 8 --output replayed/
+python -m connector.archive compact
+"""
+import os
+import json
+import mmap
+import time
+import zlib
+import fcntl
+import atexit
+import struct
+import bisect
+import socket
+import hashlib
+import logging
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+import config
+from connector.connector import registry
+
+MAGIC = b'DNWA'
+VERSION = 1
+CODECS = ('zlib', 'zstd')
+# segment header: magic, version, codec
+SEGMENT_HEADER = struct.Struct('<4sBB')
+# record header: meta 길이, 압축한 본문 길이
+RECORD_HEADER = struct.Struct('<II')
+# index header: magic, version, entry 수
+INDEX_HEADER = struct.Struct('<4sBQ')
+# index entry: key digest, record offset
+INDEX_ENTRY = struct.Struct('<16sQ')
+# journal entry: key digest, record offset, record 끝 offset
+JOURNAL_ENTRY = struct.Struct('<16sQQ')
+SEGMENT_EXT = '.seg'
+INDEX_EXT = '.idx'
+JOURNAL_EXT = '.jnl'
+PARTIAL_INDEX_EXT = '.pdx'
+
+
+def archive_key(pcode, page: int = None) -> str:
+    """
+    상품 페이지는 pcode, 리뷰 페이지는 pcode:page 를 key 로 사용한다
+    """
+    return str(pcode) if page is None else f'{pcode}:{page}'
+
+
+def key_digest(page_type: str, key: str) -> bytes:
+    return hashlib.blake2b(f'{page_type}:{key}'.encode(), digest_size=16).digest()
+
+
+def codec_name(codec: str = None) -> str:
+    """
+    설정된 codec 을 사용할 수 없으면 zlib 을 사용한다
+    """
+    codec = codec or config.ARCHIVE['CODEC']
+    if codec == 'zstd' and zstandard is None:
+        return 'zlib'
+
+    return codec
+
+
+def compressor(codec: str, level: int):
+    """
+    chunk 단위로 압축하는 compress(chunk), flush() 객체를 반환한다
+    """
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compressobj()
+
+    return zlib.compressobj(level)
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read zstd archive segments')
+        # chunk 단위로 압축한 frame 에는 원본 크기가 없으므로 decompressobj 로 읽는다
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+    return zlib.decompress(data)
+
+
+def read_journal(journal_path: str, start: int = 0) -> list:
+    """
+    journal 의 start 번째 entry 부터 (digest, offset, 끝 offset) 목록을 반환한다. 쓰는 중에 끝난 마지막 entry 는 무시한다
+    """
+    with open(journal_path, 'rb') as f:
+        f.seek(start * JOURNAL_ENTRY.size)
+        data = f.read()
+
+    return list(JOURNAL_ENTRY.iter_unpack(data[:len(data) - len(data) % JOURNAL_ENTRY.size]))
+
+
+class Segment:
+    """
+    segment 파일 하나. index 가 있으면 mmap 으로, 이어 쓰는 segment 는 부분 index 와 그 이후의 journal 로,
+    모두 없으면 record 를 처음부터 읽어 key 를 찾는다
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)[:-len(SEGMENT_EXT)]
+        self.index_path = path[:-len(SEGMENT_EXT)] + INDEX_EXT
+        self.journal_path = path[:-len(SEGMENT_EXT)] + JOURNAL_EXT
+        self.partial_index_path = path[:-len(SEGMENT_EXT)] + PARTIAL_INDEX_EXT
+        self._index = None
+        self._count = 0
+        # index 에 없는 record 의 정렬한 digest, offset 목록
+        self._digests = None
+        self._offsets = None
+
+        with open(path, 'rb') as f:
+            magic, version, codec = SEGMENT_HEADER.unpack(f.read(SEGMENT_HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'not an archive segment: {path}')
+        self.codec = CODECS[codec]
+
+    @property
+    def sealed(self) -> bool:
+        return os.path.exists(self.index_path)
+
+    def size(self) -> int:
+        return os.path.getsize(self.path)
+
+    def _map_index(self, index_path: str) -> None:
+        with open(index_path, 'rb') as f:
+            self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count = INDEX_HEADER.unpack_from(self._index)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'not an archive index: {index_path}')
+
+    def _load_index(self) -> None:
+        if self._digests is not None:
+            return
+
+        if self.sealed:
+            self._map_index(self.index_path)
+            entries = []
+        else:
+            try:
+                # 부분 index 를 쓴 후의 journal entry 만 읽는다
+                if os.path.exists(self.partial_index_path):
+                    self._map_index(self.partial_index_path)
+                entries = [(digest, offset) for digest, offset, _ in read_journal(self.journal_path, self._count)]
+            except FileNotFoundError:
+                self.close()
+                if self.sealed:
+                    # 읽는 중에 index 를 쓰고 journal 을 지웠다
+                    return self._load_index()
+                entries = [(key_digest(meta['page'], meta['key']), offset) for offset, meta, _ in self.records(raw=True)]
+
+        entries.sort()
+        self._digests = [digest for digest, _ in entries]
+        self._offsets = [offset for _, offset in entries]
+
+    def _entry(self, position: int) -> tuple:
+        return INDEX_ENTRY.unpack_from(self._index, INDEX_HEADER.size + position * INDEX_ENTRY.size)
+
+    def find(self, digest: bytes) -> int or None:
+        """
+        digest 의 가장 마지막 record offset 을 반환한다. 같은 key 는 나중에 쓴 record 가 뒤에 있다
+        """
+        self._load_index()
+        # index 이후에 쓴 record 가 더 최근이다
+        position = bisect.bisect_right(self._digests, digest) - 1
+        if position >= 0 and self._digests[position] == digest:
+            return self._offsets[position]
+
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._entry(middle)[0] <= digest:
+                low = middle + 1
+            else:
+                high = middle
+        if low and self._entry(low - 1)[0] == digest:
+            return self._entry(low - 1)[1]
+
+        return None
+
+    def offsets(self) -> list:
+        """
+        모든 record 의 offset 을 쓴 순서대로 반환한다
+        """
+        self._load_index()
+        offsets = [self._entry(position)[1] for position in range(self._count)] + self._offsets
+
+        return sorted(offsets)
+
+    def read(self, offset: int, body: bool = True) -> tuple:
+        """
+        offset 의 (meta, 압축을 푼 본문)을 반환한다. body 가 False 이면 본문은 읽지 않는다
+        """
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            meta_size, body_size = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+            meta = json.loads(f.read(meta_size))
+            if not body:
+                return meta, None
+
+            return meta, decompress(self.codec, f.read(body_size))
+
+    def records(self, raw: bool = False, start: int = None, end: int = None):
+        """
+        start 부터 end 이전까지의 (offset, meta, 본문) 을 쓴 순서대로 반환한다. raw 이면 본문의 압축을 풀지 않는다
+        쓰는 중에 끝난 마지막 record 는 무시한다
+        """
+        with open(self.path, 'rb') as f:
+            f.seek(start or SEGMENT_HEADER.size)
+            while True:
+                offset = f.tell()
+                if end is not None and offset >= end:
+                    return
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+
+                meta_size, body_size = RECORD_HEADER.unpack(header)
+                meta = f.read(meta_size)
+                body = f.read(body_size)
+                if len(body) < body_size:
+                    return
+
+                yield offset, json.loads(meta), body if raw else decompress(self.codec, body)
+
+    def close(self) -> None:
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+            self._count = 0
+
+
+def write_index(segment_path: str, entries: list, ext: str = INDEX_EXT) -> None:
+    """
+    (digest, offset) 목록을 digest 순으로 정렬하여 index 파일을 쓴다. 같은 digest 는 offset 순서를 유지한다
+    """
+    entries = sorted(entries)
+    index_path = segment_path[:-len(SEGMENT_EXT)] + ext
+    temp_path = f'{index_path}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(INDEX_HEADER.pack(MAGIC, VERSION, len(entries)))
+        for digest, offset in entries:
+            f.write(INDEX_ENTRY.pack(digest, offset))
+
+    os.replace(temp_path, index_path)
+
+
+def seal_journal(segment_path: str) -> None:
+    """
+    journal 로 index 를 쓰고 journal 을 지운다. segment 의 flock 을 잡고 호출한다
+    """
+    journal_path = segment_path[:-len(SEGMENT_EXT)] + JOURNAL_EXT
+    write_index(segment_path, [(digest, offset) for digest, offset, _ in read_journal(journal_path)])
+    os.remove(journal_path)
+    partial_index_path = segment_path[:-len(SEGMENT_EXT)] + PARTIAL_INDEX_EXT
+    if os.path.exists(partial_index_path):
+        os.remove(partial_index_path)
+
+
+class ArchiveWriter:
+    """
+    프로세스 전용 segment 에 record 를 append 한다
+    fork 된 프로세스에서는 부모의 segment 를 이어 쓰지 않고 새 segment 를 시작한다
+    """
+    def __init__(self, path: str = None, settings: dict = None):
+        self.settings = settings or config.ARCHIVE
+        self.path = path or self.settings['PATH']
+        self.codec = codec_name(self.settings['CODEC'])
+        if self.codec != self.settings['CODEC']:
+            logging.warning(f'archive codec {self.settings["CODEC"]} is not available, using {self.codec}')
+
+        self.pid = os.getpid()
+        self.sequence = 0
+        self.file = None
+        self.segment_path = None
+        self.entries = []
+        self._lock = threading.Lock()
+
+        # 프로세스 종료 시 index 를 쓴다
+        atexit.register(self.close)
+
+    def _check_fork(self) -> None:
+        if self.pid != os.getpid():
+            # 부모의 파일은 부모가 닫으므로 참조만 지운다
+            self.pid = os.getpid()
+            self.file = None
+            self.entries = []
+            self.sequence = 0
+            self._lock = threading.Lock()
+
+    def _open(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        self.sequence += 1
+        name = f'{int(time.time() * 1000):013d}-{socket.gethostname()}-{self.pid}-{self.sequence:04d}'
+        self.segment_path = os.path.join(self.path, name + SEGMENT_EXT)
+        self.file = open(self.segment_path, 'ab')
+        self.file.write(SEGMENT_HEADER.pack(MAGIC, VERSION, CODECS.index(self.codec)))
+        self.entries = []
+
+    def _seal(self) -> None:
+        self.file.close()
+        write_index(self.segment_path, self.entries)
+        self.file = None
+        self.entries = []
+
+    def write(self, meta: dict, body: bytes) -> None:
+        """
+        압축한 본문을 record 로 쓴다
+        """
+        digest = key_digest(meta['page'], meta['key'])
+        meta = json.dumps(meta, ensure_ascii=False, separators=(',', ':')).encode()
+
+        self._check_fork()
+        with self._lock:
+            if self.file is None:
+                self._open()
+
+            offset = self.file.tell()
+            self.file.write(RECORD_HEADER.pack(len(meta), len(body)) + meta + body)
+            # 비정상 종료되어도 쓴 record 는 읽을 수 있도록 매번 flush 한다
+            self.file.flush()
+            self.entries.append((digest, offset))
+
+            if self.file.tell() >= self.settings['SEGMENT_SIZE']:
+                self._seal()
+
+    @staticmethod
+    def _meta(page_type: str, key: str, url: str, size: int) -> dict:
+        return {'page': page_type, 'key': key, 'url': url, 'size': size, 'ts': int(time.time())}
+
+    def add(self, page_type: str, key: str, content: bytes, url: str = None) -> None:
+        body = compressor(self.codec, self.settings['LEVEL'])
+        body = body.compress(content) + body.flush()
+
+        self.write(self._meta(page_type, key, url, len(content)), body)
+
+    def tee(self, chunks, page_type: str, key: str, url: str = None):
+        """
+        chunks 를 그대로 반환하면서 압축하고, 끝까지 읽으면 record 로 쓴다
+        스트리밍 파싱에서 응답 원문을 메모리에 모으지 않고 압축한 크기만큼만 보관한다
+        """
+        body_compressor = compressor(self.codec, self.settings['LEVEL'])
+        compressed = []
+        size = 0
+        for chunk in chunks:
+            if chunk:
+                compressed.append(body_compressor.compress(chunk))
+                size += len(chunk)
+            yield chunk
+
+        compressed.append(body_compressor.flush())
+        self.write(self._meta(page_type, key, url, size), b''.join(compressed))
+
+    def close(self) -> None:
+        """
+        쓰고 있는 segment 의 index 를 쓴다. 다음 record 는 새 segment 에 쓴다
+        """
+        if self.pid != os.getpid():
+            return
+
+        with self._lock:
+            if self.file is not None:
+                self._seal()
+
+
+class SharedArchiveWriter(ArchiveWriter):
+    """
+    job 마다 fork 하는 worker 의 work horse 들이 host 의 하루 segment 에 flock 을 잡고 이어 쓴다
+    work horse 는 페이지 하나만 쓰고 종료되므로, 프로세스마다 segment 를 만들면 segment 수만큼 조회가 느려진다
+    record 를 쓴 후 journal 에 (digest, offset, 끝 offset)을 남기고, SEGMENT_SIZE 를 넘긴 writer 가 index 를 쓴다
+    """
+    def _segment_path(self) -> str:
+        day = time.strftime('%Y%m%d', time.gmtime())
+        name = f'{day}-{socket.gethostname()}-{self.codec}-{self.sequence:04d}'
+
+        return os.path.join(self.path, name + SEGMENT_EXT)
+
+    @staticmethod
+    def _recover(f, journal) -> None:
+        """
+        쓰는 중에 종료된 work horse 가 남긴 record 나 journal entry 를 지운다
+        journal 에 없는 record 는 조회할 수 없고 뒤에 이어 쓴 record 를 처음부터 읽을 수 없게 하므로 잘라낸다
+        """
+        journal_size = journal.seek(0, os.SEEK_END)
+        if journal_size % JOURNAL_ENTRY.size:
+            journal_size -= journal_size % JOURNAL_ENTRY.size
+            journal.truncate(journal_size)
+
+        end = SEGMENT_HEADER.size
+        if journal_size:
+            journal.seek(journal_size - JOURNAL_ENTRY.size)
+            _, _, end = JOURNAL_ENTRY.unpack(journal.read(JOURNAL_ENTRY.size))
+
+        if f.seek(0, os.SEEK_END) > end:
+            logging.warning(f'truncating incomplete archive record | {f.name} | {end}')
+            f.truncate(end)
+
+    def write(self, meta: dict, body: bytes) -> None:
+        """
+        압축한 본문을 host 의 하루 segment 에 record 로 쓴다
+        """
+        digest = key_digest(meta['page'], meta['key'])
+        meta = json.dumps(meta, ensure_ascii=False, separators=(',', ':')).encode()
+        record = RECORD_HEADER.pack(len(meta), len(body)) + meta + body
+
+        self._check_fork()
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock:
+            self.sequence = max(self.sequence, 1)
+            while True:
+                path = self._segment_path()
+                index_path = path[:-len(SEGMENT_EXT)] + INDEX_EXT
+                if os.path.exists(index_path):
+                    self.sequence += 1
+                    continue
+
+                with open(path, 'ab') as f:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    # lock 을 기다리는 동안 index 를 쓰거나(SEGMENT_SIZE 초과, compact) 파일이 지워졌으면 다시 찾는다
+                    if os.path.exists(index_path) or not os.path.exists(path) \
+                            or os.stat(path).st_ino != os.fstat(f.fileno()).st_ino:
+                        continue
+
+                    with open(path[:-len(SEGMENT_EXT)] + JOURNAL_EXT, 'a+b') as journal:
+                        self._recover(f, journal)
+                        offset = f.seek(0, os.SEEK_END)
+                        if offset == 0:
+                            f.write(SEGMENT_HEADER.pack(MAGIC, VERSION, CODECS.index(self.codec)))
+                            offset = SEGMENT_HEADER.size
+
+                        f.write(record)
+                        f.flush()
+                        journal.write(JOURNAL_ENTRY.pack(digest, offset, offset + len(record)))
+                        journal.flush()
+                        journal_count = journal.tell() // JOURNAL_ENTRY.size
+
+                    # 조회할 때 journal 을 모두 읽지 않도록 JOURNAL_INDEX_INTERVAL 마다 부분 index 를 쓴다
+                    if journal_count % self.settings['JOURNAL_INDEX_INTERVAL'] == 0:
+                        journal_entries = read_journal(path[:-len(SEGMENT_EXT)] + JOURNAL_EXT)
+                        write_index(path, [entry[:2] for entry in journal_entries], PARTIAL_INDEX_EXT)
+
+                    if offset + len(record) >= self.settings['SEGMENT_SIZE']:
+                        seal_journal(path)
+                        self.sequence += 1
+                    return
+
+
+class ArchiveReader:
+    """
+    보관한 모든 segment 에서 key 로 페이지를 조회하고, segment 단위로 record 를 읽는다
+    """
+    def __init__(self, path: str = None):
+        self.path = path or config.ARCHIVE['PATH']
+
+    def segments(self) -> list:
+        """
+        segment 를 생성 순서대로 반환한다
+        """
+        if not os.path.isdir(self.path):
+            return []
+
+        names = sorted(name for name in os.listdir(self.path) if name.endswith(SEGMENT_EXT))
+        # work horse 가 방금 만들어 header 를 쓰기 전인 segment 는 제외한다
+        paths = [os.path.join(self.path, name) for name in names]
+
+        return [Segment(path) for path in paths if os.path.getsize(path) >= SEGMENT_HEADER.size]
+
+    def get(self, page_type: str, key: str) -> tuple or None:
+        """
+        key 의 가장 최근 (meta, 본문)을 반환한다
+        compact 한 segment 에는 이후에 생성된 segment 보다 오래된 record 가 있으므로, 찾은 record 의 시각을 비교한다
+        """
+        digest = key_digest(page_type, key)
+        latest = None
+        for order, segment in enumerate(self.segments()):
+            try:
+                offset = segment.find(digest)
+                if offset is None:
+                    continue
+
+                meta, _ = segment.read(offset, body=False)
+                if latest is None or (meta['ts'], order) >= latest[0]:
+                    latest = ((meta['ts'], order), segment, offset)
+            finally:
+                segment.close()
+
+        if latest is None:
+            return None
+
+        return latest[1].read(latest[2])
+
+
+def replay_extract(page_type: str, content: bytes) -> dict:
+    """
+    worker 와 같은 extractor 로 보관한 페이지에서 값을 추출한다
+    """
+    from danawa.crawler import script_variables
+    from danawa.extractor import extractor
+
+    page_extractor = extractor()
+    document = page_extractor.document(content, page_type)
+    if page_type == 'product':
+        product = page_extractor.product_page(document)
+        product['scripts'] = script_variables(product['scripts'])
+        return product
+
+    if page_type == 'danawa_review':
+        try:
+            counts = page_extractor.review_counts(document)
+        except AttributeError:
+            # 2 page 부터는 리뷰 tab 이 없을 수 있다
+            counts = None
+        return {'reviewCounts': counts, 'comments': page_extractor.danawa_review(document)}
+
+    if page_type == 'mall_review':
+        return {'comments': page_extractor.mall_review(document)}
+
+    raise ValueError(f'unknown archive page type: {page_type}')
+
+
+def replay_segment(segment_path: str, page_types: tuple, output: str = None, start: int = None,
+                   end: int = None) -> tuple:
+    """
+    segment 의 start 부터 end 이전까지의 record 를 추출하여 output 디렉터리의 {segment}-{start}.jsonl 로 쓴다
+    (추출한 record 수, 오류 수, 추출 시간)을 반환한다
+    """
+    segment = Segment(segment_path)
+    name = f'{segment.name}-{start or SEGMENT_HEADER.size:012d}.jsonl'
+    out = open(os.path.join(output, name), 'w', encoding='utf-8') if output else None
+
+    count = 0
+    errors = 0
+    seconds = 0.0
+    try:
+        for offset, meta, content in segment.records(start=start, end=end):
+            if page_types and meta['page'] not in page_types:
+                continue
+
+            started = time.perf_counter()
+            try:
+                result = {'data': replay_extract(meta['page'], content)}
+            except Exception as e:
+                errors += 1
+                result = {'error': repr(e)}
+            seconds += time.perf_counter() - started
+            count += 1
+
+            if out:
+                out.write(json.dumps(dict(meta, offset=offset, **result), ensure_ascii=False, default=str) + '\n')
+    finally:
+        if out:
+            out.close()
+
+    return count, errors, seconds
+
+
+def replay_ranges(segment: Segment, batch: int) -> list:
+    """
+    segment 의 record 를 batch 개씩 나눈 (시작 offset, 끝 offset) 목록을 반환한다. 마지막 범위의 끝은 None 이다
+    """
+    offsets = segment.offsets()
+    segment.close()
+    if not offsets:
+        return []
+
+    starts = offsets[::batch]
+
+    return list(zip(starts, starts[1:] + [None]))
+
+
+def replay(path: str = None, page_types: tuple = (), processes: int = None, output: str = None,
+           batch: int = None) -> tuple:
+    """
+    segment 를 batch 개의 record 범위로 나누어 process pool 에서 추출하여 보관한 모든 페이지를 다시 추출한다
+    host 의 하루 segment 처럼 큰 segment 도 여러 process 에서 나누어 추출한다
+    """
+    if output:
+        os.makedirs(output, exist_ok=True)
+    batch = batch or config.ARCHIVE['REPLAY_BATCH']
+    tasks = [(segment.path, start, end) for segment in ArchiveReader(path).segments()
+             for start, end in replay_ranges(segment, batch)]
+
+    started = time.time()
+    count = errors = seconds = 0
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as executor:
+        futures = [executor.submit(replay_segment, segment_path, tuple(page_types), output, start, end)
+                   for segment_path, start, end in tasks]
+        for future in futures:
+            range_count, range_errors, range_seconds = future.result()
+            count += range_count
+            errors += range_errors
+            seconds += range_seconds
+
+    return count, errors, seconds, time.time() - started
+
+
+def compact(path: str = None, settings: dict = None) -> tuple:
+    """
+    작은 segment 를 SEGMENT_SIZE 크기의 segment 로 합친다
+    본문은 압축을 풀지 않고 복사하며, journal 도 index 도 없는 segment 는 쓰는 중일 수 있으므로 합치지 않는다
+    (합친 segment 수, 새로 쓴 segment 수)를 반환한다
+    """
+    settings = dict(settings or config.ARCHIVE, PATH=path or config.ARCHIVE['PATH'])
+
+    # work horse 가 이어 쓰는 segment 는 index 를 써서 닫는다. 이후 record 는 다음 순번의 segment 에 쓴다
+    for segment in ArchiveReader(settings['PATH']).segments():
+        if not segment.sealed and os.path.exists(segment.journal_path):
+            with open(segment.path, 'ab') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                if not segment.sealed:
+                    seal_journal(segment.path)
+
+    segments = [segment for segment in ArchiveReader(settings['PATH']).segments()
+                if segment.sealed and segment.size() < settings['SEGMENT_SIZE']]
+    if len(segments) < 2:
+        return 0, 0
+
+    writers = {}
+    for segment in segments:
+        writer = writers.get(segment.codec)
+        if writer is None:
+            writer = writers[segment.codec] = ArchiveWriter(settings['PATH'], dict(settings, CODEC=segment.codec))
+        for _, meta, body in segment.records(raw=True):
+            writer.write(meta, body)
+
+    written = 0
+    for writer in writers.values():
+        written += writer.sequence
+        writer.close()
+
+    for segment in segments:
+        # 합친 segment 는 work horse 가 다시 쓰지 않도록 index 를 나중에 지운다
+        os.remove(segment.path)
+        os.remove(segment.index_path)
+
+    return len(segments), written
+
+
+_archive = None
+
+
+def archive() -> ArchiveWriter:
+    """
+    프로세스 전역 ArchiveWriter 를 반환한다
+    기본 rq worker 는 job 마다 fork 한 프로세스를 os._exit 로 종료하여 atexit 이 실행되지 않으므로, host 의 하루 segment 에 이어 쓴다
+    """
+    global _archive
+    if _archive is None:
+        _archive = ArchiveWriter() if registry.persistent else SharedArchiveWriter()
+
+    return _archive
+
+
+def archive_page(page_type: str, key: str, content: bytes, url: str = None) -> None:
+    """
+    ARCHIVE['PAGES'] 에 포함된 page type 이면 응답 원문을 보관한다
+    """
+    if page_type in config.ARCHIVE['PAGES']:
+        archive().add(page_type, key, content, url)
+
+
+def archive_tee(page_type: str, key: str, url: str = None):
+    """
+    ARCHIVE['PAGES'] 에 포함된 page type 이면 스트리밍 응답의 chunk 를 보관하는 함수를 반환한다
+    """
+    if page_type not in config.ARCHIVE['PAGES']:
+        return None
+
+    def tee(chunks):
+        yield from archive().tee(chunks, page_type, key, url)
+
+    return tee
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--path', default=config.ARCHIVE['PATH'])
+    commands = parser.add_subparsers(dest='command')
+
+    get_parser = commands.add_parser('get', help='key 의 가장 최근 페이지를 출력한다')
+    get_parser.add_argument('page', help='page type(product, danawa_review, mall_review)')
+    get_parser.add_argument('key', help='상품 페이지는 pcode, 리뷰 페이지는 pcode:page')
+
+    replay_parser = commands.add_parser('replay', help='보관한 페이지에서 값을 다시 추출한다')
+    replay_parser.add_argument('--pages', nargs='*', default=[], help='추출할 page type, 없으면 모두')
+    replay_parser.add_argument('--processes', type=int, default=None)
+    replay_parser.add_argument('--output', help='record 범위별 추출 결과(jsonl)를 저장할 디렉터리, 없으면 시간만 측정한다')
+    replay_parser.add_argument('--batch', type=int, default=None, help='process 하나가 추출하는 record 수')
+
+    commands.add_parser('compact', help='작은 segment 를 합친다')
+    args = parser.parse_args()
+
+    if args.command == 'get':
+        found = ArchiveReader(args.path).get(args.page, args.key)
+        if found is None:
+            raise SystemExit(f'{args.page} {args.key} not found')
+        os.write(1, found[1])
+    elif args.command == 'replay':
+        pages, failed, extract_seconds, elapsed = replay(args.path, args.pages, args.processes, args.output,
+                                                         args.batch)
+        print(f'replayed: {pages} | errors: {failed} | elapsed: {elapsed:.2f}s | pages/sec: {pages / elapsed:.1f}'
+              f' | extract: {extract_seconds / max(pages, 1) * 1000:.2f}ms/page')
+    elif args.command == 'compact':
+        merged, created = compact(args.path)
+        print(f'compacted: {merged} segments -> {created}')
+    else:
+        parser.print_help()
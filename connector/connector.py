@@ -1,16 +1,73 @@
+import os
 import random
+import threading
 
 from redis import Redis
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING
 
 import config
 
 
+class ConnectionRegistry:
+    """
+    프로세스마다 Redis, MongoClient 를 한번만 생성하여 모든 job 이 공유하도록 관리한다
+    fork 된 프로세스에서는 부모의 연결을 사용하지 않고 새로 생성한다
+    """
+    def __init__(self):
+        self.pid = os.getpid()
+        self.clients = {}
+        # fork 하지 않는 worker 에서 job 사이에 연결과 버퍼를 유지하는지 여부
+        self.persistent = False
+        self._lock = threading.Lock()
+
+    def _check_fork(self) -> None:
+        if self.pid != os.getpid():
+            # 부모 프로세스의 소켓을 닫지 않도록 close 하지 않고 참조만 지운다
+            self.clients = {}
+            self.pid = os.getpid()
+            self._lock = threading.Lock()
+
+    def get(self, name: str, factory):
+        self._check_fork()
+
+        client = self.clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self.clients.get(name)
+                if client is None:
+                    client = factory()
+                    self.clients[name] = client
+
+        return client
+
+    def redis(self) -> Redis:
+        return self.get('redis', RedisConnector._default)
+
+    def mongo(self) -> MongoClient:
+        return self.get('mongo', lambda: MongoClient(MongoDBConnector._default()))
+
+    def warm_up(self) -> None:
+        """
+        job 을 처리하기 전에 연결을 미리 생성하여 handshake 를 끝낸다
+        """
+        self.redis().ping()
+        self.mongo().admin.command('ping')
+
+    def close(self) -> None:
+        with self._lock:
+            for client in self.clients.values():
+                client.close()
+            self.clients = {}
+
+
+registry = ConnectionRegistry()
+
+
 class RedisConnector:
     connectionString = config.REDIS
 
     def __init__(self, encoding='utf-8'):
-        self.client = self._default()
+        self.client = registry.redis()
         self.encoding = encoding
 
     @classmethod
@@ -32,7 +89,7 @@ class MongoDBConnector:
         if client:
             self.client = client
         else:
-            self.client = MongoClient(self._default())
+            self.client = registry.mongo()
 
         self.collection = self._collection()
 
@@ -71,3 +128,13 @@ class MongoDBConnector:
         random.shuffle(ret)
 
         return ret
+
+
+def ensure_indexes() -> None:
+    """
+    댓글과 상품 조회에 필요한 index 를 생성한다
+    worker.stored_review_filter 는 source 가 있는 댓글을 (fkey, source), 기존 댓글을 (fkey, review) index 로 찾는다
+    """
+    conn = MongoDBConnector().conn()
+    conn[''][''].create_index([('fkey', ASCENDING), ('source', ASCENDING)])
+    conn[''][''].create_index([('fkey', ASCENDING), ('review', ASCENDING)])
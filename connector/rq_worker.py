@@ -0,0 +1,35 @@
+import logging
+
+from rq import SimpleWorker
+
+from connector.connector import registry
+from connector.sink import product_sink
+from utils.metrics import metrics
+
+
+class PersistentConnectionWorker(SimpleWorker):
+    """
+    job 마다 fork 하지 않고 같은 프로세스에서 실행하는 worker
+    시작할 때 Redis, MongoClient 연결을 미리 생성하고 모든 job 이 재사용한다
+    job 이 같은 프로세스에서 실행되므로 METRICS['PROMETHEUS_PORT'] 가 설정되어 있으면 단계별 metric 을 노출한다
+
+    rq worker -w connector.rq_worker.PersistentConnectionWorker high low
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        registry.persistent = True
+
+    def work(self, *args, **kwargs):
+        registry.warm_up()
+        logging.info('connection registry warmed up')
+        metrics().serve()
+        # job 이 없어 add 가 호출되지 않아도 FLUSH_INTERVAL 이 지난 버퍼를 저장한다
+        product_sink().start()
+
+        try:
+            return super().work(*args, **kwargs)
+        finally:
+            # worker 종료 시 버퍼에 남은 상품 정보를 저장한다
+            product_sink().stop()
+            product_sink().flush()
+            registry.close()
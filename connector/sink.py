@@ -0,0 +1,169 @@
+import time
+import atexit
+import logging
+import threading
+
+from pymongo import ReplaceOne
+from pymongo.write_concern import WriteConcern
+
+import config
+from connector.connector import MongoDBConnector
+from utils.metrics import metrics
+
+
+class ProductSink:
+    """
+    상품 정보를 버퍼에 모아두었다가 개수나 시간 기준에 도달하면 bulk_write(ReplaceOne upsert) 로 저장한다
+    함께 추가한 상품 정보가 모두 저장되면 on_stored 를 호출하므로, 저장한 후에 남길 기록(eg. fingerprint)을 미리 남기지 않는다
+    """
+    def __init__(self, collection, settings: dict = None):
+        self.settings = settings or config.PRODUCT_SINK
+        write_concern = WriteConcern(w=self.settings['WRITE_CONCERN_W'], j=self.settings['WRITE_CONCERN_J'])
+        self.collection = collection.with_options(write_concern=write_concern)
+
+        self.buffer = {}
+        self.first_added_at = None
+        # 저장을 기다리는 (_id 집합, on_stored) 목록
+        self.pending = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._flusher = None
+
+        # 프로세스 종료 시 남은 버퍼를 저장한다
+        atexit.register(self.flush)
+
+    def add(self, product_info: dict, on_stored=None) -> None:
+        self.add_many([product_info], on_stored)
+
+    def add_many(self, documents: list, on_stored=None) -> None:
+        """
+        documents 가 모두 저장되면 마지막으로 저장한 flush 에서 on_stored() 를 호출한다
+        """
+        if not documents:
+            if on_stored is not None:
+                on_stored()
+            return
+
+        with self._lock:
+            if not self.buffer:
+                self.first_added_at = time.time()
+            # 같은 _id 의 상품은 마지막 값만 저장한다
+            for document in documents:
+                self.buffer[document['_id']] = document
+            if on_stored is not None:
+                self.pending.append(({document['_id'] for document in documents}, on_stored))
+
+        self.flush_due()
+
+    def _stored(self, ids: set) -> None:
+        """
+        저장한 _id 로 모든 상품 정보가 저장된 on_stored 를 호출한다. 다시 버퍼에 추가된 _id 는 다음 flush 를 기다린다
+        """
+        with self._lock:
+            ids = ids - self.buffer.keys()
+            done = []
+            pending = []
+            for waiting, on_stored in self.pending:
+                waiting -= ids
+                (pending if waiting else done).append((waiting, on_stored))
+            self.pending = pending
+
+        for _, on_stored in done:
+            try:
+                on_stored()
+            except Exception:
+                # 상품 정보는 이미 저장되었으므로 flush 를 실패로 처리하지 않는다
+                logging.exception('product sink on_stored callback failed')
+
+    def is_due(self) -> bool:
+        if not self.buffer:
+            return False
+
+        if len(self.buffer) >= self.settings['FLUSH_SIZE']:
+            return True
+
+        return time.time() - self.first_added_at >= self.settings['FLUSH_INTERVAL']
+
+    def flush_due(self) -> int:
+        """
+        개수나 시간 기준에 도달한 경우에만 저장한다
+        """
+        if self.is_due():
+            return self.flush()
+
+        return 0
+
+    def start(self) -> None:
+        """
+        FLUSH_INTERVAL 마다 시간 기준에 도달한 버퍼를 저장하는 daemon thread 를 시작한다
+        job 사이에 프로세스를 유지하는 worker 가 쉬는 동안에도 버퍼의 상품 정보가 늦게 저장되지 않도록 한다
+        """
+        if self._flusher is not None:
+            return
+
+        self._stopped.clear()
+        self._flusher = threading.Thread(target=self._flush_periodically, name='product-sink-flusher', daemon=True)
+        self._flusher.start()
+
+    def stop(self) -> None:
+        if self._flusher is None:
+            return
+
+        self._stopped.set()
+        self._flusher.join()
+        self._flusher = None
+
+    def _flush_periodically(self) -> None:
+        interval = max(self.settings['FLUSH_INTERVAL'] / 2, 0.1)
+        while not self._stopped.wait(interval):
+            try:
+                self.flush_due()
+            except Exception:
+                # 저장에 실패한 상품은 버퍼에 남아 있으므로 다음 주기에 다시 저장한다
+                logging.exception('product sink periodic flush failed')
+
+    def flush(self) -> int:
+        """
+        버퍼의 상품 정보를 한번에 upsert 하고 저장한 개수를 반환한다
+        """
+        with self._lock:
+            if not self.buffer:
+                return 0
+
+            documents = list(self.buffer.values())
+            self.buffer = {}
+            self.first_added_at = None
+
+        operations = [ReplaceOne({'_id': document['_id']}, document, upsert=True) for document in documents]
+        try:
+            with metrics().timer('store', target='product'):
+                result = self.collection.bulk_write(operations, ordered=False)
+        except Exception:
+            # 저장에 실패한 상품은 다음 flush 에서 다시 저장하도록 버퍼에 되돌린다
+            with self._lock:
+                for document in documents:
+                    self.buffer.setdefault(document['_id'], document)
+                self.first_added_at = self.first_added_at or time.time()
+            raise
+
+        self._stored({document['_id'] for document in documents})
+
+        metrics().increment('products_stored', len(operations))
+        logging.info(f'product sink flushed: {len(operations)}'
+                     f' | upserted: {result.upserted_count} | modified: {result.modified_count}')
+
+        return len(operations)
+
+
+_product_sink = None
+
+
+def product_sink() -> ProductSink:
+    """
+    프로세스 전역 ProductSink 를 반환한다
+    """
+    global _product_sink
+    if _product_sink is None:
+        _product_sink = ProductSink(MongoDBConnector().conn()[''][''])
+
+    return _product_sink
@@ -0,0 +1,116 @@
+import time
+import asyncio
+
+import aiohttp
+
+import config
+from danawa.crawler import DanawaSearcher
+from utils.proxy import proxy_id, is_proxy_ok
+from utils.rate_limiter import rate_limiter, RateLimitExceeded
+from utils.metrics import metrics, proxy_label
+
+
+class AsyncDanawaSearcher(DanawaSearcher):
+    """
+    aiohttp 로 다나와 상품 검색을 하기 위한 클래스
+    여러 키워드의 searcher 가 ClientSession 과 동시 요청 수를 제한하는 semaphore 를 공유한다
+    """
+    def __init__(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, settings: dict = None):
+        super().__init__()
+        self.session = session
+        self.semaphore = semaphore
+        self.settings = settings or config.HTTP
+
+    @staticmethod
+    async def _run(func, *args):
+        """
+        Redis 를 사용하는 동기 함수를 thread 에서 실행한다
+        """
+        return await asyncio.get_event_loop().run_in_executor(None, func, *args)
+
+    async def _acquire(self, proxies: dict) -> None:
+        """
+        요청 토큰을 얻는다. 토큰을 기다리는 동안 다른 요청이 진행되도록 semaphore 를 잡기 전에 호출한다
+        MAX_WAIT 안에 토큰을 얻지 못하면 RATE_LIMIT_RETRIES 번까지 다시 기다리고, 넘으면 RateLimitExceeded 를 발생시킨다
+        """
+        proxy = proxies.get('http') if proxies else None
+        proxy_key = proxy_id(proxy) if proxy else None
+
+        retry = 0
+        while True:
+            try:
+                waited = await rate_limiter().acquire_async(self.host, proxy_key)
+                break
+            except RateLimitExceeded as e:
+                metrics().increment('search_rate_limited')
+                if retry >= config.SEARCH['RATE_LIMIT_RETRIES']:
+                    raise
+                await asyncio.sleep(e.retry_after)
+                retry += 1
+
+        metrics().observe('rate_limit_wait', waited, endpoint='search')
+
+    async def _post(self, url: str, data: dict, headers: dict, proxies: dict) -> bytes:
+        proxy = proxies.get('http') if proxies else None
+        proxy_key = proxy_id(proxy) if proxy else None
+        labels = {'endpoint': 'search', 'proxy': proxy_label(proxy_key)}
+
+        start = time.time()
+        try:
+            async with self.session.post(url, data=data, headers=headers, proxy=proxy) as response:
+                content = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            metrics().observe('fetch', time.time() - start, **labels)
+            metrics().increment('fetch_errors', status=type(e).__name__, **labels)
+            if proxies:
+                await self._run(self.proxy.report, proxies, time.time() - start, False)
+            raise
+
+        metrics().observe('fetch', time.time() - start, **labels)
+        if response.status >= 400:
+            metrics().increment('fetch_errors', status=response.status, **labels)
+
+        # proxy 별 응답 시간과 오류를 기록하여 proxy 선택에 반영한다
+        if proxies:
+            await self._run(self.proxy.report, proxies, time.time() - start, is_proxy_ok(response.status))
+
+        response.raise_for_status()
+
+        return content
+
+    async def fetch(self, keyword, page=1) -> bytes:
+        self._init_headers()
+        data = self.search_parameter(keyword, page)
+        headers = self._headers(keyword)
+
+        # Host, Content-Length 는 aiohttp 가 설정한다
+        headers.pop('Host')
+
+        # 서버 오류는 요청 한도 안에서 backoff 후 다시 요청한다
+        retry = 0
+        while True:
+            proxies = await self._run(self.proxy.get)
+            await self._acquire(proxies)
+            async with self.semaphore:
+                try:
+                    return await self._post(self.url_set['search'], data, headers, proxies)
+                except aiohttp.ClientResponseError as e:
+                    if e.status not in self.settings['RETRY_STATUS_FORCELIST'] or retry >= self.settings['RETRY_TOTAL']:
+                        raise
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    if retry >= self.settings['RETRY_TOTAL']:
+                        raise
+
+            await asyncio.sleep(self.settings['RETRY_BACKOFF_FACTOR'] * (2 ** retry))
+            retry += 1
+
+
+def client_session(settings: dict = None) -> aiohttp.ClientSession:
+    """
+    검색에 사용할 aiohttp ClientSession 을 생성한다
+    """
+    settings = settings or config.HTTP
+    timeout = aiohttp.ClientTimeout(sock_connect=settings['CONNECT_TIMEOUT'], sock_read=settings['READ_TIMEOUT'])
+    connector = aiohttp.TCPConnector(limit=config.SEARCH['CONCURRENCY'])
+
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
@@ -1,13 +1,16 @@
 import ast
+import json
 import datetime
+import functools
 import re
-import time
 
 import requests
 import hjson
 from urllib.parse import urlparse, quote, parse_qsl
 from utils.user_agent import random_user_agent
 from utils.proxy import RandProxy
+from utils.session import session_pool
+from utils.metrics import metrics
 
 import config
 
@@ -98,29 +101,111 @@ class DanawaSearcher:
         headers = self._headers(keyword)
         headers['Content-Length'] = self.length_search_parameter(data)
 
-        response = requests.post(self.url_set['search'], data=data, proxies=proxies, headers=headers, timeout=15)
+        response = session_pool().post(self.url_set['search'], data=data, proxies=proxies, headers=headers,
+                                       endpoint='search')
         response.raise_for_status()
 
         return response.content
 
 
+# 상품 페이지 script 에서 읽는 변수와 parsed_html_script 결과의 key
+SCRIPT_VARIABLES = {
+    'oCurrentNavigation': 'current_navigation',
+    'oPriceCompareSetting': 'price_compare',
+    'oProductDescriptionInfo': 'product_description',
+    'oGlobalSetting': 'global_setting',
+    'oPhysicalCategoryNameList': 'physical_category'
+}
+# 다섯 변수를 하나의 정규식으로 찾는다. 값 안의 줄바꿈과 tab 은 찾은 후에 제거한다
+SCRIPT_VARIABLE_PATTERN = re.compile(rf'var\s+({"|".join(SCRIPT_VARIABLES)})\s+=\s+(.*?);', re.DOTALL)
+# 카테고리가 같으면 값이 같으므로 cate 별로 변환 결과를 재사용한다
+CATEGORY_VARIABLES = ('current_navigation', 'physical_category')
+UNQUOTED_KEY_PATTERN = re.compile(r'([{,]\s*)([A-Za-z_$][\w$]*)\s*:')
+WHITESPACE = str.maketrans('', '', '\r\n\t')
+
+
+def script_to_json(script: str) -> dict or bool:
+    """
+    script 의 object 를 dictionary 로 변환한다
+    key 에 따옴표를 붙여 json 으로 먼저 읽고, json 으로 읽을 수 없는 object 만 hjson 으로 읽는다
+    """
+    try:
+        data = json.loads(UNQUOTED_KEY_PATTERN.sub(r'\1"\2":', script))
+    except ValueError:
+        data = hjson.loads(script)
+
+    if data:
+        return dict(data)
+    else:
+        return False
+
+
+def script_to_list(script: str) -> list:
+    # string list 를 list 타입으로 변경하고, escape 문자열을 삭제한다
+    return [i.replace('\\', '').strip() for i in ast.literal_eval(script)]
+
+
+def decode_script_variable(key: str, script: str):
+    if key == 'physical_category':
+        return script_to_list(script)
+
+    return script_to_json(script)
+
+
+@functools.lru_cache(maxsize=config.PARSER['SCRIPT_CACHE_SIZE'])
+def decode_category_variable(cate: str, key: str, script: str):
+    return decode_script_variable(key, script)
+
+
+def script_variables(script_data: list, cate: str = None) -> dict:
+    """
+    script 목록을 한번 훑으며 SCRIPT_VARIABLES 의 값을 찾아 변환한다. 모두 찾으면 남은 script 는 읽지 않는다
+    카테고리 변수는 oGlobalSetting 의 nCategoryCode(없으면 cate) 별로 변환 결과를 재사용한다
+    """
+    scripts = {}
+    for script in script_data:
+        for match in SCRIPT_VARIABLE_PATTERN.finditer(script):
+            key = SCRIPT_VARIABLES[match.group(1)]
+            if key not in scripts:
+                scripts[key] = match.group(2).translate(WHITESPACE)
+
+        if len(scripts) == len(SCRIPT_VARIABLES):
+            break
+
+    ret = {}
+    if 'global_setting' in scripts:
+        ret['global_setting'] = script_to_json(scripts['global_setting'])
+        if ret['global_setting']:
+            cate = ret['global_setting'].get('nCategoryCode', cate)
+
+    for key, script in scripts.items():
+        if key in ret:
+            continue
+
+        if key in CATEGORY_VARIABLES and cate:
+            ret[key] = decode_category_variable(str(cate), key, script)
+        else:
+            ret[key] = decode_script_variable(key, script)
+
+    return ret
+
+
 class DanawaCrawler:
     """
     다나와 상품 정보와 댓글을 크롤링 하기 위한 클래스
     """
+    # job 에 전달하는 descriptor 구조가 바뀌면 버전을 올린다
+    descriptor_version = 1
+    descriptor_keys = ('pcode', 'cate', 'cate1', 'cate2', 'cate3', 'cate4', 'referer', 'header_host', 'origin')
+
     def __init__(self):
         self.proxy = RandProxy()
         self.user_agent = random_user_agent()
-        self.current_navigation_pattern = re.compile('var\s+oCurrentNavigation\s+=\s+(.*?);')
-        self.price_compare_pattern = re.compile('var\s+oPriceCompareSetting\s+=\s+(.*?);')
-        self.product_description_pattern = re.compile('var\s+oProductDescriptionInfo\s+=\s+(.*?);')
-        self.global_setting_pattern = re.compile('var\s+oGlobalSetting\s+=\s+(.*?);')
-        self.physical_category_name_list_pattern = re.compile('var\s+oPhysicalCategoryNameList\s+=\s+(.*?);')
         self.url_set = config.URL
         self.referer = None
         self.header_host = None
         self.origin = None
-        self.limit = 10
+        self.limit = config.REVIEW['PAGE_SIZE']
         self.comment_page_limit = 10
         self.pcode = None
         # cate = nGroup + nDepth + ?
@@ -131,6 +216,39 @@ class DanawaCrawler:
         self.cate3 = None
         self.cate4 = None
 
+    def descriptor(self) -> dict:
+        """
+        댓글 크롤링 job 에 전달할 최소한의 상품 정보를 반환한다
+        proxy 목록이나 정규식 등은 worker 에서 새로 생성하므로 포함하지 않는다
+        """
+        return {
+            'v': self.descriptor_version,
+            'fkey': f'{self.pcode}_{self.cate}',
+            'pcode': self.pcode,
+            'cate': self.cate,
+            'cate1': self.cate1,
+            'cate2': self.cate2,
+            'cate3': self.cate3,
+            'cate4': self.cate4,
+            'referer': self.referer,
+            'header_host': self.header_host,
+            'origin': self.origin
+        }
+
+    @classmethod
+    def from_descriptor(cls, descriptor: dict):
+        """
+        descriptor 로 댓글 크롤링에 필요한 DanawaCrawler 를 다시 생성한다
+        """
+        if descriptor.get('v') != cls.descriptor_version:
+            raise ValueError(f'unsupported crawler descriptor version: {descriptor.get("v")}')
+
+        dc = cls()
+        for key in cls.descriptor_keys:
+            setattr(dc, key, descriptor[key])
+
+        return dc
+
     def _headers(self, method: str) -> dict:
         if method.upper() == 'GET':
             return {
@@ -164,14 +282,6 @@ class DanawaCrawler:
                 'X-Requested-With': 'XMLHttpRequest'
             }
 
-    @staticmethod
-    def _script_to_json(script: str) -> dict or bool:
-        data = hjson.loads(script)
-        if data:
-            return dict(data)
-        else:
-            return False
-
     @staticmethod
     def _timestamp():
         return int(datetime.datetime.now().timestamp()*1000)
@@ -292,50 +402,18 @@ class DanawaCrawler:
         del headers['Content-Type']
         proxies = self.proxy.get()
 
-        res = requests.get(url, headers=headers, proxies=proxies)
+        res = session_pool().get(url, headers=headers, proxies=proxies, endpoint='product')
         res.raise_for_status()
 
         return res
 
-    def _is_current_navigation(self, scripted):
-        current_navigation_script = self.current_navigation_pattern.search(scripted)
-
-        if current_navigation_script:
-            return self._script_to_json(current_navigation_script.group(1))
-
-    def _is_product_description(self, scripted):
-        production_desc_script = self.product_description_pattern.search(scripted)
-        if production_desc_script:
-            return self._script_to_json(production_desc_script.group(1))
-
-    def _is_price_compare(self, scripted):
-        price_compare_script = self.price_compare_pattern.search(scripted)
-        if price_compare_script:
-            return self._script_to_json(price_compare_script.group(1))
-
-    def _is_global_setting(self, scripted):
-        global_setting_script = self.global_setting_pattern.search(scripted)
-        if global_setting_script:
-            return self._script_to_json(global_setting_script.group(1))
-
-    def _is_physical_category(self, scripted):
-        physical_category_script = self.physical_category_name_list_pattern.search(scripted)
-        if physical_category_script:
-            cate_list = physical_category_script.group(1)
-            # string list 를 list 타입으로 변경한다
-            cate_list = ast.literal_eval(cate_list)
-            # escape 문자열을 삭제한다
-            cate_list = [i.replace('\\', '').strip() for i in cate_list]
-            return cate_list
-
     # 상품 페이지의 내용 중 script 에 포함된 'oPriceCompareSetting', 'oProductDescriptionInfo',
     # 'oGlobalSetting', 'oCurrentNavigation' 변수를 dictionary 로 설정
     # 'oPriceCompareSetting' : 가격비교 요청을 위한 Parameter 설정에 사용
     # 'oProductDescriptionInfo' : 상품 상세정보 요청을 위한 Parameter 설정에 사용
     # 'oGlobalSetting' : cate1 ~ 4 번호는 추가 변수 설정에 사용
     # 'oCurrentNavigation' : Category name 과 no 를 저장하기 위해 사용
-    # script_data =  bs.find_all('script', {'src': False})
-    # parsed_html_script(script_data)
+    # script_data: src 속성이 없는 script 의 문자열 목록(extractor().product_page()['scripts'])
     def parsed_html_script(self, script_data) -> dict:
         ret = {
             'current_navigation': {},
@@ -345,21 +423,8 @@ class DanawaCrawler:
             'physical_category': {}
         }
 
-        for script in script_data:
-            scripted = script.string.replace('\r', '').replace('\n', '').replace('\t', '')
-            if not ret['current_navigation']:
-                ret['current_navigation'] = self._is_current_navigation(scripted)
-
-            if not ret['global_setting']:
-                ret['global_setting'] = self._is_global_setting(scripted)
-
-            if not ret['product_description']:
-                ret['product_description'] = self._is_product_description(scripted)
-
-            if not ret['price_compare']:
-                ret['price_compare'] = self._is_price_compare(scripted)
-            if not ret['physical_category']:
-                ret['physical_category'] = self._is_physical_category(scripted)
+        with metrics().timer('extract', page='product_script'):
+            ret.update(script_variables(script_data, self.cate))
 
         self._set_param_global_setting(ret['global_setting'], ret['current_navigation'])
         ret['product_description'] = self._set_param_product_description(ret)
@@ -377,30 +442,30 @@ class DanawaCrawler:
         headers = self._headers('POST')
         proxies = self.proxy.get()
 
-        res = requests.post(url, data=parameter, headers=headers, proxies=proxies)
+        res = session_pool().post(url, data=parameter, headers=headers, proxies=proxies, endpoint='price_compare')
         res.raise_for_status()
 
         return res
 
-    def read_danawa_review(self, page=1) -> requests:
+    def read_danawa_review(self, page=1, stream=False) -> requests:
         url = self.url_set['danawa_review'].format(prodcode=self.pcode, page=page,
                                                    limit=self.limit, timestamp=self._timestamp())
         headers = self._headers('GET')
         proxies = self.proxy.get()
 
         # 헤더 문제
-        res = requests.get(url, headers=headers, proxies=proxies)
+        res = session_pool().get(url, headers=headers, proxies=proxies, stream=stream, endpoint='danawa_review')
         res.raise_for_status()
 
         return res
 
-    def read_mall_review(self, page=1) -> requests:
+    def read_mall_review(self, page=1, stream=False) -> requests:
         url = self.url_set['mall_review'].format(prodcode=self.pcode, page=page, limit=self.limit, cate1=self.cate1,
                                                  timestamp=self._timestamp())
         headers = self._headers('GET')
         proxies = self.proxy.get()
 
-        res = requests.get(url, headers=headers, proxies=proxies)
+        res = session_pool().get(url, headers=headers, proxies=proxies, stream=stream, endpoint='mall_review')
         res.raise_for_status()
 
         return res
@@ -485,143 +550,3 @@ class DanawaCrawler:
             price_inner_list.append(obj)
 
         return price_inner_list
-
-    @staticmethod
-    def _parsed_danawa_comment(comment) -> dict:
-        try:
-            nickname = comment.find('div', {'class': 'cont_area'}) \
-                .find('div', {'class': 'r_info'}) \
-                .find('div', {'class': 'user_info'}) \
-                .find('a', {'class': 'id_name danawa-prodBlog-memberInfo-clazz'}) \
-                .strong \
-                .get_text() \
-                .strip()
-        except AttributeError:
-            nickname = None
-
-        try:
-            comment_date = comment.find('div', {'class': 'cont_area'}) \
-                .find('div', {'class': 'r_info'}) \
-                .find('span', {'class': 'date'}) \
-                .get_text() \
-                .strip()
-        except AttributeError:
-            comment_date = None
-        else:
-            comment_date = int(time.mktime(datetime.datetime.strptime(comment_date, '%Y.%m.%d %H:%M:%S').timetuple()))
-
-        try:
-            comment_ip = comment.find('div', {'class': 'cont_area'}) \
-                .find('div', {'class': 'r_info'}) \
-                .find('span', {'class': 'ip'}) \
-                .get_text() \
-                .strip()
-        except AttributeError:
-            comment_ip = None
-        try:
-            comment_text = comment.find('div', {'class': 'cont_area'}) \
-                .find('div', id=re.compile('^danawa-prodBlog-productOpinion-list-wrap-\d+$')) \
-                .find('div', id=re.compile('^danawa-prodBlog-productOpinion-content-text-\d+$'))
-        except AttributeError:
-            comment_text = None
-        else:
-            if comment_text:
-                comment_text = comment_text.get_text().strip()
-            else:
-                comment_text = None
-
-        try:
-            comment_recommend = comment.find('div', {'class': 'cont_area'}) \
-                .find('div', id=re.compile('^danawa-prodBlog-productOpinion-list-wrap-\d+$')) \
-                .find('button', id=re.compile('^danawa-prodBlog-productOpinion-button-recommend-\d+$'))
-        except:
-            comment_recommend = 0
-        else:
-            if comment_recommend:
-                comment_recommend = comment_recommend.find('span', {'class': 'num_c'}).get_text(strip=True)
-                if comment_recommend:
-                    comment_recommend = int(comment_recommend)
-                else:
-                    comment_recommend = 0
-            else:
-                comment_recommend = 0
-
-        return {
-            'userName': nickname,
-            'publishedAtTimestamp': comment_date,
-            'userIp': comment_ip,
-            'contentText': comment_text,
-            'likeCount': comment_recommend,
-            'review': 'danawa'
-        }
-
-    def parsed_danawa_review(self, comment_list) -> list:
-        comment_ret_list = []
-
-        for comment in comment_list:
-            # 대댓글이 있는 경우에는 sub_item 을 포함하고 있으므로, 체크한 후 처리하지 않고 넘긴다
-            if 'sub_item' in comment.get('class'):
-                continue
-
-            comment_content = self._parsed_danawa_comment(comment)
-            comment_ret_list.append(comment_content)
-
-        return comment_ret_list
-
-    @staticmethod
-    def parsed_mall_review(comment_list) -> list:
-        comment_ret_list = []
-
-        for comment in comment_list:
-            try:
-                if not comment.get('id').startswith('danawa-prodBlog'):
-                    # 리뷰가 아닌 li 태그가 검색되어 Loop 에 포함된 경우에는 무시한다
-                    continue
-            except AttributeError:
-                continue
-
-            try:
-                user_point = comment.find('div', {'class': 'top_info'}).find('span', {'class': 'star_mask'}).get_text()
-            except AttributeError:
-                user_point = None
-            else:
-                user_point = user_point.replace('점', '')
-
-            try:
-                comment_date = comment.find('div', {'class': 'top_info'}).find('span', {'class': 'date'}).get_text().strip()
-            except AttributeError:
-                comment_date = None
-            else:
-                comment_date = int(time.mktime(datetime.datetime.strptime(comment_date, '%Y.%m.%d').timetuple()))
-
-            try:
-                buy_mall = comment.find('div', {'class': 'top_info'}).find('span', {'class': 'mall'}).get_text().strip()
-            except AttributeError:
-                buy_mall = None
-
-            try:
-                nickname = comment.find('div', {'class': 'top_info'}).find('span', {'class': 'name'}).get_text().strip()
-            except AttributeError:
-                nickname = None
-
-            try:
-                comment_title = comment.find('div', {'class': 'rvw_atc'}).find('div', {'class': 'tit_W'}).find('p').get_text().strip()
-            except AttributeError:
-                comment_title = None
-
-            try:
-                comment_text = comment.find('div', {'class': 'rvw_atc'}).find('div', {'class': 'atc'}).get_text().strip()
-            except AttributeError:
-                comment_text = None
-
-            obj = {
-                'ratingPoint': user_point,
-                'publishedAtTimestamp': comment_date,
-                'userName': nickname,
-                'review': buy_mall,
-                'contentTitle': comment_title,
-                'contentText': comment_text
-            }
-            comment_ret_list.append(obj)
-
-        return comment_ret_list
@@ -0,0 +1,344 @@
+import re
+import time
+import logging
+import datetime
+
+from bs4.dammit import UnicodeDammit
+from lxml import etree
+from lxml.html import soupparser
+
+import config
+from danawa import spec
+from danawa.partial import PARTIALS, partial_markup
+from utils.metrics import metrics
+
+
+# 다나와 리뷰 요소 id
+DANAWA_COMMENT_ID = re.compile(r'^danawa-prodBlog-productOpinion-list-self-\d+$')
+
+
+def decode(content: bytes or str) -> str:
+    if isinstance(content, str):
+        return content
+
+    try:
+        return content.decode('utf-8')
+    except UnicodeDecodeError:
+        return UnicodeDammit(content, is_html=True).unicode_markup
+
+
+def partial_document(content: bytes or str, page: str = None) -> str or None:
+    """
+    config.PARSER['PARTIAL'] 이 켜져 있으면 page type 에서 값을 추출하는 요소만 남긴 HTML 을 반환한다
+    """
+    if not page or not config.PARSER['PARTIAL']:
+        return None
+
+    text = decode(content)
+    markup = partial_markup(text, page)
+    if markup is None and page in PARTIALS:
+        # 댓글이 없는 페이지 외에 페이지 구조가 바뀐 경우에도 전체 파싱으로 넘어가므로 횟수를 남긴다
+        metrics().increment('partial_parse_fallback', page=page)
+        logging.debug(f'partial parse fallback | page: {page} | size: {len(text)}')
+
+    return markup
+
+
+def join_item_names(item_name: str, price_list: list) -> list:
+    """
+    가격별 상품명과 원래 상품명을 합친다
+    """
+    ret = []
+    for i in price_list:
+        if i['item']:
+            name = f'{item_name}({i["item"]})'
+        else:
+            name = item_name
+        ret.append({
+            'item': name,
+            'url': i['url']
+        })
+
+    return ret
+
+
+def registration_timestamp(text: str) -> int or None:
+    """
+    '등록월: 2019.11' 형식의 등록월을 timestamp 로 변환한다
+    """
+    try:
+        registration_month = text.split(':')[1].strip()
+    except IndexError:
+        return None
+
+    return int(time.mktime(datetime.datetime.strptime(registration_month, '%Y.%m').timetuple()))
+
+
+def maker_name(text: str) -> str or None:
+    """
+    '제조사: OOO' 형식에서 제조사명을 반환한다
+    """
+    try:
+        return text.split(':')[1].strip()
+    except IndexError:
+        return None
+
+
+def empty_price_summary() -> dict:
+    return {
+        'mall': None,
+        'price': None,
+        'shipping': None,
+        'benefit': None,
+        'option': None,
+        'summary_rank': None
+    }
+
+
+# 상품 목록, 상품, 리뷰 페이지의 schema
+PRICE_ITEM = spec.Schema('search.price_item', [
+    spec.Field('item', ('p.memory_sect',), value='strip_text'),
+    spec.Field('url', ('p.memory_sect', 'a'), value='@href')
+])
+
+PRICE_SUMMARY = spec.Schema('product.price_summary', [
+    spec.Field('mall', ('td.mall', 'img'), value='@alt', post=(spec.strip,),
+               fallback=spec.Field('mall_logo', ('td.mall', 'div.logo_over', 'a'), value='strip_text')),
+    spec.Field('price', ('td.price', 'span.txt_prc', 'em'), post=(spec.strip, spec.number)),
+    spec.Field('shipping', ('td.ship', 'span.stxt'), post=(spec.strip, spec.number)),
+    spec.Field('benefit', ('td.bnfit', 'a'), post=(spec.strip,)),
+    spec.Field('option', value='@class', post=(spec.first_class,))
+])
+
+PRODUCT = spec.Schema('product', [
+    spec.Field('productName', ('div.top_summary', 'h3')),
+    spec.Field('publishedAtTimestamp',
+               ('div.summary_info', 'div.detail_summary', 'div.thumb_area', 'div.made_info', 'span.txt'),
+               post=(registration_timestamp,)),
+    spec.Field('brands', ('div.summary_info', 'div.detail_summary', 'div.thumb_area', 'span#makerTxtArea'),
+               value='strip_text', post=(maker_name,))
+])
+
+_R_INFO = ('div.cont_area', 'div.r_info')
+_LIST_WRAP = ('div.cont_area', r"div[re:test(@id, '^danawa-prodBlog-productOpinion-list-wrap-\d+$')]")
+
+DANAWA_COMMENT = spec.Schema('danawa_review.comment', [
+    spec.Field('userName', _R_INFO + ('div.user_info',
+                                      'a[normalize-space(@class)="id_name danawa-prodBlog-memberInfo-clazz"]',
+                                      'strong'),
+               post=(spec.strip,)),
+    spec.Field('publishedAtTimestamp', _R_INFO + ('span.date',),
+               post=(spec.strip, spec.timestamp('%Y.%m.%d %H:%M:%S'))),
+    spec.Field('userIp', _R_INFO + ('span.ip',), post=(spec.strip,)),
+    spec.Field('contentText', _LIST_WRAP + (r"div[re:test(@id, '^danawa-prodBlog-productOpinion-content-text-\d+$')]",),
+               post=(spec.strip,)),
+    spec.Field('likeCount',
+               _LIST_WRAP + (r"button[re:test(@id, '^danawa-prodBlog-productOpinion-button-recommend-\d+$')]",
+                             'span.num_c'),
+               value='strip_text', post=(spec.int_or_none,), default=0)
+], constants={'review': 'danawa'})
+
+MALL_COMMENT = spec.Schema('mall_review.comment', [
+    spec.Field('ratingPoint', ('div.top_info', 'span.star_mask'), post=(lambda value: value.replace('점', ''),)),
+    spec.Field('publishedAtTimestamp', ('div.top_info', 'span.date'), post=(spec.strip, spec.timestamp('%Y.%m.%d'))),
+    spec.Field('userName', ('div.top_info', 'span.name'), post=(spec.strip,)),
+    spec.Field('review', ('div.top_info', 'span.mall'), post=(spec.strip,)),
+    spec.Field('contentTitle', ('div.rvw_atc', 'div.tit_W', 'p'), post=(spec.strip,)),
+    spec.Field('contentText', ('div.rvw_atc', 'div.atc'), post=(spec.strip,))
+])
+
+# schema 밖에서 목록과 영역을 찾는 XPath
+_SEARCH_ITEM_COUNT = spec.first('div.category_selector', 'div.tab_header', 'ul.goods_type', 'a.vmTab')
+_SEARCH_ITEMS = spec.find_all('div[normalize-space(@class)="main_prodlist main_prodlist_list"]', 'ul.product_list',
+                              'li.prod_item')
+_ITEM_NAME = spec.first('div.prod_main_info', 'div.prod_info', 'p.prod_name', 'a')
+_ITEM_PRICES = spec.find_all('div.prod_main_info', 'div.prod_pricelist', 'ul', 'li')
+_ITEM_PRICE_DROPS = (spec.first('span.rank'), spec.first('em.lowest'), spec.first('span.memory_price_sect'))
+_INLINE_SCRIPTS = etree.XPath('descendant::script[not(@src)]')
+_LOWEST_TABLE = spec.first('div.lowest_area', 'div.lowest_list', 'table.lwst_tbl', 'tbody.high_list')
+_LOWEST_ROWS = etree.XPath('descendant::tr')
+_REVIEW_TABS_AREA = spec.first('div[normalize-space(@class)="sub_tab sub_tab_v2"]')
+_REVIEW_TABS = spec.find_all('div[normalize-space(@class)="sub_tab sub_tab_v2"]', 'li.tab_item')
+_DANAWA_TAB = spec.first('a#danawa-prodBlog-productOpinion-button-tab-productOpinion')
+_MALL_TAB = spec.first('a#danawa-prodBlog-productOpinion-button-tab-companyReview')
+_TAB_COUNT = spec.first('span.cen_w', 'strong')
+_DANAWA_REVIEW = spec.first('div.danawa_review')
+_DANAWA_COMMENTS_AREA = spec.first('div.post_comments', 'ul')
+_DANAWA_COMMENTS = spec.find_all('div.post_comments', 'ul',
+                                 r"li[re:test(@id, '^danawa-prodBlog-productOpinion-list-self-\d+$')]")
+_BODY = spec.first('body')
+_MALL_COMMENTS_AREA = spec.first('div.mall_review', 'div.area_right', 'ul.rvw_list')
+_MALL_COMMENTS = spec.find_all('div.mall_review', 'div.area_right', 'ul.rvw_list', 'li')
+
+
+class LxmlExtractor:
+    """
+    lxml 트리에서 import 시점에 컴파일한 schema 로 값을 추출한다
+    """
+    name = 'lxml'
+
+    @staticmethod
+    def document(content: bytes or str, page: str = None) -> etree._Element:
+        """
+        page type 이 주어지면 값을 추출하는 요소만 파싱한다
+        """
+        content = partial_document(content, page) or decode(content)
+
+        try:
+            root = etree.HTML(content)
+        except ValueError:
+            # encoding 선언이 있는 문자열은 bytes 로 파싱한다
+            root = etree.HTML(content.encode('utf-8'))
+
+        # 빈 문서는 BeautifulSoup 처럼 빈 html 로 처리한다
+        if root is None:
+            root = etree.HTML('<html><body></body></html>')
+
+        return root
+
+    @staticmethod
+    def _drop(element) -> None:
+        """
+        BeautifulSoup 의 decompose() 처럼 요소만 삭제하고 뒤에 이어지는 text 는 남긴다
+        """
+        parent = element.getparent()
+        if element.tail:
+            previous = element.getprevious()
+            if previous is not None:
+                previous.tail = (previous.tail or '') + element.tail
+            else:
+                parent.text = (parent.text or '') + element.tail
+        parent.remove(element)
+
+    def item_parse(self, item) -> list:
+        item_name = spec.node(_ITEM_NAME, item)
+        item_name = spec.strip_text(item_name) if item_name is not None else None
+
+        price_list = []
+        for item_price in _ITEM_PRICES(item):
+            for drop in _ITEM_PRICE_DROPS:
+                drop_node = spec.node(drop, item_price)
+                if drop_node is not None:
+                    self._drop(drop_node)
+
+            price_list.append(PRICE_ITEM.extract(item_price))
+
+        return join_item_names(item_name, price_list)
+
+    def search_page(self, data) -> tuple:
+        count_tab = spec.node(_SEARCH_ITEM_COUNT, data)
+        try:
+            item_count = int(count_tab.get('data-count'))
+        except (AttributeError, TypeError, ValueError):
+            item_count = None
+
+        item_list = _SEARCH_ITEMS(data)
+        if not item_list:
+            return item_count, None
+
+        items = []
+        for item in item_list:
+            items.extend(self.item_parse(item))
+
+        return item_count, items
+
+    @staticmethod
+    def product_page(data) -> dict:
+        product = PRODUCT.extract(data)
+
+        lowest_table = spec.node(_LOWEST_TABLE, data)
+        if lowest_table is None:
+            product['priceSummary'] = [empty_price_summary()]
+        else:
+            product['priceSummary'] = [dict(PRICE_SUMMARY.extract(lowest), summary_rank=summary_rank)
+                                       for summary_rank, lowest in enumerate(_LOWEST_ROWS(lowest_table), 1)]
+
+        product['scripts'] = [script.text for script in _INLINE_SCRIPTS(data) if script.text]
+
+        return product
+
+    @staticmethod
+    def review_counts(data) -> tuple:
+        if spec.node(_REVIEW_TABS_AREA, data) is None:
+            raise AttributeError('review tab not found')
+
+        danawa_review_count = 0
+        mall_review_count = 0
+        for review in _REVIEW_TABS(data):
+            danawa_tab = spec.node(_DANAWA_TAB, review)
+            mall_tab = spec.node(_MALL_TAB, review)
+            if danawa_tab is not None:
+                count = spec.node(_TAB_COUNT, danawa_tab)
+                if count is None:
+                    continue
+                danawa_review_count = spec.text(count).replace(',', '')
+
+            if mall_tab is not None:
+                count = spec.node(_TAB_COUNT, mall_tab)
+                if count is None:
+                    continue
+                mall_review_count = spec.text(count).replace(',', '')
+
+        return int(danawa_review_count), int(mall_review_count)
+
+    @staticmethod
+    def danawa_review(data) -> list or None:
+        danawa_review_check = spec.node(_DANAWA_REVIEW, data)
+        if danawa_review_check is not None:
+            if spec.node(_DANAWA_COMMENTS_AREA, danawa_review_check) is None:
+                raise AttributeError('danawa review comment list not found')
+
+            # 대댓글이 있는 경우에는 sub_item 을 포함하고 있으므로, 체크한 후 처리하지 않고 넘긴다
+            return [DANAWA_COMMENT.extract(comment) for comment in _DANAWA_COMMENTS(danawa_review_check)
+                    if 'sub_item' not in comment.get('class', '').split()]
+
+        body = spec.node(_BODY, data)
+        if body is not None and 'NO_CONTENT' in spec.strip_text(body):
+            return None
+
+        return []
+
+    @staticmethod
+    def mall_review(data) -> list:
+        if spec.node(_MALL_COMMENTS_AREA, data) is None:
+            raise AttributeError('mall review comment list not found')
+
+        # 리뷰가 아닌 li 태그가 검색되어 Loop 에 포함된 경우에는 무시한다
+        return [MALL_COMMENT.extract(comment) for comment in _MALL_COMMENTS(data)
+                if comment.get('id', '').startswith('danawa-prodBlog')]
+
+
+class SoupExtractor(LxmlExtractor):
+    """
+    BeautifulSoup 으로 파싱하여 lxml 트리로 바꾼 후 LxmlExtractor 와 같은 schema 로 값을 추출한다
+    추출 규칙은 schema 한 곳에서 관리하고, backend 는 HTML 을 트리로 만드는 parser 만 다르다
+    """
+    name = 'bs4'
+
+    @staticmethod
+    def document(content: bytes or str, page: str = None) -> etree._Element:
+        """
+        page type 이 주어지면 값을 추출하는 요소만 파싱한다
+        """
+        content = partial_document(content, page) or decode(content)
+
+        return soupparser.fromstring(content, features='lxml')
+
+
+EXTRACTORS = {
+    SoupExtractor.name: SoupExtractor,
+    LxmlExtractor.name: LxmlExtractor
+}
+
+_extractors = {}
+
+
+def extractor(name: str = None):
+    """
+    config.PARSER['BACKEND'] 에 설정된 프로세스 전역 extractor 를 반환한다
+    """
+    name = name or config.PARSER['BACKEND']
+    if name not in _extractors:
+        _extractors[name] = EXTRACTORS[name]()
+
+    return _extractors[name]
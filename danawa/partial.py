@@ -0,0 +1,159 @@
+import re
+
+
+class Target:
+    """
+    부분 파싱에서 남길 요소. class_name 이 없으면 src 속성이 없는 요소(inline script)를 남긴다
+    전체 문서를 정규식으로 훑지 않도록 class 이름이나 태그를 str.find 로 찾은 후, 찾은 위치의 태그만 확인한다
+    """
+    def __init__(self, tag: str, class_name: str = None):
+        self.tag = tag
+        self.class_name = class_name
+        self.open_tag = f'<{tag}'
+        # 찾은 class 이름 앞까지가 tag 의 class 속성 값 안인지 확인한다. 속성 순서와 따옴표 안의 > 는 상관없다
+        self.class_attribute = re.compile(rf'<{tag}\b(?:[^<>"\']|"[^"]*"|\'[^\']*\')*?\bclass\s*=\s*["\']?(?:[^"\'<>]*\s)?$',
+                                          re.IGNORECASE)
+        self.src_attribute = re.compile(r'\bsrc\s*=', re.IGNORECASE)
+
+        if tag == 'script':
+            # script 내용은 HTML 이 아니므로 중첩을 세지 않고 처음 닫는 태그까지 남긴다
+            self.tags = re.compile(r'</script\s*>', re.IGNORECASE)
+        else:
+            self.tags = re.compile(rf'<(/?){tag}\b', re.IGNORECASE)
+
+    def _end(self, text: str, start: int) -> int:
+        """
+        start 에서 시작한 요소를 닫는 태그의 끝 위치를 반환한다. 닫는 태그가 없으면 문서 끝까지 남긴다
+        """
+        if self.tag == 'script':
+            match = self.tags.search(text, start)
+            return match.end() if match else len(text)
+
+        depth = 0
+        for match in self.tags.finditer(text, start):
+            depth += -1 if match.group(1) else 1
+            if depth == 0:
+                end = text.find('>', match.end())
+                return end + 1 if end >= 0 else len(text)
+
+        return len(text)
+
+    def _start(self, text: str, position: int) -> tuple:
+        """
+        position 이후 처음 나오는 대상 요소의 시작 위치를 찾는다. (시작 위치, 다음 검색 위치)를 반환한다
+        """
+        if self.class_name is None:
+            start = text.find(self.open_tag, position)
+            if start < 0:
+                return -1, -1
+
+            tag_end = text.find('>', start)
+            if tag_end < 0 or text[start + len(self.open_tag)].isalnum() \
+                    or self.src_attribute.search(text, start, tag_end):
+                return None, start + len(self.open_tag)
+
+            return start, start
+
+        index = text.find(self.class_name, position)
+        if index < 0:
+            return -1, -1
+
+        next_position = index + len(self.class_name)
+        following = text[next_position:next_position + 1]
+        start = text.rfind('<', 0, index)
+        if start < 0 or (following and (following.isalnum() or following in '_-')) \
+                or not self.class_attribute.match(text, start, index):
+            return None, next_position
+
+        return start, start
+
+    def regions(self, text: str) -> list:
+        ret = []
+        position = 0
+        while True:
+            start, position = self._start(text, position)
+            if start is None:
+                continue
+            if start < 0:
+                return ret
+
+            end = self._end(text, start)
+            ret.append((start, end))
+            position = end
+
+    def exists(self, text: str) -> bool:
+        position = 0
+        while True:
+            start, position = self._start(text, position)
+            if start is None:
+                continue
+
+            return start >= 0
+
+
+class Partial:
+    """
+    page type 별로 값을 추출하는 요소만 잘라내어, 파싱할 HTML 을 줄인다
+    남긴 요소 안에서도 값을 읽지 않는 excludes 요소는 잘라낸다
+    required 요소가 없는 페이지는 다른 부분의 text 를 읽을 수 있으므로 잘라내지 않는다
+    """
+    def __init__(self, targets: list, required: Target = None, excludes: list = None):
+        self.targets = targets
+        self.required = required
+        self.excludes = excludes or []
+
+    def _exclude(self, text: str, start: int, end: int, excluded: list) -> str:
+        """
+        start 부터 end 까지의 HTML 에서 excluded 영역을 뺀 HTML 을 반환한다
+        """
+        parts = []
+        position = start
+        for exclude_start, exclude_end in excluded:
+            if exclude_start < position or exclude_end > end:
+                continue
+            parts.append(text[position:exclude_start])
+            position = exclude_end
+        parts.append(text[position:end])
+
+        return ''.join(parts)
+
+    def markup(self, text: str) -> str or None:
+        """
+        남길 요소를 문서 순서대로 이어붙인 HTML 을 반환한다. 잘라낼 수 없는 페이지는 None 을 반환한다
+        """
+        if self.required is not None and not self.required.exists(text):
+            return None
+
+        regions = sorted(region for target in self.targets for region in target.regions(text))
+        excluded = sorted(region for target in self.excludes for region in target.regions(text))
+
+        # 다른 요소 안에 포함된 요소는 한번만 남긴다
+        parts = []
+        last_end = 0
+        for start, end in regions:
+            if start < last_end:
+                continue
+            parts.append(self._exclude(text, start, end, excluded))
+            last_end = end
+
+        return f'<html><body>{"".join(parts)}</body></html>'
+
+
+PARTIALS = {
+    # 검색 결과는 상품 목록에서도 상품명과 가격별 상품 링크만 읽으므로, 이미지, 스펙, 가격, 광고 상품은 잘라낸다
+    'search': Partial([Target('div', 'category_selector'), Target('div', 'main_prodlist')],
+                      excludes=[Target('div', 'thumb_image'), Target('dl', 'prod_spec_set'),
+                                Target('p', 'price_sect'), Target('li', 'prod_ad_item')]),
+    'product': Partial([Target('div', 'top_summary'), Target('div', 'summary_info'), Target('div', 'lowest_area'),
+                        Target('script')]),
+    # 댓글이 없는 페이지는 body 의 NO_CONTENT 를 확인하므로 잘라내지 않는다
+    'danawa_review': Partial([Target('div', 'sub_tab'), Target('div', 'danawa_review')],
+                             required=Target('div', 'danawa_review')),
+    'mall_review': Partial([Target('div', 'mall_review')])
+}
+
+
+def partial_markup(text: str, page: str) -> str or None:
+    partial = PARTIALS.get(page)
+
+    return partial.markup(text) if partial is not None else None
@@ -0,0 +1,40 @@
+from danawa.extractor import extractor
+from utils.metrics import metrics
+
+
+# 검색 결과 한 페이지에 표시되는 상품 수
+SEARCH_PAGE_SIZE = 90
+
+
+def search_page_count(item_count: int) -> int:
+    """
+    상품 개수로 검색 결과 page 수를 계산한다
+    """
+    if item_count % SEARCH_PAGE_SIZE == 0:
+        return int(item_count // SEARCH_PAGE_SIZE)
+
+    return int(item_count // SEARCH_PAGE_SIZE) + 1
+
+
+def parse_search_page(content: bytes) -> tuple:
+    """
+    getProductList.ajax.php 응답에서 전체 상품 개수와 가격별 상품 목록을 파싱한다
+    process pool 에서 실행할 수 있도록 parse tree 대신 pickle 가능한 dict 목록을 반환한다
+    페이지에 상품 목록이 없으면 상품 목록으로 None 을 반환한다
+    """
+    page_extractor = extractor()
+    with metrics().timer('parse', page='search'):
+        document = page_extractor.document(content, 'search')
+
+    with metrics().timer('extract', page='search'):
+        return page_extractor.search_page(document)
+
+
+def parse_search_page_measured(content: bytes) -> tuple:
+    """
+    process pool 에서 parse_search_page 를 실행하고, 자식 프로세스에서 기록한 metric 을 결과와 함께 반환한다
+    부모 프로세스에서 metrics().merge 로 합쳐야 parse, extract 시간과 partial_parse_fallback 횟수가 남는다
+    """
+    result = parse_search_page(content)
+
+    return result, metrics().take()
@@ -0,0 +1,228 @@
+import time
+import logging
+import datetime
+import threading
+
+from lxml import etree
+
+import config
+
+
+_NAMESPACES = {'re': 'http://exslt.org/regular-expressions'}
+
+# get_text() 와 get_text(strip=True) 에 해당하는 XPath
+_TEXT = etree.XPath('string()', smart_strings=False)
+_TEXT_NODES = etree.XPath('descendant::text()', smart_strings=False)
+
+
+def has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def selector(step: str) -> str:
+    """
+    'div.top_summary', 'div#id', 'div' 형식의 단계를 XPath 단계로 바꾼다
+    다른 조건이 필요한 단계는 XPath 그대로 쓴다(eg. 'li[re:test(@id, ...)]')
+    """
+    if '[' in step:
+        return step
+
+    if '#' in step:
+        tag, element_id = step.split('#', 1)
+        return f'{tag}[@id="{element_id}"]'
+
+    tag, *classes = step.split('.')
+    if not classes:
+        return tag
+
+    return f'{tag}[{" and ".join(has_class(name) for name in classes)}]'
+
+
+def first(*steps: str) -> etree.XPath:
+    """
+    BeautifulSoup 의 find().find() 처럼 각 단계에서 문서 순서상 첫번째 요소만 따라가는 XPath 를 만든다
+    """
+    return etree.XPath('/'.join(f'descendant::{selector(step)}[1]' for step in steps), namespaces=_NAMESPACES)
+
+
+def find_all(*steps: str) -> etree.XPath:
+    """
+    마지막 단계는 BeautifulSoup 의 find_all() 처럼 모든 요소를 찾는 XPath 를 만든다
+    """
+    path = [f'descendant::{selector(step)}[1]' for step in steps[:-1]] + [f'descendant::{selector(steps[-1])}']
+
+    return etree.XPath('/'.join(path), namespaces=_NAMESPACES)
+
+
+def node(xpath: etree.XPath, element):
+    if element is None:
+        return None
+
+    nodes = xpath(element)
+
+    return nodes[0] if nodes else None
+
+
+def text(element) -> str:
+    return _TEXT(element)
+
+
+def strip_text(element) -> str:
+    """
+    BeautifulSoup 의 get_text(strip=True) 와 같이 text node 마다 공백을 제거하여 합친다
+    """
+    return ''.join(value.strip() for value in _TEXT_NODES(element))
+
+
+# post-processor
+def strip(value: str) -> str:
+    return value.strip()
+
+
+def number(value: str) -> str:
+    """
+    '12,300원' 에서 ',' 와 '원' 을 제거한다
+    """
+    return value.replace(',', '').replace('원', '')
+
+
+def int_or_none(value: str) -> int or None:
+    return int(value) if value else None
+
+
+def timestamp(date_format: str):
+    def parse(value: str) -> int:
+        return int(time.mktime(datetime.datetime.strptime(value, date_format).timetuple()))
+
+    return parse
+
+
+def first_class(value: str) -> str or None:
+    classes = value.split()
+
+    return classes[0] if classes else None
+
+
+class FieldStats:
+    """
+    schema, field 별 추출 횟수, 값이 없었던 횟수와 추출 시간을 집계한다
+    STATS_LOG_INTERVAL 번 추출할 때마다 로그로 남기고 초기화하여, 마크업이 바뀌어 항상 None 이 되는 field 를 경고한다
+    여러 thread 에서 추출하므로 집계는 lock 안에서 한다
+    """
+    def __init__(self, settings: dict = None):
+        self.settings = settings or config.PARSER
+        self.fields = {}
+        self.extractions = {}
+        # extracted 에서 log 를 호출하므로 같은 thread 에서 다시 획득할 수 있는 lock 을 사용한다
+        self._lock = threading.RLock()
+
+    def add(self, schema: str, field: str, missed: bool, seconds: float) -> None:
+        with self._lock:
+            stat = self.fields.get((schema, field))
+            if stat is None:
+                stat = self.fields.setdefault((schema, field), [0, 0, 0.0])
+            stat[0] += 1
+            stat[1] += missed
+            stat[2] += seconds
+
+    def extracted(self, schema: str) -> None:
+        with self._lock:
+            count = self.extractions.get(schema, 0) + 1
+            self.extractions[schema] = count
+            if count >= self.settings['STATS_LOG_INTERVAL']:
+                self.log(schema)
+
+    def snapshot(self) -> list:
+        """
+        (schema, field, 추출 횟수, 값이 없었던 횟수, 평균 추출 시간(ms)) 목록을 반환한다
+        """
+        with self._lock:
+            return [(schema, field, calls, misses, seconds / calls * 1000 if calls else 0.0)
+                    for (schema, field), (calls, misses, seconds) in sorted(self.fields.items())]
+
+    def log(self, schema: str = None) -> None:
+        with self._lock:
+            for stat_schema, field, calls, misses, average_ms in self.snapshot():
+                if schema and stat_schema != schema:
+                    continue
+
+                message = f'extract | {stat_schema}.{field} | calls: {calls} | misses: {misses} | avg: {average_ms:.4f}ms'
+                if calls and misses == calls and f'{stat_schema}.{field}' not in self.settings['OPTIONAL_FIELDS']:
+                    logging.warning(f'{message} | always missing, check page markup')
+                else:
+                    logging.info(message)
+
+                del self.fields[(stat_schema, field)]
+            if schema:
+                self.extractions[schema] = 0
+            else:
+                self.extractions = {}
+
+
+field_stats = FieldStats()
+
+
+class Field:
+    """
+    추출할 값 하나의 선언
+    steps: 요소를 찾는 find() chain 단계, 비어 있으면 기준 요소 자체
+    value: 'text'(get_text()), 'strip_text'(get_text(strip=True)) 또는 '@속성명'
+    post: 값이 있을 때 순서대로 적용하는 post-processor
+    default: 요소나 값이 없을 때의 값
+    fallback: 값이 없을 때 대신 추출할 Field
+    """
+    def __init__(self, name: str, steps: tuple = (), value: str = 'text', post: tuple = (), default=None,
+                 fallback: 'Field' = None):
+        self.name = name
+        self.xpath = first(*steps) if steps else None
+        self.post = post
+        self.default = default
+        self.fallback = fallback
+
+        if value == 'text':
+            self.read = text
+        elif value == 'strip_text':
+            self.read = strip_text
+        elif value.startswith('@'):
+            attribute = value[1:]
+            self.read = lambda element: element.get(attribute)
+        else:
+            raise ValueError(f'unknown field value: {value}')
+
+    def extract(self, element):
+        target = node(self.xpath, element) if self.xpath is not None else element
+        value = self.read(target) if target is not None else None
+
+        if value is not None:
+            for post in self.post:
+                value = post(value)
+
+        if value is None and self.fallback is not None:
+            value = self.fallback.extract(element)
+
+        return value
+
+
+class Schema:
+    """
+    page type 별 Field 목록. import 시점에 XPath 를 컴파일하고, 추출 때마다 field 별 시간과 miss 를 기록한다
+    """
+    def __init__(self, name: str, fields: list, constants: dict = None, stats: FieldStats = None):
+        self.name = name
+        self.fields = fields
+        self.constants = constants or {}
+        self.stats = stats or field_stats
+
+    def extract(self, element) -> dict:
+        ret = {}
+        for field in self.fields:
+            start = time.perf_counter()
+            value = field.extract(element)
+            self.stats.add(self.name, field.name, value is None, time.perf_counter() - start)
+
+            ret[field.name] = field.default if value is None else value
+
+        ret.update(self.constants)
+        self.stats.extracted(self.name)
+
+        return ret
@@ -0,0 +1,148 @@
+import time
+import itertools
+
+from lxml import etree
+from bs4.dammit import EncodingDetector
+
+from danawa.extractor import DANAWA_COMMENT, MALL_COMMENT, DANAWA_COMMENT_ID, LxmlExtractor
+
+
+def _has_class(element, name: str) -> bool:
+    return name in element.get('class', '').split()
+
+
+def _is_danawa_comment(element) -> bool:
+    """
+    div.danawa_review > div.post_comments > ul 아래의 댓글 li 인지 확인한다. 대댓글(sub_item)은 제외한다
+    """
+    if not DANAWA_COMMENT_ID.match(element.get('id', '')) or _has_class(element, 'sub_item'):
+        return False
+
+    ancestors = [ancestor for ancestor in element.iterancestors('div')]
+
+    return any(_has_class(div, 'post_comments') for div in ancestors) \
+        and any(_has_class(div, 'danawa_review') for div in ancestors)
+
+
+def _is_mall_comment(element) -> bool:
+    """
+    div.mall_review > div.area_right > ul.rvw_list 아래의 리뷰 li 인지 확인한다
+    """
+    if not element.get('id', '').startswith('danawa-prodBlog'):
+        return False
+
+    parent = element.getparent()
+    if parent is None or parent.tag != 'ul' or not _has_class(parent, 'rvw_list'):
+        return False
+
+    ancestors = [ancestor for ancestor in parent.iterancestors('div')]
+
+    return any(_has_class(div, 'area_right') for div in ancestors) \
+        and any(_has_class(div, 'mall_review') for div in ancestors)
+
+
+# page type 별 (댓글 li 확인, 댓글 schema, 모두 읽은 후 페이지 구조를 확인하는 LxmlExtractor method)
+STREAMS = {
+    'danawa_review': (_is_danawa_comment, DANAWA_COMMENT, LxmlExtractor.danawa_review),
+    'mall_review': (_is_mall_comment, MALL_COMMENT, LxmlExtractor.mall_review)
+}
+
+
+class ReviewStream:
+    """
+    리뷰 페이지 응답을 chunk 단위로 파싱하여, 댓글 li 가 닫힐 때마다 LxmlExtractor 와 같은 댓글 dictionary 를 반환한다
+    반환한 li 는 트리에서 삭제하므로, 페이지의 댓글 수와 관계없이 트리에는 댓글 하나만큼의 요소만 남는다
+    모두 읽은 후 댓글이 없는 페이지(NO_CONTENT)이면 empty 가 True 가 되고,
+    댓글 목록 영역이 없으면 LxmlExtractor 와 같이 AttributeError 가 발생한다
+    seconds 에는 응답을 기다리거나 반환한 댓글을 저장하는 시간을 제외한 파싱, 추출 시간이 쌓인다
+    """
+    def __init__(self, chunks, page: str, encoding: str = 'utf-8'):
+        self.chunks = chunks
+        self.page = page
+        self.encoding = encoding
+        self.is_comment, self.schema, self.check = STREAMS[page]
+        self.empty = False
+        self.count = 0
+        self.seconds = 0.0
+
+    @staticmethod
+    def _prune(element) -> None:
+        """
+        반환한 댓글 li 의 내용과, 같은 목록에서 앞서 반환한 li 를 삭제한다
+        """
+        element.clear(keep_tail=True)
+        parent = element.getparent()
+        while element.getprevious() is not None:
+            del parent[0]
+
+    def _comments(self, parser):
+        start = time.perf_counter()
+        for _, element in parser.read_events():
+            if not self.is_comment(element):
+                continue
+
+            comment = self.schema.extract(element)
+            self._prune(element)
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+            yield comment
+            start = time.perf_counter()
+
+        self.seconds += time.perf_counter() - start
+
+    def __iter__(self):
+        parser = etree.HTMLPullParser(events=('end',), tag='li', encoding=self.encoding)
+        for chunk in self.chunks:
+            if chunk:
+                start = time.perf_counter()
+                parser.feed(chunk)
+                self.seconds += time.perf_counter() - start
+                yield from self._comments(parser)
+
+        start = time.perf_counter()
+        try:
+            root = parser.close()
+        except etree.XMLSyntaxError:
+            # 빈 응답은 LxmlExtractor 처럼 빈 html 로 처리한다
+            root = None
+        self.seconds += time.perf_counter() - start
+        yield from self._comments(parser)
+
+        start = time.perf_counter()
+        if root is None:
+            root = etree.HTML('<html><body></body></html>')
+
+        # 남은 트리로 댓글 목록 영역과 NO_CONTENT 를 확인한다. 댓글 li 는 이미 삭제되어 다시 추출되지 않는다
+        self.empty = self.check(root) is None
+        self.seconds += time.perf_counter() - start
+
+
+def stream_encoding(response, first_chunk: bytes) -> str:
+    """
+    스트리밍 응답은 모두 읽기 전에 parser 의 encoding 을 정해야 하므로
+    Content-Type 의 charset, 첫 chunk 의 BOM 이나 meta charset 순으로 확인하고, 모두 없으면 decode() 처럼 utf-8 로 읽는다
+    requests 는 charset 이 없는 text 응답의 encoding 을 ISO-8859-1 로 정하므로, charset 이 있을 때만 response.encoding 을 사용한다
+    """
+    content_type = response.headers.get('content-type', '')
+    if 'charset' in content_type.lower() and response.encoding:
+        return response.encoding
+
+    _, encoding = EncodingDetector.strip_byte_order_mark(first_chunk)
+
+    return encoding or EncodingDetector.find_declared_encoding(first_chunk, is_html=True) or 'utf-8'
+
+
+def stream_reviews(response, page: str, chunk_size: int, tee=None) -> ReviewStream:
+    """
+    stream=True 로 요청한 requests 응답을 chunk_size 단위로 읽는 ReviewStream 을 반환한다
+    tee 가 주어지면 chunk 를 tee(chunks) 를 거쳐 읽는다(eg. 응답 원문 보관)
+    """
+    chunks = response.iter_content(chunk_size=chunk_size)
+    if tee is not None:
+        chunks = tee(chunks)
+
+    # encoding 을 확인한 첫 chunk 는 다시 앞에 붙여 파싱한다
+    first_chunk = next(chunks, b'')
+
+    return ReviewStream(itertools.chain([first_chunk], chunks), page, stream_encoding(response, first_chunk))
@@ -1,17 +1,27 @@
 import logging
-import os
+import sys
 import time
+import asyncio
 import datetime
-from multiprocessing.pool import Pool
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import requests
 import sentry_sdk
-from bs4 import BeautifulSoup
 from rq import Queue
 
+import config
+
 from utils.logger import custom_logger
-from connector.connector import RedisConnector, MongoDBConnector
+from connector.connector import RedisConnector, MongoDBConnector, ensure_indexes
 from danawa.crawler import DanawaSearcher
+from danawa.async_searcher import AsyncDanawaSearcher, client_session
+from danawa.search import parse_search_page, parse_search_page_measured, search_page_count
+from utils.dedupe import ProductDedupe
+from utils.revisit import RevisitScheduler
+from utils.scheduler import enqueue_many
+from utils.session import session_pool
+from utils.metrics import metrics
+from utils.user_agent import user_agent_rotator
 
 custom_logger = custom_logger()
 logger = custom_logger.getLogger(__name__)
@@ -24,147 +34,209 @@ workerQueue = Queue('high', connection=RedisConnector().conn(), default_timeout=
 # Comment Queue
 commentQueue = Queue('low', connection=RedisConnector().conn(), default_timeout=1800)
 
+# 키워드간 상품 중복 확인
+dedupe = ProductDedupe()
 
-def item_parse(item: BeautifulSoup) -> list:
-    # 상품명 파싱: 이 값은 크롤링에 사용하지 않고, 로깅에 출력을 위해 파싱한다
-    # 상품명은 URL 로 상품 상세 정보에서 파싱할 때 별도로 파싱한다
-    try:
-        item_name = item.find('div', {'class': 'prod_main_info'})\
-            .find('div', {'class': 'prod_info'})\
-            .find('p', {'class': 'prod_name'})\
-            .find('a')\
-            .get_text(strip=True)
-    except AttributeError:
-        item_name = None
-
-    # 제품별 가격이 여러개 나와 있는 경우에 item_name 추가 및 개별 링크 설정
-    price_list = []
-    try:
-        item_price_list = item.find('div', {'class': 'prod_main_info'})\
-            .find('div', {'class': 'prod_pricelist'})\
-            .find('ul')\
-            .find_all('li')
-    except AttributeError:
-        price_list = []
-    else:
-        for item_price in item_price_list:
-            # x 위 로 표시되어 있는 span Tag 를 삭제한다
-            try:
-                item_price.find('span', {'class': 'rank'}).decompose()
-            except AttributeError:
-                pass
+# 상품 재방문 시간 관리
+revisit = RevisitScheduler()
 
-            # 제품 구분이나 단위가 아닌 ml당 가격 등 불필요 텍스트는 삭제한다
-            try:
-                item_price.find('em', {'class': 'lowest'}).decompose()
-            except AttributeError:
-                pass
-            try:
-                item_price.find('span', {'class': 'memory_price_sect'}).decompose()
-            except AttributeError:
-                pass
 
-            # 개별 상품 추가 이름 파싱(eg. '기획세트', '단품세트', '1개' 등)
-            try:
-                parted_item_price_name = item_price.find('p', {'class': 'memory_sect'}).get_text(strip=True)
-            except AttributeError:
-                parted_item_price_name = None
-
-            try:
-                item_link = item_price.find('p', {'class': 'memory_sect'}).find('a')['href']
-            except AttributeError:
-                item_link = None
-
-            obj = {
-                'item': parted_item_price_name,
-                'url': item_link
-            }
-            price_list.append(obj)
-
-    # 가격별 상품명과 원래 상품명을 합친다
-    ret = []
-    for i in price_list:
-        if i['item']:
-            name = f'{item_name}({i["item"]})'
+def item_scrape(items: list, keyword: str) -> tuple:
+    """
+    parse_search_page 로 파싱한 가격별 상품 목록을 worker Queue 에 한번에 넣는다
+    Queue 에 넣은 개수와 제외한 개수를 반환한다
+    """
+    job_args = []
+    skipped = 0
+    for item in items:
+        # item 상품명과 url 이 모두 있는 아이템의 경우에만 Queue 에 넣는다
+        if item['item'] and item['url']:
+            job_args.append((item['url'], keyword))
         else:
-            name = item_name
-        ret.append({
-            'item': name,
-            'url': i['url']
-        })
+            skipped += 1
+
+    # 재방문 시간이 되지 않은 상품과 다른 키워드에서 이미 검색된 상품은 상품 페이지를 다시 요청하지 않는다
+    due_args = revisit.filter(job_args)
+    crawl_args, alias_args = dedupe.filter(due_args)
+    skipped += len(job_args) - len(crawl_args) - len(alias_args)
+
+    enqueued = enqueue_many(workerQueue, 'worker.product_parser', crawl_args)
+    enqueued += enqueue_many(workerQueue, 'worker.product_alias', alias_args)
+    metrics().increment('search_items_skipped', skipped)
+    logging.info(f'enqueued: {enqueued}(alias: {len(alias_args)}) | skipped: {skipped} | {keyword}')
+
+    return enqueued, skipped
 
-    return ret
 
+def search_page(searcher: DanawaSearcher, keyword: str, page: int) -> tuple:
+    data = searcher.fetch(keyword, page)
+    logging.info(f'Current page: {page} of {searcher.limit} | {keyword}')
 
-def item_scrape(item_list: [BeautifulSoup], keyword: str) -> None:
+    return parse_search_page(data)
+
+
+def merge_pages(keyword: str, items: list, results: list) -> list:
     """
-    매개변수로 받은 상품 목록을 파싱하여 worker Queue 에 넣는다
+    page 2 부터의 검색 결과를 page 1 상품 목록에 합친다
+    요청에 실패한 page 는 결과 대신 예외가 들어있다
     """
-    for item in item_list:
-        parsed_item = item_parse(item)
-        # parse item 은 list 형태로 반환되므로 개별로 Queue 에 넣는다
-        for pitem in parsed_item:
-            logging.info(f'{pitem["item"]}'
-                         f' | {pitem["url"]}')
+    for page, result in enumerate(results, 2):
+        if isinstance(result, Exception):
+            logging.error(f'search page requests error(keyword: {keyword}, page: {page}): {repr(result)}')
+        elif result[1] is None:
+            logging.info(f'page inner item is none: {page}')
+        else:
+            items.extend(result[1])
 
-            # item 상품명과 url 이 모두 있는 아이템의 경우에만 Queue 에 넣는다
-            if pitem['item'] and pitem['url']:
-                workerQueue.enqueue('worker.product_parser', pitem['url'], keyword, job_timeout=43200, result_ttl=86400)
+    return items
 
 
 def main(keyword: str):
-    page = 1
     searcher = DanawaSearcher()
 
-    while page <= searcher.limit:
-        try:
-            data = searcher.fetch(keyword, page)
-        except Exception as e:
-            raise requests.RequestException(f'init search page requests error: {repr(e)}')
-        else:
-            data = BeautifulSoup(data, 'lxml')
+    try:
+        item_count, items = search_page(searcher, keyword, 1)
+    except Exception as e:
+        raise requests.RequestException(f'init search page requests error: {repr(e)}')
+
+    # 검색 결과의 item 개수로 page 수를 계산한다
+    if item_count is None:
+        logging.error(f'search item count parsed fail(keyword: {keyword})')
+        return
+    if items is None:
+        logging.info('page inner item is none: 1')
+        return
+    searcher.limit = search_page_count(item_count)
+
+    # page 수를 알고 나면 나머지 page 는 서로 의존하지 않으므로 동시에 요청한다
+    # 요청마다 proxy 를 선택하고 RateLimiter 가 요청 속도를 제한한다
+    pages = range(2, searcher.limit + 1)
+    if config.SEARCH['FAN_OUT']:
+        with ThreadPoolExecutor(max_workers=config.SEARCH['FAN_OUT_THREADS']) as executor:
+            futures = [executor.submit(search_page, searcher, keyword, page) for page in pages]
+            results = [future.exception() or future.result() for future in futures]
+    else:
+        results = []
+        for page in pages:
+            try:
+                results.append(search_page(searcher, keyword, page))
+            except Exception as e:
+                results.append(e)
+                break
+            if results[-1][1] is None:
+                break
+
+    item_scrape(merge_pages(keyword, items, results), keyword)
+
+    session_pool().log_stats()
+
+
+async def async_search_page(searcher: AsyncDanawaSearcher, keyword: str, page: int,
+                            executor: ProcessPoolExecutor) -> tuple:
+    data = await searcher.fetch(keyword, page)
+    logging.info(f'Current page: {page} of {searcher.limit} | {keyword}')
 
-        logging.info(f'Current page: {page} of {searcher.limit} | {keyword}')
+    # 자식 프로세스에서 기록한 파싱 metric 을 부모 프로세스의 metric 에 합친다
+    result, measured = await asyncio.get_event_loop().run_in_executor(executor, parse_search_page_measured, data)
+    metrics().merge(*measured)
 
-        # 페이지 limit 이 1이라면 검색 결과에서 item 개수로 page 수를 계산한다
-        if searcher.limit == 1:
+    return result
+
+
+async def sweep(keyword: str, session, semaphore: asyncio.Semaphore, executor: ProcessPoolExecutor) -> int:
+    """
+    키워드의 검색 결과 페이지를 요청하여 상품을 Queue 에 넣고, 요청한 page 수를 반환한다
+    파싱은 process pool 에서, Redis 를 사용하는 Queue 작업은 thread 에서 실행하여 event loop 를 막지 않는다
+    """
+    searcher = AsyncDanawaSearcher(session, semaphore)
+
+    try:
+        item_count, items = await async_search_page(searcher, keyword, 1, executor)
+    except Exception as e:
+        logging.error(f'search page requests error(keyword: {keyword}, page: 1): {repr(e)}')
+        return 0
+
+    if item_count is None:
+        logging.error(f'search item count parsed fail(keyword: {keyword})')
+        return 1
+    if items is None:
+        logging.info('page inner item is none: 1')
+        return 1
+    searcher.limit = search_page_count(item_count)
+
+    pages = range(2, searcher.limit + 1)
+    if config.SEARCH['FAN_OUT']:
+        results = await asyncio.gather(*[async_search_page(searcher, keyword, page, executor) for page in pages],
+                                       return_exceptions=True)
+    else:
+        results = []
+        for page in pages:
             try:
-                item_count = data.find('div', {'class': 'category_selector'})\
-                    .find('div', {'class': 'tab_header'})\
-                    .find('ul', {'class': 'goods_type'})\
-                    .find('a', {'class': 'vmTab'})['data-count']
-            except:
-                logging.error(f'search item count parsed fail(keyword: {keyword})')
+                results.append(await async_search_page(searcher, keyword, page, executor))
+            except Exception as e:
+                results.append(e)
                 break
-            else:
-                item_count = int(item_count)
-
-                # item 개수로 page 수를 계산하여 limit 를 설정한다
-                if item_count % 90 == 0:
-                    searcher.limit = int(item_count // 90)
-                else:
-                    searcher.limit = int(item_count // 90) + 1
-
-        item_list = data.find('div', {'class': 'main_prodlist main_prodlist_list'})\
-            .find('ul', {'class': 'product_list'})\
-            .find_all('li', {'class': 'prod_item'})
-        if item_list:
-            item_scrape(item_list, keyword)
-        else:
-            logging.info(f'page inner item is none: {page}')
+            if results[-1][1] is None:
+                break
+
+    items = merge_pages(keyword, items, results)
+    await asyncio.get_event_loop().run_in_executor(None, item_scrape, items, keyword)
+
+    return len(results) + 1
+
+
+async def async_main(keywords: list) -> int:
+    """
+    모든 키워드의 검색을 동시에 진행한다
+    동시 요청 수는 config.SEARCH['CONCURRENCY'] 로, 요청 속도는 RateLimiter 로 제한하므로
+    처리량은 CPU 수가 아니라 요청 한도에 따라 정해진다
+    """
+    semaphore = asyncio.Semaphore(config.SEARCH['CONCURRENCY'])
+    # searcher 마다 만드는 user agent 목록을 event loop 밖에서 미리 읽어 둔다
+    await asyncio.get_event_loop().run_in_executor(None, user_agent_rotator)
+
+    with ProcessPoolExecutor(max_workers=config.SEARCH['PARSE_PROCESSES']) as executor:
+        async with client_session() as session:
+            pages = await asyncio.gather(*[sweep(keyword, session, semaphore, executor) for keyword in keywords])
+
+    logging.info(f'search finished | keywords: {len(keywords)} | pages: {sum(pages)}')
+
+    return sum(pages)
+
+
+def revisit_dispatch() -> int:
+    """
+    재방문 시간이 된 상품을 worker Queue 에 넣는다
+    """
+    enqueued = 0
+    while True:
+        due_args = revisit.pop_due()
+        if not due_args:
             break
 
-        page += 1
-        time.sleep(60)
+        crawl_args, alias_args = dedupe.filter(due_args)
+        enqueued += enqueue_many(workerQueue, 'worker.product_parser', crawl_args)
+        enqueued += enqueue_many(workerQueue, 'worker.product_alias', alias_args)
+
+    logging.info(f'revisit enqueued: {enqueued}')
+
+    return enqueued
 
 
 if __name__ == '__main__':
     logging.info(f'Start crawling....{datetime.datetime.now()}')
     start = time.time()
 
-    proc_count = os.cpu_count()
-    pool = Pool(processes=proc_count)
-    pool.map(main, MongoDBConnector().random_keyword())
+    ensure_indexes()
+
+    # python main.py revisit: 재방문 시간이 된 상품만 Queue 에 넣는다
+    if len(sys.argv) > 1 and sys.argv[1] == 'revisit':
+        revisit_dispatch()
+    else:
+        asyncio.get_event_loop().run_until_complete(async_main(MongoDBConnector().random_keyword()))
 
     end = time.time()
     logging.info(f'End crawling... time taken: {end - start}')
+
+    # 검색 프로세스는 Prometheus 가 수집하기 전에 끝날 수 있으므로 단계별 시간을 로그로 남긴다
+    metrics().log()
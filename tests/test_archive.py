@@ -0,0 +1,97 @@
+import os
+import multiprocessing
+
+import pytest
+
+import config
+from connector.archive import SharedArchiveWriter, ArchiveReader, compact, replay, key_digest, SEGMENT_EXT, JOURNAL_EXT
+
+
+@pytest.fixture(params=['zlib', 'zstd'])
+def settings(request, tmp_path):
+    if request.param == 'zstd':
+        pytest.importorskip('zstandard')
+
+    return dict(config.ARCHIVE, PATH=str(tmp_path), CODEC=request.param)
+
+
+def page(pcode: int) -> bytes:
+    return f'<html><body>{pcode}</body></html>'.encode() * 20
+
+
+def write_pages(settings: dict, pcodes: range) -> None:
+    writer = SharedArchiveWriter(settings=settings)
+    for pcode in pcodes:
+        writer.add('product', str(pcode), page(pcode))
+
+
+def files(settings: dict, ext: str) -> list:
+    return sorted(name for name in os.listdir(settings['PATH']) if name.endswith(ext))
+
+
+def test_work_horses_share_one_segment(settings):
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=write_pages, args=(settings, range(start, start + 20)))
+                 for start in range(0, 160, 20)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert len(files(settings, SEGMENT_EXT)) == 1
+    reader = ArchiveReader(settings['PATH'])
+    for pcode in range(160):
+        assert reader.get('product', str(pcode))[1] == page(pcode)
+    assert sum(1 for segment in reader.segments() for _ in segment.records()) == 160
+
+
+def test_incomplete_record_is_truncated(settings):
+    write_pages(settings, range(2))
+    with open(os.path.join(settings['PATH'], files(settings, SEGMENT_EXT)[0]), 'ab') as f:
+        f.write(b'\x10\x00\x00\x00partial')
+    write_pages(settings, range(2, 4))
+
+    reader = ArchiveReader(settings['PATH'])
+    assert [meta['key'] for segment in reader.segments() for _, meta, _ in segment.records()] == ['0', '1', '2', '3']
+    assert reader.get('product', '3')[1] == page(3)
+
+
+def test_full_segment_is_sealed(settings):
+    settings['SEGMENT_SIZE'] = 300
+    write_pages(settings, range(10))
+
+    reader = ArchiveReader(settings['PATH'])
+    segments = reader.segments()
+    assert len(segments) > 1 and all(segment.sealed for segment in segments[:-1])
+    assert all(reader.get('product', str(pcode))[1] == page(pcode) for pcode in range(10))
+
+
+def test_compact_seals_shared_segment(settings):
+    write_pages(settings, range(5))
+    compact(settings['PATH'], settings)
+    write_pages(settings, range(5, 10))
+
+    assert len(files(settings, JOURNAL_EXT)) == 1
+    reader = ArchiveReader(settings['PATH'])
+    assert all(reader.get('product', str(pcode))[1] == page(pcode) for pcode in range(10))
+
+
+def test_open_segment_reads_partial_index_and_journal_tail(settings):
+    settings['JOURNAL_INDEX_INTERVAL'] = 8
+    write_pages(settings, range(20))
+
+    segment = ArchiveReader(settings['PATH']).segments()[0]
+    assert not segment.sealed and segment.codec == settings['CODEC']
+    assert all(segment.read(segment.find(key_digest('product', str(pcode))))[1] == page(pcode) for pcode in range(20))
+    # 부분 index 에 16개, journal 에서 나머지 4개만 읽는다
+    assert segment._count == 16 and len(segment._offsets) == 4
+    assert len(segment.offsets()) == 20
+
+
+def test_replay_splits_segment_into_record_ranges(settings):
+    write_pages(settings, range(25))
+
+    assert len(ArchiveReader(settings['PATH']).segments()) == 1
+    count, errors, _, _ = replay(settings['PATH'], processes=2, output=settings['PATH'] + '-replayed', batch=10)
+    assert count == 25
+    assert len(os.listdir(settings['PATH'] + '-replayed')) == 3
@@ -0,0 +1,41 @@
+import fakeredis
+import pytest
+
+from utils.cursor import ReviewCursor
+
+
+@pytest.fixture
+def redis():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def test_only_one_job_starts_a_chain(redis):
+    first = ReviewCursor('fid', 'danawa', redis).claim(1, 10)
+    second = ReviewCursor('fid', 'danawa', redis).claim(1, 10)
+
+    assert first and second is None
+
+
+def test_resumed_chain_supersedes_deferred_chain(redis):
+    cursor = ReviewCursor('fid', 'danawa', redis)
+    owner = cursor.claim(1, 10)
+    cursor.set(3, 10, owner)
+
+    # 다시 예약되어 대기하는 동안 cursor 가 갱신되지 않아 중단된 것으로 보고 이어서 진행한다
+    stopped = cursor.get()
+    resumed = cursor.claim(stopped['page'], stopped['limit'], stopped['owner'])
+
+    assert resumed and resumed != owner
+    assert cursor.get()['page'] == 3
+    assert cursor.owned_by(resumed) and not cursor.owned_by(owner)
+    # 같은 cursor 를 두번 이어서 진행하지 않는다
+    assert cursor.claim(stopped['page'], stopped['limit'], stopped['owner']) is None
+
+
+def test_legacy_cursor_without_owner(redis):
+    cursor = ReviewCursor('fid', 'mall', redis)
+    cursor.set(2, 5)
+
+    assert cursor.owned_by(None)
+    owner = cursor.claim(2, 5, cursor.get()['owner'])
+    assert owner and not cursor.owned_by(None)
@@ -0,0 +1,30 @@
+import fakeredis
+import pytest
+
+from utils.dedupe import ProductDedupe
+
+URL = 'http://prod.danawa.com/info/?pcode=1234&cate=567'
+
+
+@pytest.fixture
+def dedupe():
+    return ProductDedupe(fakeredis.FakeRedis(decode_responses=True))
+
+
+def test_failed_crawl_keeps_waiting_keywords(dedupe):
+    assert dedupe.filter([(URL, 'a')]) == ([(URL, 'a')], [])
+    # 크롤링이 끝나지 않은 상품의 키워드는 크롤링 job 이 함께 저장한다
+    assert dedupe.filter([(URL, 'b')]) == ([], [])
+
+    dedupe.release(ProductDedupe.product_key(URL))
+
+    assert dedupe.filter([(URL, 'c')]) == ([(URL, 'c')], [])
+    assert dedupe.keywords(ProductDedupe.product_key(URL)) == {'a', 'b', 'c'}
+
+
+def test_crawled_product_is_aliased(dedupe):
+    product = ProductDedupe.product_key(URL)
+    dedupe.filter([(URL, 'a')])
+    dedupe.store_document(product, {'fkey': product})
+
+    assert dedupe.filter([(URL, 'b')]) == ([], [(product, 'b', URL)])
@@ -0,0 +1,12 @@
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_main_imports_without_rq_connection():
+    # main 은 rq worker 밖에서 실행되므로 rq connection 없이 import 되어야 한다
+    result = subprocess.run([sys.executable, '-c', 'import main'], cwd=ROOT, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,45 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import utils.metrics as metrics_module
+from benchmark.extractor import fixture
+from danawa.search import parse_search_page_measured
+from utils.metrics import Metrics, metrics
+
+
+@pytest.fixture
+def parent_metrics(monkeypatch):
+    monkeypatch.setattr(metrics_module, '_metrics', Metrics())
+    return metrics()
+
+
+def counts(recorded: Metrics) -> dict:
+    return {(name, labels.get('page')): count for name, labels, count, _ in recorded.snapshot()}
+
+
+def test_parse_metrics_from_process_pool_reach_parent(parent_metrics):
+    # fork 전에 부모에서 기록한 값은 자식이 다시 보내지 않는다
+    parent_metrics.observe('fetch', 0.1, endpoint='search')
+    pages = [fixture('search.html')] * 3 + [b'<html><body></body></html>']
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        for _, measured in executor.map(parse_search_page_measured, pages):
+            parent_metrics.merge(*measured)
+
+    recorded = counts(parent_metrics)
+    assert recorded[('parse', 'search')] == 4 and recorded[('extract', 'search')] == 4
+    assert recorded[('fetch', None)] == 1
+
+
+def test_merge_adds_taken_counters_and_histograms(parent_metrics):
+    child = Metrics()
+    child.increment('partial_parse_fallback', page='danawa_review')
+    child.observe('parse', 0.01, page='danawa_review')
+    parent_metrics.observe('parse', 0.02, page='danawa_review')
+
+    parent_metrics.merge(*child.take())
+
+    assert child.take() == ({}, {})
+    assert parent_metrics.counters[('partial_parse_fallback', (('page', 'danawa_review'),))] == 1
+    assert parent_metrics.snapshot()[0][2:] == (2, pytest.approx(0.03))
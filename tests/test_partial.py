@@ -0,0 +1,39 @@
+import pytest
+
+from benchmark.extractor import PAGES, fixture, extract
+from danawa.extractor import EXTRACTORS
+from danawa.partial import Partial, Target
+
+
+@pytest.mark.parametrize('markup', [
+    '<div class="top_summary"><h3>name</h3></div>',
+    '<div id="summary" data-x="1" class="top_summary"><h3>name</h3></div>',
+    "<div data-x='a > b' class='prod top_summary extra'><h3>name</h3></div>",
+    '<DIV\n  CLASS = top_summary><h3>name</h3></DIV>',
+])
+def test_target_matches_class_regardless_of_attribute_order(markup):
+    text = f'<p class="top_summary_info">skip</p>{markup}<div class="other"></div>'
+
+    assert Target('div', 'top_summary').regions(text) == [(text.index(markup), text.index(markup) + len(markup))]
+
+
+def test_target_ignores_class_name_outside_class_attribute():
+    text = '<div data-name="top_summary" class="other"></div><p>top_summary</p>'
+
+    assert Target('div', 'top_summary').regions(text) == []
+
+
+def test_partial_drops_excluded_regions_inside_kept_regions():
+    text = '<div class="keep"><dl class="skip"><dl>x</dl></dl><p>value</p></div><dl class="skip"></dl>'
+    partial = Partial([Target('div', 'keep')], excludes=[Target('dl', 'skip')])
+
+    assert partial.markup(text) == '<html><body><div class="keep"><p>value</p></div></body></html>'
+
+
+@pytest.mark.parametrize('extractor_class', EXTRACTORS.values())
+@pytest.mark.parametrize('name, filename, method, page', PAGES)
+def test_partial_parse_matches_full_parse(extractor_class, name, filename, method, page):
+    extractor = extractor_class()
+    content = fixture(filename)
+
+    assert extract(extractor, method, content, page) == extract(extractor, method, content)
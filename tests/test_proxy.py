@@ -0,0 +1,49 @@
+import json
+import time
+import threading
+
+import fakeredis
+import pytest
+
+import config
+from utils.proxy import ProxyPool
+
+PROXY = {'protocol': 'http', 'user': 'user', 'password': 'password', 'ip': '10.0.0.1', 'port': 3128}
+
+
+class Pool(ProxyPool):
+    """
+    API 대신 fetched 목록을 반환하고 호출 횟수를 센다
+    """
+    def __init__(self, redis, fetched):
+        super().__init__(redis=redis, settings=dict(config.PROXY, LOCAL_TTL=0))
+        self.fetched = fetched
+        self.calls = 0
+
+    def _fetch(self):
+        self.calls += 1
+        return self.fetched
+
+
+@pytest.fixture
+def redis():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def cache(redis, proxies, age):
+    redis.set(ProxyPool.list_key.format(types=None), json.dumps({'fetchedAt': time.time() - age, 'proxies': proxies}))
+
+
+def test_empty_proxy_list_returns_no_proxy(redis):
+    assert Pool(redis, []).get() is None
+
+
+def test_stale_cache_is_refreshed_once_without_thread(redis, monkeypatch):
+    cache(redis, [PROXY], age=config.PROXY['REFRESH_INTERVAL'] + 1)
+    monkeypatch.setattr(threading.Thread, 'start', lambda self: pytest.fail('refresh started a thread'))
+    pools = [Pool(redis, [dict(PROXY, ip='10.0.0.2')]) for _ in range(3)]
+
+    assert all(pool.get() for pool in pools)
+    # lock 을 획득한 하나의 프로세스만 API 를 호출한다
+    assert [pool.calls for pool in pools] == [1, 0, 0]
+    assert json.loads(redis.get(ProxyPool.list_key.format(types=None)))['proxies'][0]['ip'] == '10.0.0.2'
@@ -0,0 +1,27 @@
+import config
+from benchmark import revisit_simulation
+from utils.revisit import optimal_interval
+
+# 1분 ~ 1년에 한번 바뀌는 상품
+PERIODS = [60 * 1.1 ** step for step in range(140)]
+
+
+def test_interval_decreases_as_change_rate_rises():
+    intervals = [optimal_interval(1 / period) for period in reversed(PERIODS)]
+
+    assert all(later < earlier for earlier, later in zip(intervals, intervals[1:]))
+
+
+def test_interval_has_no_jump():
+    intervals = [optimal_interval(1 / period) for period in PERIODS]
+
+    # 변경 주기가 10% 길어질 때 방문 간격도 10% 남짓만 길어진다
+    assert all(later / earlier < 1.11 for earlier, later in zip(intervals, intervals[1:]))
+
+
+def test_unchanged_product_uses_max_interval():
+    assert optimal_interval(0) == config.REVISIT['MAX_INTERVAL']
+
+
+def test_adaptive_revisit_saves_crawls_at_equal_freshness():
+    assert revisit_simulation.run(products=100, days=30, seed=0, volatile_ratio=0.1) > 0.1
@@ -0,0 +1,57 @@
+import os
+
+import fakeredis
+import mongomock
+import pytest
+from rq import Queue
+
+import connector.connector as connector
+import connector.sink as sink
+from connector.rq_worker import PersistentConnectionWorker
+
+# job 에서 확인한 (pid, MongoClient id) 목록
+seen_clients = []
+
+
+def record_connection():
+    seen_clients.append((os.getpid(), id(connector.MongoDBConnector().conn())))
+
+
+@pytest.fixture
+def worker_env(monkeypatch):
+    """
+    fakeredis 와 mongomock 으로 PersistentConnectionWorker 를 실행하고, MongoClient 생성 횟수를 pid 별로 센다
+    """
+    constructed = []
+
+    def mongo_client(*args, **kwargs):
+        constructed.append(os.getpid())
+        return mongomock.MongoClient()
+
+    redis = fakeredis.FakeRedis()
+    # fakeredis 는 rq 가 job 결과를 저장하는 XADD MAXLEN ~ 를 지원하지 않으므로, stream 이 없는 Redis 로 알린다
+    setattr(redis, '__rq_redis_server_version', (4, 0, 0))
+    monkeypatch.setattr(connector, 'MongoClient', mongo_client)
+    monkeypatch.setattr(connector, 'registry', connector.ConnectionRegistry())
+    monkeypatch.setattr('connector.rq_worker.registry', connector.registry)
+    connector.registry.clients['redis'] = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(sink, '_product_sink', sink.ProductSink(mongomock.MongoClient()['test']['products']))
+    seen_clients.clear()
+
+    yield redis, constructed
+
+    sink.product_sink().stop()
+
+
+def test_persistent_worker_creates_one_mongo_client(worker_env):
+    redis, constructed = worker_env
+    queue = Queue('high', connection=redis)
+    for _ in range(5):
+        queue.enqueue(record_connection)
+
+    PersistentConnectionWorker([queue], connection=redis).work(burst=True)
+
+    assert len(seen_clients) == 5
+    # 모든 job 이 warm_up 에서 만든 하나의 MongoClient 를 사용한다
+    assert constructed == [os.getpid()]
+    assert {client for _, client in seen_clients} == {seen_clients[0][1]}
@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+import pytest
+
+import config
+import utils.rate_limiter as rate_limiter
+import utils.scheduler as scheduler
+from utils.rate_limiter import RateLimiter, RateLimitExceeded, RetryLater, deferring
+from utils.session import SessionPool
+from danawa.async_searcher import AsyncDanawaSearcher
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def close(self):
+        pass
+
+
+class Job:
+    def __init__(self, retries=None):
+        self.meta = {} if retries is None else {'retries': retries}
+        self.origin = 'high'
+        self.connection = None
+
+
+class EmptyBucket(RateLimiter):
+    """
+    항상 토큰이 없는 RateLimiter
+    """
+    def __init__(self):
+        self.settings = config.RATE_LIMIT
+        self.calls = 0
+
+    def try_acquire(self, host, proxy=None):
+        self.calls += 1
+        return 2.0
+
+    async def acquire_async(self, host, proxy=None, max_wait=None):
+        self.try_acquire(host, proxy)
+        raise RateLimitExceeded(host, proxy, 0.01)
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    def sleep(seconds):
+        raise AssertionError(f'slept {seconds}s in job')
+
+    monkeypatch.setattr(time, 'sleep', sleep)
+
+
+def server_error_pool(monkeypatch, status=503):
+    pool = SessionPool()
+    sent = []
+    monkeypatch.setattr(pool, '_send', lambda *args, **kwargs: sent.append(args) or Response(status))
+
+    return pool, sent
+
+
+def test_acquire_in_job_does_not_wait(no_sleep):
+    limiter = EmptyBucket()
+
+    with deferring(), pytest.raises(RateLimitExceeded) as e:
+        limiter.acquire('prod.danawa.com')
+
+    assert limiter.calls == 1 and e.value.retry_after == 2.0
+
+
+def test_server_error_in_job_is_deferred_with_backoff(monkeypatch, no_sleep):
+    pool, sent = server_error_pool(monkeypatch)
+
+    with deferring(retries=1), pytest.raises(RetryLater) as e:
+        pool.get('http://prod.danawa.com/info/')
+
+    assert len(sent) == 1
+    assert e.value.retry_after == config.HTTP['RETRY_BACKOFF_FACTOR'] * 2 and e.value.retries == 2
+
+
+def test_server_error_is_returned_after_retry_total(monkeypatch, no_sleep):
+    pool, sent = server_error_pool(monkeypatch)
+
+    with deferring(retries=config.HTTP['RETRY_TOTAL']):
+        assert pool.get('http://prod.danawa.com/info/').status_code == 503
+
+
+@pytest.mark.parametrize('error, retries', [
+    (RetryLater('503', 0.5, retries=2), 2),
+    (RateLimitExceeded('prod.danawa.com', None, 0.5), 1),
+])
+def test_deferrable_reschedules_with_retries(monkeypatch, error, retries):
+    scheduled = []
+    seen = []
+    monkeypatch.setattr(scheduler, 'get_current_job', lambda: Job(retries=1))
+    monkeypatch.setattr(scheduler, 'Queue', lambda name, connection: name)
+    monkeypatch.setattr(scheduler, 'enqueue_in', lambda *args, **kwargs: scheduled.append((args, kwargs)))
+
+    @scheduler.deferrable
+    def job(url):
+        seen.append(rate_limiter.job_retries())
+        raise error
+
+    job('http://prod.danawa.com/info/')
+
+    assert seen == [1] and rate_limiter.job_retries() is None
+    assert scheduled == [(('high', 0.5, f'{__name__}.job', 'http://prod.danawa.com/info/'),
+                          {'meta': {'retries': retries}})]
+
+
+def test_async_search_waits_for_token_outside_semaphore(monkeypatch):
+    limiter = EmptyBucket()
+    monkeypatch.setattr('danawa.async_searcher.rate_limiter', lambda: limiter)
+
+    async def fetch():
+        # semaphore 를 잡으면 끝나지 않으므로, 토큰을 기다리는 동안 semaphore 를 잡지 않아야 한다
+        searcher = AsyncDanawaSearcher(session=None, semaphore=asyncio.Semaphore(0))
+        monkeypatch.setattr(searcher.proxy, 'get', lambda: None)
+        return await asyncio.wait_for(searcher.fetch('노트북'), 5)
+
+    with pytest.raises(RateLimitExceeded):
+        asyncio.get_event_loop().run_until_complete(fetch())
+
+    assert limiter.calls == config.SEARCH['RATE_LIMIT_RETRIES'] + 1
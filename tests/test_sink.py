@@ -0,0 +1,63 @@
+import mongomock
+import pytest
+
+import config
+from connector.sink import ProductSink
+
+
+class FailingCollection:
+    def __init__(self, collection):
+        self.collection = collection
+        self.fail = True
+
+    def with_options(self, **kwargs):
+        return self
+
+    def bulk_write(self, operations, ordered=True):
+        if self.fail:
+            raise ConnectionError('mongo is down')
+        return self.collection.bulk_write(operations, ordered=ordered)
+
+
+@pytest.fixture
+def collection():
+    return FailingCollection(mongomock.MongoClient()['test']['products'])
+
+
+def test_on_stored_waits_for_successful_flush(collection):
+    sink = ProductSink(collection, dict(config.PRODUCT_SINK, FLUSH_SIZE=100))
+    stored = []
+    sink.add_many([{'_id': 'a'}, {'_id': 'b'}], on_stored=lambda: stored.append('ab'))
+
+    with pytest.raises(ConnectionError):
+        sink.flush()
+    assert stored == [] and set(sink.buffer) == {'a', 'b'}
+
+    collection.fail = False
+    assert sink.flush() == 2
+    assert stored == ['ab'] and sink.pending == []
+
+
+def test_on_stored_waits_for_document_added_again_during_flush(collection):
+    collection.fail = False
+    sink = ProductSink(collection, dict(config.PRODUCT_SINK, FLUSH_SIZE=100))
+    stored = []
+    sink.add_many([{'_id': 'a'}, {'_id': 'b'}], on_stored=lambda: stored.append('ab'))
+
+    # 저장하는 동안 다른 job 이 b 를 다시 추가하면 b 의 새 값이 저장될 때까지 기다린다
+    bulk_write = collection.bulk_write
+    collection.bulk_write = lambda *args, **kwargs: (sink.add({'_id': 'b', 'v': 2}), bulk_write(*args, **kwargs))[1]
+    sink.flush()
+    assert stored == [] and set(sink.buffer) == {'b'}
+
+    collection.bulk_write = bulk_write
+    sink.flush()
+    assert stored == ['ab']
+
+
+def test_on_stored_without_documents_is_called_immediately(collection):
+    sink = ProductSink(collection)
+    stored = []
+    sink.add_many([], on_stored=lambda: stored.append(True))
+
+    assert stored == [True]
@@ -0,0 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from danawa.spec import FieldStats
+
+
+def test_field_stats_counts_every_thread():
+    stats = FieldStats(dict(config.PARSER, STATS_LOG_INTERVAL=10 ** 9))
+
+    def extract(_):
+        for _ in range(10000):
+            stats.add('search.price_item', 'item', True, 0.001)
+            stats.extracted('search.price_item')
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(extract, range(8)))
+
+    assert stats.snapshot()[0][2:4] == (80000, 80000)
+    assert stats.extractions['search.price_item'] == 80000
@@ -0,0 +1,46 @@
+import pytest
+
+from benchmark.extractor import fixture
+from danawa.extractor import LxmlExtractor
+from danawa.stream import stream_reviews
+
+
+class Response:
+    def __init__(self, content: bytes, content_type: str, encoding: str = None):
+        self.content = content
+        self.headers = {'content-type': content_type}
+        self.encoding = encoding
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+
+def euc_kr_page(filename: str, declare: bool) -> bytes:
+    text = fixture(filename).decode('utf-8')
+    if declare:
+        text = '<html><head><meta charset="euc-kr"></head>' + text
+
+    return text.encode('euc-kr')
+
+
+@pytest.mark.parametrize('page, filename', [('danawa_review', 'danawa_review.html'),
+                                            ('mall_review', 'mall_review.html')])
+@pytest.mark.parametrize('content_type, encoding, declare', [
+    ('text/html; charset=EUC-KR', 'EUC-KR', False),
+    ('text/html', 'ISO-8859-1', True),
+])
+def test_stream_reads_detected_encoding(page, filename, content_type, encoding, declare):
+    content = euc_kr_page(filename, declare)
+    expected = getattr(LxmlExtractor, page)(LxmlExtractor.document(content))
+
+    comments = list(stream_reviews(Response(content, content_type, encoding), page, 512))
+
+    assert expected and comments == expected
+
+
+def test_stream_defaults_to_utf8():
+    content = fixture('mall_review.html')
+    expected = LxmlExtractor.mall_review(LxmlExtractor.document(content))
+
+    assert list(stream_reviews(Response(content, 'text/html', 'ISO-8859-1'), 'mall_review', 512)) == expected
@@ -0,0 +1,86 @@
+import time
+import uuid
+
+from redis import WatchError
+
+import config
+from connector.connector import RedisConnector
+
+
+class ReviewCursor:
+    """
+    상품 리뷰 페이지 크롤링 진행 상황을 Redis 에 저장하여, 중단된 경우 다음 페이지부터 이어서 진행한다
+    cursor 를 가져간 job chain 의 owner 를 기록하여, 중단된 것으로 보고 이어서 진행한 경우 이전 chain 의 job 은 종료되도록 한다
+    """
+    cursor_key = 'review:cursor:{fid}:{source}'
+
+    def __init__(self, fid: str, source: str, redis=None):
+        self.fid = fid
+        self.source = source
+        self.redis = redis or RedisConnector().conn()
+        self.key = self.cursor_key.format(fid=fid, source=source)
+
+    def get(self) -> dict or None:
+        cursor = self.redis.hgetall(self.key)
+        if not cursor:
+            return None
+
+        return {
+            'page': int(cursor['page']),
+            'limit': int(cursor['limit']),
+            'updatedAt': float(cursor['updatedAt']),
+            'owner': cursor.get('owner')
+        }
+
+    def set(self, page: int, limit: int, owner: str = None) -> None:
+        cursor = {'page': page, 'limit': limit, 'updatedAt': time.time()}
+        if owner:
+            cursor['owner'] = owner
+
+        pipe = self.redis.pipeline()
+        pipe.hmset(self.key, cursor)
+        pipe.expire(self.key, config.SCHEDULE['REVIEW_CURSOR_TTL'])
+        pipe.execute()
+
+    def claim(self, page: int, limit: int, owner: str = None) -> str or None:
+        """
+        cursor 의 owner 가 owner 와 같은 경우에만 새 owner 로 cursor 를 가져오고 새 owner 를 반환한다
+        owner 가 None 이면 cursor 가 없거나 owner 가 없는 이전 버전 cursor 만 가져온다
+        다른 job 이 먼저 가져간 경우 None 을 반환한다
+        """
+        claimed = uuid.uuid4().hex
+        with self.redis.pipeline() as pipe:
+            try:
+                pipe.watch(self.key)
+                if pipe.hget(self.key, 'owner') != owner:
+                    return None
+
+                pipe.multi()
+                pipe.hmset(self.key, {'page': page, 'limit': limit, 'updatedAt': time.time(), 'owner': claimed})
+                pipe.expire(self.key, config.SCHEDULE['REVIEW_CURSOR_TTL'])
+                pipe.execute()
+            except WatchError:
+                return None
+
+        return claimed
+
+    def owned_by(self, owner: str = None) -> bool:
+        """
+        cursor 가 owner 의 chain 에 속해 있는지 확인한다
+        owner 가 없는 이전 버전 job 은 owner 가 없는 cursor 만 이어서 진행한다
+        """
+        return self.redis.hget(self.key, 'owner') == owner
+
+    def clear(self) -> None:
+        self.redis.delete(self.key)
+
+    def is_running(self) -> bool:
+        """
+        진행 중인 cursor 가 있는지 확인한다
+        일정 시간 동안 갱신되지 않은 cursor 는 job 이 실패한 것으로 보고 이어서 진행할 수 있도록 한다
+        """
+        cursor = self.get()
+        if not cursor:
+            return False
+
+        return time.time() - cursor['updatedAt'] < config.SCHEDULE['REVIEW_CURSOR_STALL']
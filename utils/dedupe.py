@@ -0,0 +1,162 @@
+import json
+import time
+import hashlib
+from urllib.parse import urlparse, parse_qsl
+
+import config
+from connector.connector import RedisConnector
+
+
+# 상품 여러개의 bit offset 을 한번에 받아, 현재나 직전 window 의 Bloom filter 에 있었는지 확인한 후 현재 window 에 추가한다
+BLOOM_CHECK_AND_ADD_SCRIPT = """
+local ttl = tonumber(ARGV[1])
+local hashes = tonumber(ARGV[2])
+local seen = {}
+
+for item = 0, (#ARGV - 2) / hashes - 1 do
+    local seen_current = 1
+    local seen_previous = 1
+    for i = 1, hashes do
+        local offset = ARGV[2 + item * hashes + i]
+        if redis.call('GETBIT', KEYS[1], offset) == 0 then
+            seen_current = 0
+            redis.call('SETBIT', KEYS[1], offset, 1)
+        end
+        if redis.call('GETBIT', KEYS[2], offset) == 0 then
+            seen_previous = 0
+        end
+    end
+
+    if seen_current == 1 or seen_previous == 1 then
+        seen[item + 1] = 1
+    else
+        seen[item + 1] = 0
+    end
+end
+
+redis.call('EXPIRE', KEYS[1], ttl)
+
+return seen
+"""
+
+
+class ProductDedupe:
+    """
+    여러 키워드에서 검색된 같은 상품을 window 시간 동안 한번만 크롤링하도록 Redis Bloom filter 로 중복을 확인한다
+    중복된 상품의 키워드는 상품 페이지를 다시 요청하지 않고 크롤링한 상품 정보로 키워드별 문서를 만든다
+    """
+    bloom_key = 'dedupe:product:bloom:{bucket}'
+    keywords_key = 'dedupe:product:keywords:{product}'
+    claim_key = 'dedupe:product:claim:{product}'
+    document_key = 'dedupe:product:document:{product}'
+
+    def __init__(self, redis=None, settings: dict = None):
+        self.settings = settings or config.DEDUPE
+        self.redis = redis or RedisConnector().conn()
+        self.script = self.redis.register_script(BLOOM_CHECK_AND_ADD_SCRIPT)
+
+    @staticmethod
+    def product_key(url: str) -> str or None:
+        """
+        상품 URL 의 pcode, cate 로 상품 key 를 만든다
+        """
+        parted_query_string = dict(parse_qsl(urlparse(url).query))
+        if 'pcode' not in parted_query_string:
+            return None
+
+        return f'{parted_query_string["pcode"]}_{parted_query_string.get("cate")}'
+
+    def _offsets(self, product: str) -> list:
+        """
+        double hashing 으로 Bloom filter 의 bit offset 을 계산한다
+        """
+        digest = hashlib.sha256(product.encode()).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:16], 'big') | 1
+
+        return [(h1 + i * h2) % self.settings['BITS'] for i in range(self.settings['HASHES'])]
+
+    def _ttl(self) -> int:
+        return self.settings['WINDOW'] * 2
+
+    def filter(self, items: list) -> tuple:
+        """
+        (url, keyword) 목록을 크롤링할 상품과 이미 크롤링한 상품 정보를 재사용할 상품으로 나눈다
+        크롤링할 상품은 (url, keyword), 재사용할 상품은 (product, keyword, url) 목록으로 반환한다
+        window 안에서 크롤링이 끝나지 않은 중복 상품은 크롤링 job 이 키워드를 함께 처리하므로 둘 다 포함하지 않는다
+        """
+        crawl = []
+        candidates = []
+        for url, keyword in items:
+            product = self.product_key(url)
+            if product:
+                candidates.append((product, url, keyword))
+            else:
+                crawl.append((url, keyword))
+
+        if not candidates:
+            return crawl, []
+
+        bucket = int(time.time() // self.settings['WINDOW'])
+        args = [self._ttl(), self.settings['HASHES']]
+        for product, _, _ in candidates:
+            args.extend(self._offsets(product))
+        seen = self.script(keys=[self.bloom_key.format(bucket=bucket), self.bloom_key.format(bucket=bucket - 1)],
+                           args=args)
+
+        # 크롤링 claim 을 얻은 상품은 Bloom filter 의 false positive 이거나 크롤링에 실패한 상품이므로 다시 크롤링한다
+        pipe = self.redis.pipeline(transaction=False)
+        for product, _, keyword in candidates:
+            keywords_key = self.keywords_key.format(product=product)
+            pipe.set(self.claim_key.format(product=product), 1, nx=True, ex=self._ttl())
+            pipe.sadd(keywords_key, keyword)
+            pipe.expire(keywords_key, self._ttl())
+            pipe.exists(self.document_key.format(product=product))
+        results = pipe.execute()
+
+        alias = []
+        for index, (product, url, keyword) in enumerate(candidates):
+            claimed = results[index * 4]
+            document_exists = results[index * 4 + 3]
+
+            if not seen[index] or claimed:
+                crawl.append((url, keyword))
+            elif document_exists:
+                alias.append((product, keyword, url))
+
+        return crawl, alias
+
+    def keywords(self, product: str) -> set:
+        return self.redis.smembers(self.keywords_key.format(product=product))
+
+    def release(self, product: str) -> None:
+        """
+        크롤링에 실패한 상품의 claim 을 지운다
+        Bloom filter 에서는 지울 수 없으므로, filter 에서 claim 이 없는 상품을 false positive 처럼 다시 크롤링하게 한다
+        키워드 목록은 남겨 두어, 크롤링을 기다리던 다른 키워드도 다시 크롤링하는 job 이 함께 저장한다
+        """
+        self.redis.delete(self.claim_key.format(product=product))
+
+    def store_document(self, product: str, product_info: dict) -> None:
+        """
+        키워드별 문서를 만들 수 있도록 크롤링한 상품 정보를 window 동안 저장한다
+        """
+        self.redis.set(self.document_key.format(product=product), json.dumps(product_info), ex=self._ttl())
+
+    def document(self, product: str) -> dict or None:
+        document = self.redis.get(self.document_key.format(product=product))
+        if not document:
+            return None
+
+        return json.loads(document)
+
+
+def keyword_document(product_info: dict, keyword: str) -> dict:
+    """
+    상품 정보로 키워드별 문서를 만든다
+    """
+    document = dict(product_info)
+    document['_id'] = f'{product_info["fkey"]}_{keyword}'
+    document['query'] = keyword
+
+    return document
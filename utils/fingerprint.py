@@ -0,0 +1,100 @@
+import time
+
+import config
+from connector.connector import RedisConnector
+from utils.revisit import fingerprint
+
+
+def product_fingerprint(product_info: dict) -> str:
+    """
+    상품명, 제조사, 가격정보로 상품 fingerprint 를 만든다. 크롤링 시간처럼 방문마다 바뀌는 값은 포함하지 않는다
+    """
+    name = product_info['productName']
+
+    # 상품명은 공백만 다른 경우를 같은 값으로 본다
+    return fingerprint({
+        'productName': ' '.join(name.split()) if isinstance(name, str) else name,
+        'brands': product_info['brands'],
+        'priceSummary': product_info['priceSummary']
+    })
+
+
+def review_fingerprint(danawa_review_count: int, mall_review_count: int) -> str:
+    return fingerprint([danawa_review_count, mall_review_count])
+
+
+class ProductFingerprint:
+    """
+    상품 fingerprint 와 리뷰 수 fingerprint, fingerprint 가 바뀐 후 저장한 키워드를 Redis 에 기록하여
+    다시 크롤링한 상품이 바뀌지 않았다면 상품 문서 저장과 리뷰 job 을 생략한다
+    """
+    product_key = 'fingerprint:product:{fid}'
+    keywords_key = 'fingerprint:keywords:{fid}'
+    reviews_key = 'fingerprint:reviews:{fid}'
+
+    def __init__(self, fid: str, redis=None, settings: dict = None):
+        self.settings = settings or config.FINGERPRINT
+        self.redis = redis or RedisConnector().conn()
+        self.product_key = self.product_key.format(fid=fid)
+        self.keywords_key = self.keywords_key.format(fid=fid)
+        self.reviews_key = self.reviews_key.format(fid=fid)
+
+    def check(self, product_hash: str, keywords: set) -> tuple:
+        """
+        (상품 변경 여부, 저장할 키워드, 리뷰 job 필요 여부)를 반환한다
+        바뀌지 않은 상품은 아직 저장하지 않은 키워드만 저장하고, 리뷰 수는 REVIEW_CHECK_INTERVAL 마다 확인한다
+        """
+        if not self.settings['ENABLED']:
+            return True, set(keywords), True
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.get(self.product_key)
+        pipe.smembers(self.keywords_key)
+        pipe.hget(self.reviews_key, 'checkedAt')
+        stored_hash, stored_keywords, review_checked_at = pipe.execute()
+
+        if stored_hash != product_hash:
+            return True, set(keywords), True
+
+        review_due = not review_checked_at or \
+            time.time() - float(review_checked_at) >= self.settings['REVIEW_CHECK_INTERVAL']
+
+        return False, set(keywords) - stored_keywords, review_due
+
+    def record_product(self, product_hash: str, keywords: set, changed: bool) -> None:
+        """
+        저장한 상품의 fingerprint 와 키워드를 기록한다
+        바뀌지 않은 상품은 만료 시간을 늘리지 않으므로, TTL 마다 한번은 모든 키워드 문서를 다시 저장한다
+        """
+        if not self.settings['ENABLED']:
+            return
+
+        pipe = self.redis.pipeline()
+        if changed:
+            pipe.delete(self.keywords_key)
+            pipe.set(self.product_key, product_hash, ex=self.settings['TTL'])
+        if keywords:
+            pipe.sadd(self.keywords_key, *keywords)
+            pipe.expire(self.keywords_key, self.settings['TTL'])
+        pipe.execute()
+
+    def reviews_changed(self, review_hash: str) -> bool:
+        """
+        마지막으로 기록한 리뷰 수 fingerprint 와 다른지 여부를 반환한다. 처음 확인하는 상품은 바뀐 것으로 본다
+        """
+        if not self.settings['ENABLED']:
+            return True
+
+        return self.redis.hget(self.reviews_key, 'hash') != review_hash
+
+    def record_reviews(self, review_hash: str) -> None:
+        """
+        리뷰 job 이 끝난 후 리뷰 수 fingerprint 와 확인 시간을 기록한다
+        """
+        if not self.settings['ENABLED']:
+            return
+
+        pipe = self.redis.pipeline()
+        pipe.hmset(self.reviews_key, {'hash': review_hash, 'checkedAt': time.time()})
+        pipe.expire(self.reviews_key, self.settings['TTL'])
+        pipe.execute()
@@ -0,0 +1,283 @@
+import os
+import time
+import bisect
+import socket
+import logging
+import threading
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import config
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ''
+
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Timer:
+    """
+    with 블록의 소요 시간을 histogram 에 기록한다. 예외가 발생해도 기록한다
+    """
+    __slots__ = ('metrics', 'name', 'labels', 'start')
+
+    def __init__(self, metrics: 'Metrics', name: str, labels: dict):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_null_timer = _NullTimer()
+
+
+class Metrics:
+    """
+    pipeline 단계(fetch, parse, extract, store, enqueue, job)별 소요 시간 histogram 과 횟수 counter 를 label 별로 집계한다
+    집계한 값은 Prometheus text 형식으로 노출하고, STATSD_HOST 가 설정되어 있으면 기록할 때마다 statsd 로도 보낸다
+    """
+    def __init__(self, settings: dict = None):
+        self.settings = settings or config.METRICS
+        self.enabled = self.settings['ENABLED']
+        self.buckets = tuple(self.settings['BUCKETS'])
+        self.prefix = self.settings['PREFIX']
+
+        # (name, label key): [bucket 별 횟수 목록, 합계]
+        self.histograms = {}
+        # (name, label key): 횟수
+        self.counters = {}
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._server = None
+
+        self._statsd = None
+        if self.settings['STATSD_HOST']:
+            self._statsd_address = (self.settings['STATSD_HOST'], self.settings['STATSD_PORT'])
+            self._statsd = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _check_fork(self) -> None:
+        """
+        fork 된 job 프로세스에서는 부모가 잡고 있던 lock 을 사용하지 않도록 새로 만든다
+        부모에서 집계한 값은 부모가 노출하므로, take 로 부모에 보낼 때 중복되지 않도록 비운다
+        """
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self._lock = threading.Lock()
+            self._server = None
+            self.histograms = {}
+            self.counters = {}
+
+    def _send(self, line: str, labels: dict) -> None:
+        # label 은 DogStatsD tag 형식으로 붙인다. UDP 이므로 전송 실패는 무시한다
+        if labels:
+            line = f'{line}|#' + ','.join(f'{name}:{value}' for name, value in labels.items())
+        try:
+            self._statsd.sendto(f'{self.prefix}.{line}'.encode(), self._statsd_address)
+        except OSError:
+            pass
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        if not self.enabled:
+            return
+
+        self._check_fork()
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            histogram[0][bisect.bisect_left(self.buckets, seconds)] += 1
+            histogram[1] += seconds
+
+        if self._statsd:
+            self._send(f'{name}:{seconds * 1000:.3f}|ms', labels)
+
+    def increment(self, name: str, value: int = 1, **labels) -> None:
+        if not self.enabled or not value:
+            return
+
+        self._check_fork()
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+        if self._statsd:
+            self._send(f'{name}:{value}|c', labels)
+
+    def timer(self, name: str, **labels):
+        """
+        with metrics().timer('parse', page='product'): 형식으로 블록의 소요 시간을 기록한다
+        """
+        if not self.enabled:
+            return _null_timer
+
+        return _Timer(self, name, labels)
+
+    def take(self) -> tuple:
+        """
+        이 프로세스에서 집계한 (histogram, counter) 를 반환하고 비운다
+        process pool 의 자식 프로세스에서 기록한 값을 결과와 함께 부모 프로세스로 보낼 때 사용한다
+        """
+        self._check_fork()
+        with self._lock:
+            taken = self.histograms, self.counters
+            self.histograms = {}
+            self.counters = {}
+
+        return taken
+
+    def merge(self, histograms: dict, counters: dict) -> None:
+        """
+        다른 프로세스에서 take 로 받은 값을 더한다. statsd 로는 기록한 프로세스에서 이미 보냈으므로 다시 보내지 않는다
+        """
+        self._check_fork()
+        with self._lock:
+            for key, (counts, total) in histograms.items():
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    self.histograms[key] = [list(counts), total]
+                    continue
+                for index, count in enumerate(counts):
+                    histogram[0][index] += count
+                histogram[1] += total
+
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def snapshot(self) -> list:
+        """
+        (name, labels, 횟수, 합계(초)) histogram 목록을 반환한다
+        """
+        with self._lock:
+            return [(name, dict(labels), sum(counts), total)
+                    for (name, labels), (counts, total) in sorted(self.histograms.items())]
+
+    def render(self) -> str:
+        """
+        Prometheus text exposition 형식으로 반환한다
+        histogram 은 {PREFIX}_{name}_seconds, counter 는 {PREFIX}_{name}_total 이름으로 노출한다
+        """
+        with self._lock:
+            histograms = sorted((key, (list(counts), total)) for key, (counts, total) in self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        lines = []
+        typed = set()
+        bounds = [repr(float(bound)) for bound in self.buckets] + ['+Inf']
+        for (name, labels), (counts, total) in histograms:
+            metric = f'{self.prefix}_{name}_seconds'
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f'# TYPE {metric} histogram')
+
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{_format_labels(labels, (("le", bound),))} {cumulative}')
+            lines.append(f'{metric}_sum{_format_labels(labels)} {total}')
+            lines.append(f'{metric}_count{_format_labels(labels)} {cumulative}')
+
+        for (name, labels), value in counters:
+            metric = f'{self.prefix}_{name}_total'
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric}{_format_labels(labels)} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+    def log(self) -> None:
+        """
+        histogram 별 횟수와 평균 시간을 로그로 남긴다. Prometheus 가 수집하기 전에 끝나는 검색 프로세스에서 사용한다
+        """
+        for name, labels, count, total in self.snapshot():
+            label_text = ' '.join(f'{key}={value}' for key, value in sorted(labels.items()))
+            logging.info(f'metrics | {name} | {label_text} | count: {count} | avg: {total / count * 1000:.2f}ms')
+
+    def serve(self, port: int = None) -> bool:
+        """
+        /metrics 로 Prometheus text 를 응답하는 HTTP 서버를 daemon thread 로 시작한다
+        job 마다 fork 하는 worker 는 job 이 끝나면 값이 사라지므로 PersistentConnectionWorker 나 statsd 를 사용한다
+        """
+        port = port if port is not None else self.settings['PROMETHEUS_PORT']
+        if not self.enabled or not port or self._server is not None:
+            return False
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+
+        self._server = Server(('', port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logging.info(f'metrics served on :{port}/metrics')
+
+        return True
+
+
+def proxy_label(proxy: str = None) -> str:
+    """
+    proxy label 값을 반환한다. PROXY_LABEL 이 꺼져 있으면 proxy 수만큼 series 가 늘어나지 않도록 사용 여부만 기록한다
+    """
+    if not proxy:
+        return 'direct'
+
+    return proxy if config.METRICS['PROXY_LABEL'] else 'proxy'
+
+
+_metrics = None
+
+
+def metrics() -> Metrics:
+    """
+    프로세스 전역 Metrics 를 반환한다
+    """
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+
+    return _metrics
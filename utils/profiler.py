@@ -0,0 +1,182 @@
+"""
+rq job 을 cProfile, tracemalloc 으로 profiling 하고, 여러 job 의 결과를 모아 hot spot 을 출력한다
+job meta 의 'profile'(cpu, memory, all) 이 있거나, PROFILE['SAMPLE_RATE'] 비율로 sampling 된 job 만 profiling 한다
+결과는 PROFILE['PATH'] 에 {함수명}.{job id}.pstats, {함수명}.{job id}.tracemalloc 파일로 저장한다
+
+queue.enqueue('worker.product_parser', url, keyword, meta={'profile': 'all'})
+DANAWA_PROFILE_RATE=0.01 DANAWA_PROFILE_MODE=all rq worker high low
+
+python -m utils.profiler --func product_parser --top 30
+python -m utils.profiler --memory --top 20
+"""
+import os
+import glob
+import time
+import random
+import pstats
+import cProfile
+import logging
+import argparse
+import functools
+import tracemalloc
+
+from rq import get_current_job
+
+import config
+from utils.metrics import metrics
+
+MODES = {
+    'cpu': ('cpu',),
+    'memory': ('memory',),
+    'all': ('cpu', 'memory')
+}
+
+
+def profile_mode(job, settings: dict = None) -> str or None:
+    """
+    job 을 profiling 할 방식을 반환한다. job meta 의 값을 먼저 따르고, 없으면 SAMPLE_RATE 비율로 MODE 를 반환한다
+    """
+    settings = settings or config.PROFILE
+
+    if job is not None and 'profile' in job.meta:
+        mode = job.meta['profile']
+        if mode is True:
+            return settings['MODE']
+        return mode or None
+
+    if settings['SAMPLE_RATE'] and random.random() < settings['SAMPLE_RATE']:
+        return settings['MODE']
+
+    return None
+
+
+def profile_name(func_name: str, job) -> str:
+    # job 없이 직접 호출한 경우에는 시각과 pid 로 구분한다
+    job_id = job.id if job is not None else f'{int(time.time() * 1000)}-{os.getpid()}'
+
+    return os.path.join(config.PROFILE['PATH'], f'{func_name}.{job_id}')
+
+
+def run_profiled(func, args: tuple, kwargs: dict, mode: str, name: str):
+    """
+    func 를 mode 에 따라 cProfile, tracemalloc 으로 실행하고 결과 파일을 저장한다
+    """
+    if mode not in MODES:
+        raise ValueError(f'unknown profile mode: {mode}')
+    kinds = MODES[mode]
+    os.makedirs(config.PROFILE['PATH'], exist_ok=True)
+
+    # 이미 tracemalloc 을 사용 중인 프로세스에서는 끄지 않는다
+    started_tracemalloc = 'memory' in kinds and not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start(config.PROFILE['TRACEMALLOC_FRAMES'])
+
+    profiler = cProfile.Profile() if 'cpu' in kinds else None
+    files = []
+    try:
+        if profiler:
+            profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if profiler:
+                profiler.disable()
+    finally:
+        # cProfile 결과를 저장하며 할당한 메모리가 포함되지 않도록 snapshot 을 먼저 저장한다
+        peak = ''
+        if 'memory' in kinds:
+            tracemalloc.take_snapshot().dump(f'{name}.tracemalloc')
+            files.append(f'{name}.tracemalloc')
+            peak = f' | peak: {tracemalloc.get_traced_memory()[1] / 1024:.1f}KB'
+            if started_tracemalloc:
+                tracemalloc.stop()
+
+        if profiler:
+            profiler.dump_stats(f'{name}.pstats')
+            files.append(f'{name}.pstats')
+
+        logging.info(f'job profiled | {mode}{peak} | {", ".join(files)}')
+
+
+def profiled(func):
+    """
+    job meta 나 sampling 으로 선택된 job 만 profiling 하고, 나머지 job 은 그대로 실행한다
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        job = get_current_job()
+        mode = profile_mode(job)
+        if not mode:
+            return func(*args, **kwargs)
+
+        metrics().increment('jobs_profiled', func=func.__name__, mode=mode)
+        name = profile_name(func.__name__, job)
+        try:
+            return run_profiled(func, args, kwargs, mode, name)
+        finally:
+            # 실패한 job 도 결과 파일을 job 에서 찾을 수 있도록 기록한다
+            if job is not None:
+                job.meta['profile_files'] = [f'{name}.{ext}' for ext in ('pstats', 'tracemalloc')
+                                             if os.path.exists(f'{name}.{ext}')]
+                job.save_meta()
+
+    return wrapper
+
+
+def profile_files(path: str, func: str, ext: str) -> list:
+    return sorted(glob.glob(os.path.join(path, f'{func or "*"}.*.{ext}')))
+
+
+def cpu_hot_spots(files: list, sort: str, top: int) -> None:
+    """
+    여러 job 의 cProfile 결과를 합쳐 sort 순으로 상위 top 개 함수를 출력한다
+    """
+    stats = pstats.Stats(*files)
+    print(f'cProfile: {len(files)} jobs | {stats.total_tt:.2f}s | {stats.total_tt / len(files) * 1000:.1f}ms/job')
+    # 합친 파일 이름을 모두 출력하지 않는다
+    stats.files = []
+    stats.sort_stats(sort).print_stats(top)
+
+
+def memory_hot_spots(files: list, top: int) -> None:
+    """
+    여러 job 의 tracemalloc snapshot 을 할당 위치(파일:줄) 별로 합쳐, job 당 평균 할당 크기 순으로 출력한다
+    """
+    spots = {}
+    snapshot_filters = [tracemalloc.Filter(False, tracemalloc.__file__),
+                        tracemalloc.Filter(False, cProfile.__file__),
+                        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+                        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>')]
+    for filename in files:
+        snapshot = tracemalloc.Snapshot.load(filename).filter_traces(snapshot_filters)
+        for stat in snapshot.statistics('lineno'):
+            frame = stat.traceback[0]
+            spot = spots.setdefault(f'{frame.filename}:{frame.lineno}', [0, 0, 0])
+            spot[0] += stat.size
+            spot[1] += stat.count
+            spot[2] += 1
+
+    print(f'tracemalloc: {len(files)} jobs')
+    for location, (size, count, jobs) in sorted(spots.items(), key=lambda item: -item[1][0])[:top]:
+        print(f'{size / len(files) / 1024:10.1f}KB/job | blocks: {count / len(files):10.1f}/job'
+              f' | jobs: {jobs:5} | {location}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='profiling 된 job 의 hot spot 을 합쳐서 출력한다')
+    parser.add_argument('--path', default=config.PROFILE['PATH'])
+    parser.add_argument('--func', help='job 함수명(eg. product_parser), 없으면 모든 job')
+    parser.add_argument('--memory', action='store_true', help='tracemalloc snapshot 을 집계한다')
+    parser.add_argument('--sort', default='cumulative', help='pstats 정렬 기준(cumulative, tottime, ncalls)')
+    parser.add_argument('--top', type=int, default=30)
+    args = parser.parse_args()
+
+    ext = 'tracemalloc' if args.memory else 'pstats'
+    found = profile_files(args.path, args.func, ext)
+    if not found:
+        raise SystemExit(f'no {ext} files in {args.path}')
+
+    if args.memory:
+        memory_hot_spots(found, args.top)
+    else:
+        cpu_hot_spots(found, args.sort, args.top)
@@ -1,29 +1,69 @@
-import requests
+import json
+import time
 import random
+import logging
+from urllib.parse import urlparse
 
+import requests
+
+import config
+from connector.connector import RedisConnector
+from utils.metrics import metrics
+
+
+def proxy_id(proxy_url: str) -> str:
+    """
+    인증 정보를 제외한 proxy 의 ip:port 를 반환한다
+    """
+    parsed_proxy = urlparse(proxy_url)
+
+    return f'{parsed_proxy.hostname}:{parsed_proxy.port}'
 
-class RandProxy:
-    def __init__(self, types=None):
-        self.token = ''
-        self.url = ''
-        self.proxy_list = self._proxy(types)
+
+def is_proxy_ok(status_code: int) -> bool:
+    """
+    proxy 차단이나 proxy 자체 오류로 볼 수 있는 응답 코드인지 확인한다
+    """
+    return status_code < 500 and status_code not in (403, 407, 429)
+
+
+class ProxyPool:
+    """
+    Proxy API 결과를 Redis 에 캐싱하고, proxy 별 응답 시간과 오류를 기록하여 점수순으로 선택하는 Proxy 풀
+    """
+    list_key = 'proxy:list:{types}'
+    lock_key = 'proxy:lock:{types}'
+    health_key = 'proxy:health:{bucket}'
+    cooldown_key = 'proxy:cooldown'
+
+    def __init__(self, types=None, redis=None, settings: dict = None):
+        self.types = types
+        self.settings = settings or config.PROXY
+        self.redis = redis or RedisConnector().conn()
+
+        # 프로세스 로컬 캐시
+        self.proxy_list = []
+        self.loaded_at = 0
+        self.health = {}
+        self.cooldown = set()
+        self.health_loaded_at = 0
 
     def _header(self) -> dict:
         """
         Requests Header Set
         """
         return {
-            'Authorization': 'Token ' + self.token,
+            'Authorization': 'Token ' + self.settings['API_TOKEN'],
         }
 
-    def _proxy(self, types) -> dict or None:
+    def _fetch(self) -> list or None:
         """
         API 로 모든 Proxy list 가져오기
         """
-        if types:
-            url = f'{self.url}?type={types}'
+        if self.types:
+            url = f'{self.settings["API_URL"]}?type={self.types}'
         else:
-            url = self.url
+            url = self.settings['API_URL']
 
         try:
             res = requests.get(url, headers=self._header(), timeout=5)
@@ -35,13 +75,172 @@ class RandProxy:
 
         return res
 
-    def get(self) -> dict:
+    def refresh(self) -> list:
+        """
+        Proxy API 를 호출하여 Redis 캐시를 갱신한다
+        """
+        proxy_list = self._fetch()
+        if proxy_list:
+            cached = {
+                'fetchedAt': time.time(),
+                'proxies': proxy_list
+            }
+            self.redis.set(self.list_key.format(types=self.types), json.dumps(cached), ex=self.settings['CACHE_TTL'])
+            self.proxy_list = proxy_list
+            self.loaded_at = time.time()
+
+        return proxy_list or []
+
+    def _refresh_stale(self) -> None:
+        """
+        캐시가 오래된 경우 Redis lock 을 획득한 프로세스 하나만 API 를 호출하여 갱신하고, 나머지는 기존 목록을 사용한다
+        rq 의 work horse 는 job 이 끝나면 종료되므로 thread 를 띄우지 않고 lock 을 획득한 요청에서 바로 갱신한다
+        """
+        try:
+            locked = self.redis.set(self.lock_key.format(types=self.types), 1, nx=True, ex=30)
+            if locked:
+                self.refresh()
+        except Exception as e:
+            logging.error(f'proxy list refresh failed: {repr(e)}')
+
+    def proxies(self) -> list:
+        """
+        로컬 캐시, Redis 캐시, Proxy API 순으로 proxy 목록을 가져온다
+        """
+        if self.proxy_list and time.time() - self.loaded_at < self.settings['LOCAL_TTL']:
+            return self.proxy_list
+
+        cached = self.redis.get(self.list_key.format(types=self.types))
+        if not cached:
+            # 캐시가 없는 최초 요청에만 API 를 직접 호출한다
+            return self.refresh()
+
+        cached = json.loads(cached)
+        if time.time() - cached['fetchedAt'] > self.settings['REFRESH_INTERVAL']:
+            self._refresh_stale()
+
+        self.proxy_list = cached['proxies']
+        self.loaded_at = time.time()
+
+        return self.proxy_list
+
+    def _bucket(self, offset=0) -> int:
+        return int(time.time() // self.settings['HEALTH_WINDOW']) - offset
+
+    def _load_health(self) -> None:
+        """
+        현재와 직전 window 의 proxy 상태와 cooldown 목록을 가져온다
         """
-        전체 Proxy 중 랜덤으로 선택하여 리턴
+        if time.time() - self.health_loaded_at < self.settings['HEALTH_TTL']:
+            return
+
+        now = time.time()
+        pipe = self.redis.pipeline()
+        pipe.hgetall(self.health_key.format(bucket=self._bucket()))
+        pipe.hgetall(self.health_key.format(bucket=self._bucket(1)))
+        pipe.zremrangebyscore(self.cooldown_key, '-inf', now)
+        pipe.zrangebyscore(self.cooldown_key, now, '+inf')
+        current, previous, _, cooldown = pipe.execute()
+
+        health = {}
+        for stats in (previous, current):
+            for field, value in stats.items():
+                health[field] = health.get(field, 0.0) + float(value)
+
+        self.health = health
+        self.cooldown = set(cooldown)
+        self.health_loaded_at = now
+
+    @staticmethod
+    def _proxy_key(proxy: dict) -> str:
+        return f'{proxy["ip"]}:{proxy["port"]}'
+
+    def score(self, proxy_id: str) -> float:
+        """
+        성공률을 평균 응답 시간으로 나눈 값을 점수로 사용한다
+        기록이 없는 proxy 는 기본 응답 시간으로 계산하여 한번씩 사용되도록 한다
+        """
+        ok = self.health.get(f'{proxy_id}:ok', 0.0)
+        err = self.health.get(f'{proxy_id}:err', 0.0)
+        latency = self.health.get(f'{proxy_id}:latency', 0.0)
+
+        success_rate = (ok + 1) / (ok + err + 2)
+        if ok:
+            avg_latency = latency / ok
+        else:
+            avg_latency = self.settings['DEFAULT_LATENCY']
+
+        return success_rate / max(avg_latency, 0.05)
+
+    def get(self) -> dict or None:
+        """
+        cooldown 중이 아닌 proxy 중 점수에 비례한 확률로 선택하여 리턴
+        사용할 수 있는 proxy 가 없으면 None 을 리턴하여 proxy 없이 요청한다
         """
+        proxy_list = self.proxies()
+        if not proxy_list:
+            metrics().increment('proxy_unavailable')
+            logging.warning(f'no proxy available(types: {self.types})')
+            return None
+
+        self._load_health()
+
+        candidates = [proxy for proxy in proxy_list if self._proxy_key(proxy) not in self.cooldown]
+        if not candidates:
+            # 모든 proxy 가 cooldown 중이라면 전체 목록에서 선택한다
+            candidates = proxy_list
+
+        weights = [self.score(self._proxy_key(proxy)) for proxy in candidates]
         secure_random = random.SystemRandom()
-        proxy = secure_random.choice(self.proxy_list)
+        proxy = secure_random.choices(candidates, weights=weights)[0]
 
         return {
             'http': f'{proxy["protocol"]}://{proxy["user"]}:{proxy["password"]}@{proxy["ip"]}:{proxy["port"]}'
         }
+
+    def report(self, proxies: dict, latency: float, ok: bool) -> None:
+        """
+        요청 결과를 기록한다. 실패한 proxy 는 cooldown 시간 동안 선택하지 않는다
+        """
+        for proxy_url in proxies.values():
+            reported_id = proxy_id(proxy_url)
+            key = self.health_key.format(bucket=self._bucket())
+
+            pipe = self.redis.pipeline(transaction=False)
+            if ok:
+                pipe.hincrby(key, f'{reported_id}:ok', 1)
+                pipe.hincrbyfloat(key, f'{reported_id}:latency', latency)
+            else:
+                pipe.hincrby(key, f'{reported_id}:err', 1)
+                pipe.zadd(self.cooldown_key, {reported_id: time.time() + self.settings['COOLDOWN']})
+                self.cooldown.add(reported_id)
+            pipe.expire(key, self.settings['HEALTH_WINDOW'] * 2)
+            pipe.execute()
+
+
+_proxy_pools = {}
+
+
+def proxy_pool(types=None) -> ProxyPool:
+    """
+    types 별로 프로세스 전역 ProxyPool 을 반환한다
+    """
+    if types not in _proxy_pools:
+        _proxy_pools[types] = ProxyPool(types)
+
+    return _proxy_pools[types]
+
+
+class RandProxy:
+    """
+    공유 ProxyPool 에서 proxy 를 선택하는 객체
+    proxy 목록은 ProxyPool 에서 관리하므로 생성 시 API 를 호출하지 않는다
+    """
+    def __init__(self, types=None):
+        self.types = types
+
+    def get(self) -> dict:
+        return proxy_pool(self.types).get()
+
+    def report(self, proxies: dict, latency: float, ok: bool) -> None:
+        proxy_pool(self.types).report(proxies, latency, ok)
@@ -0,0 +1,176 @@
+import time
+import asyncio
+import threading
+import contextlib
+
+import config
+from connector.connector import RedisConnector
+
+
+# 모든 bucket 에 토큰이 있는 경우에만 동시에 차감하고, 하나라도 부족하면 차감하지 않고 대기 시간을 반환한다
+# 여러 노드의 시간차를 없애기 위해 Redis 서버 시간을 사용한다
+TOKEN_BUCKET_SCRIPT = """
+if redis.replicate_commands then
+    redis.replicate_commands()
+end
+local now_time = redis.call('TIME')
+local now = tonumber(now_time[1]) + tonumber(now_time[2]) / 1000000
+
+local buckets = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2 - 1])
+    local capacity = tonumber(ARGV[i * 2])
+    local data = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(data[1]) or capacity
+    local ts = tonumber(data[2]) or now
+
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    if tokens < 1 then
+        wait = math.max(wait, (1 - tokens) / rate)
+    end
+    buckets[i] = {key, tokens, rate, capacity}
+end
+
+if wait > 0 then
+    return tostring(wait)
+end
+
+for i, bucket in ipairs(buckets) do
+    redis.call('HSET', bucket[1], 'tokens', tostring(bucket[2] - 1), 'ts', tostring(now))
+    redis.call('EXPIRE', bucket[1], math.ceil(bucket[4] / bucket[3]) + 60)
+end
+
+return '0'
+"""
+
+
+# deferrable job 안에서 실행 중인지와 job 의 재시도 횟수를 thread 별로 기록한다
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def deferring(retries: int = 0):
+    """
+    with 블록 안에서는 요청 토큰이나 서버 오류의 재시도를 기다리지 않고 RetryLater 를 발생시킨다
+    retries 는 job 이 서버 오류로 이미 다시 예약된 횟수이다
+    """
+    previous = getattr(_local, 'retries', None)
+    _local.retries = retries
+    try:
+        yield
+    finally:
+        _local.retries = previous
+
+
+def job_retries() -> int or None:
+    """
+    deferring 블록 안이면 job 의 재시도 횟수를, 밖이면 None 을 반환한다
+    """
+    return getattr(_local, 'retries', None)
+
+
+class RetryLater(Exception):
+    """
+    worker 에서 기다리지 않고 retry_after 초 후에 job 을 다시 실행해야 하는 경우 발생한다
+    retries 가 있으면 다시 예약한 job 의 재시도 횟수로 사용한다
+    """
+    def __init__(self, message: str, retry_after: float, retries: int = None):
+        self.retry_after = retry_after
+        self.retries = retries
+        super().__init__(message)
+
+
+class RateLimitExceeded(RetryLater):
+    """
+    허용된 대기 시간 안에 요청 토큰을 얻지 못한 경우 발생한다
+    """
+    def __init__(self, host, proxy, retry_after):
+        self.host = host
+        self.proxy = proxy
+        super().__init__(f'rate limit exceeded(host: {host}, proxy: {proxy}, retry after: {retry_after:.2f}s)',
+                         retry_after)
+
+
+class RateLimiter:
+    """
+    Redis 에 저장된 token bucket 으로 모든 프로세스와 노드에서 host 별, proxy 별 요청 수를 제한한다
+    """
+    host_key = 'ratelimit:host:{host}'
+    proxy_key = 'ratelimit:proxy:{proxy}'
+
+    def __init__(self, redis=None, settings: dict = None):
+        self.settings = settings or config.RATE_LIMIT
+        self.redis = redis or RedisConnector().conn()
+        self.script = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def _buckets(self, host: str, proxy: str = None) -> tuple:
+        keys = [self.host_key.format(host=host)]
+        args = [self.settings['HOST_RATE'], self.settings['HOST_BURST']]
+        if proxy:
+            keys.append(self.proxy_key.format(proxy=proxy))
+            args.extend([self.settings['PROXY_RATE'], self.settings['PROXY_BURST']])
+
+        return keys, args
+
+    def try_acquire(self, host: str, proxy: str = None) -> float:
+        """
+        토큰을 얻으면 0 을, 얻지 못하면 토큰이 채워질 때까지의 대기 시간(초)을 반환한다
+        """
+        keys, args = self._buckets(host, proxy)
+
+        return float(self.script(keys=keys, args=args))
+
+    def acquire(self, host: str, proxy: str = None, max_wait: float = None) -> float:
+        """
+        토큰을 얻을 때까지 기다린다. 대기 시간이 max_wait 를 넘는 경우 RateLimitExceeded 를 발생시킨다
+        max_wait 가 없으면 MAX_WAIT 를 사용하며, deferring 블록 안에서는 기다리지 않는다
+        """
+        if max_wait is None:
+            max_wait = 0 if job_retries() is not None else self.settings['MAX_WAIT']
+
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(host, proxy)
+            if not wait:
+                return waited
+
+            if waited + wait > max_wait:
+                raise RateLimitExceeded(host, proxy, wait)
+
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, host: str, proxy: str = None, max_wait: float = None) -> float:
+        """
+        acquire 와 같지만 event loop 를 막지 않도록 Redis 호출은 thread 에서 실행하고 asyncio.sleep 으로 기다린다
+        """
+        if max_wait is None:
+            max_wait = self.settings['MAX_WAIT']
+
+        loop = asyncio.get_event_loop()
+        waited = 0.0
+        while True:
+            wait = await loop.run_in_executor(None, self.try_acquire, host, proxy)
+            if not wait:
+                return waited
+
+            if waited + wait > max_wait:
+                raise RateLimitExceeded(host, proxy, wait)
+
+            await asyncio.sleep(wait)
+            waited += wait
+
+
+_rate_limiter = None
+
+
+def rate_limiter() -> RateLimiter:
+    """
+    프로세스 전역 RateLimiter 를 반환한다
+    """
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+
+    return _rate_limiter
@@ -0,0 +1,239 @@
+import json
+import math
+import time
+import hashlib
+from urllib.parse import urlparse, parse_qsl
+
+import config
+from connector.connector import RedisConnector
+
+
+def change_rate(visits: float, changes: float, observed: float) -> float:
+    """
+    방문 횟수와 변경이 확인된 횟수, 관찰 시간으로 초당 변경 횟수를 추정한다
+    한 방문 사이에 여러번 바뀐 경우를 보정하는 Cho & Garcia-Molina 의 추정식을 사용한다
+    """
+    if not visits or not observed:
+        return 0.0
+
+    return -math.log((visits - changes + 0.5) / (visits + 0.5)) * visits / observed
+
+
+def estimated_rate(visits: float, changes: float, observed: float, settings: dict = None) -> float:
+    """
+    INITIAL_INTERVAL 마다 절반의 확률로 바뀌는 PRIOR_VISITS 번의 방문을 더해 변경 빈도를 추정한다
+    방문 기록이 적은 상품이 변경 한번에 방문 간격이 크게 바뀌지 않도록 한다
+    """
+    settings = settings or config.REVISIT
+    prior = settings['PRIOR_VISITS']
+
+    return change_rate(visits + prior, changes + prior / 2, observed + prior * settings['INITIAL_INTERVAL'])
+
+
+# e^x = 1 + x + x^2 의 해. 방문 사이의 기대 변경 횟수가 이 값일 때 방문 간격 x / rate 가 가장 짧다
+SHORTEST_INTERVAL_CHANGES = 1.7932821329007602
+
+
+def _changes_per_visit(target: float) -> float:
+    """
+    1 - e^-x(1 + x) = target 의 해 x 를 구한다. target 은 SHORTEST_INTERVAL_CHANGES 의 값보다 작다
+    """
+    low, high = 0.0, SHORTEST_INTERVAL_CHANGES
+    for _ in range(50):
+        middle = (low + high) / 2
+        if 1 - math.exp(-middle) * (1 + middle) < target:
+            low = middle
+        else:
+            high = middle
+
+    return low
+
+
+def optimal_interval(rate: float, settings: dict = None) -> float:
+    """
+    변경 빈도에 따라 상품 정보가 최신인 시간 비율(freshness)을 가장 높이는 방문 간격을 구한다
+    모든 상품에 같은 Lagrange 승수 VISIT_COST 를 사용하여 1 - e^-x(1 + x) = rate * VISIT_COST 의 해 x 로 interval = x / rate 이다
+    이 해는 x 가 SHORTEST_INTERVAL_CHANGES 를 넘으면 자주 바뀌는 상품일수록 간격이 다시 길어지고 결국 방문하지 않으므로,
+    그보다 자주 바뀌는 상품은 방문 사이의 기대 변경 횟수를 SHORTEST_INTERVAL_CHANGES 로 두어 변경 빈도에 반비례하여 방문한다
+    """
+    settings = settings or config.REVISIT
+    if rate <= 0:
+        return settings['MAX_INTERVAL']
+
+    target = rate * settings['VISIT_COST']
+    if target >= 1 - math.exp(-SHORTEST_INTERVAL_CHANGES) * (1 + SHORTEST_INTERVAL_CHANGES):
+        return SHORTEST_INTERVAL_CHANGES / rate
+
+    return _changes_per_visit(target) / rate
+
+
+def next_interval(state: dict, changed: bool, elapsed: float, settings: dict = None) -> dict:
+    """
+    방문 결과를 반영한 상태와 다음 방문 간격을 반환한다
+    변경이 없으면 간격을 BACKOFF 배까지 늘리고, 변경이 있으면 SPEEDUP 배까지 줄인다
+    """
+    settings = settings or config.REVISIT
+    decay = settings['DECAY']
+
+    state = {
+        'visits': state.get('visits', 0.0) * decay + 1,
+        'changes': state.get('changes', 0.0) * decay + (1 if changed else 0),
+        'observed': state.get('observed', 0.0) * decay + elapsed,
+        'interval': state.get('interval', settings['INITIAL_INTERVAL'])
+    }
+
+    target = optimal_interval(estimated_rate(state['visits'], state['changes'], state['observed'], settings), settings)
+    interval = min(max(target, state['interval'] * settings['SPEEDUP']), state['interval'] * settings['BACKOFF'])
+    state['interval'] = min(max(interval, settings['MIN_INTERVAL']), settings['MAX_INTERVAL'])
+
+    return state
+
+
+def fingerprint(value) -> str:
+    return hashlib.md5(json.dumps(value, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+# 재방문 시간이 된 상품을 가져오면서 sorted set 에서 삭제하여, 여러 프로세스가 같은 상품을 중복으로 가져가지 않도록 한다
+POP_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(due) do
+    redis.call('ZREM', KEYS[1], member)
+end
+return due
+"""
+
+
+class RevisitScheduler:
+    """
+    상품별 가격정보와 리뷰 수가 마지막으로 바뀐 시간을 기록하고,
+    변경 빈도에 따라 다음 크롤링 시간을 정하여 Redis sorted set 으로 관리한다
+    """
+    state_key = 'revisit:state:{pcode}'
+    keywords_key = 'revisit:keywords:{pcode}'
+    queue_key = 'revisit:queue'
+
+    def __init__(self, redis=None, settings: dict = None):
+        self.settings = settings or config.REVISIT
+        self.redis = redis or RedisConnector().conn()
+        self.pop_due_script = self.redis.register_script(POP_DUE_SCRIPT)
+
+    @staticmethod
+    def pcode(url: str) -> str or None:
+        return dict(parse_qsl(urlparse(url).query)).get('pcode')
+
+    def _ttl(self) -> int:
+        return int(self.settings['MAX_INTERVAL'] * 2)
+
+    def _add_keywords(self, pipe, pcode: str, keywords) -> None:
+        keywords_key = self.keywords_key.format(pcode=pcode)
+        pipe.sadd(keywords_key, *keywords)
+        pipe.expire(keywords_key, self._ttl())
+
+    def _state(self, pcode: str) -> dict:
+        state = self.redis.hgetall(self.state_key.format(pcode=pcode))
+        for key in ('visits', 'changes', 'observed', 'interval', 'checkedAt', 'changedAt'):
+            if key in state:
+                state[key] = float(state[key])
+
+        return state
+
+    def record_crawl(self, pcode: str, url: str, keywords: set, price_fingerprint: str) -> float:
+        """
+        상품 크롤링 결과를 기록하고 다음 크롤링까지의 간격을 반환한다
+        """
+        now = time.time()
+        state = self._state(pcode)
+
+        mapping = {
+            'url': url,
+            'priceHash': price_fingerprint,
+            'checkedAt': now
+        }
+        if state:
+            changed = state.get('priceHash') != price_fingerprint
+            mapping.update(next_interval(state, changed, now - state['checkedAt'], self.settings))
+        else:
+            changed = True
+            mapping['interval'] = self.settings['INITIAL_INTERVAL']
+
+        if changed:
+            mapping['changedAt'] = now
+
+        key = self.state_key.format(pcode=pcode)
+        pipe = self.redis.pipeline()
+        pipe.hmset(key, mapping)
+        pipe.expire(key, self._ttl())
+        self._add_keywords(pipe, pcode, keywords)
+        pipe.zadd(self.queue_key, {pcode: now + mapping['interval']})
+        pipe.execute()
+
+        return mapping['interval']
+
+    def record_reviews(self, pcode: str, review_fingerprint: str) -> None:
+        """
+        리뷰 수가 바뀐 상품은 이번 방문을 변경으로 기록하고 다음 크롤링 시간을 다시 계산한다
+        """
+        state = self._state(pcode)
+        if not state:
+            return
+
+        key = self.state_key.format(pcode=pcode)
+        pipe = self.redis.pipeline()
+        pipe.hset(key, 'reviewHash', review_fingerprint)
+
+        # 처음 기록하는 리뷰 수와 가격정보 변경으로 이미 기록된 방문은 변경으로 다시 세지 않는다
+        review_changed = state.get('reviewHash', review_fingerprint) != review_fingerprint
+        if review_changed and state.get('changedAt') != state.get('checkedAt') and 'visits' in state:
+            now = time.time()
+            changes = min(state['changes'] + 1, state['visits'])
+            rate = estimated_rate(state['visits'], changes, state['observed'], self.settings)
+            interval = min(state['interval'], max(optimal_interval(rate, self.settings), self.settings['MIN_INTERVAL']))
+
+            pipe.hmset(key, {'changes': changes, 'interval': interval, 'changedAt': state['checkedAt']})
+            pipe.zadd(self.queue_key, {pcode: state['checkedAt'] + interval})
+        pipe.execute()
+
+    def filter(self, items: list) -> list:
+        """
+        검색된 (url, keyword) 중 처음 보는 상품과 재방문 시간이 된 상품만 반환한다
+        아직 재방문 시간이 아닌 상품의 키워드는 다음 크롤링 때 함께 저장하도록 기록한다
+        """
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        for url, _ in items:
+            pipe.zscore(self.queue_key, self.pcode(url) or '')
+        next_crawl_list = pipe.execute()
+
+        ret = []
+        pipe = self.redis.pipeline(transaction=False)
+        for (url, keyword), next_crawl in zip(items, next_crawl_list):
+            if next_crawl is None or next_crawl <= now:
+                ret.append((url, keyword))
+                continue
+
+            self._add_keywords(pipe, self.pcode(url), [keyword])
+        pipe.execute()
+
+        return ret
+
+    def pop_due(self, limit: int = None) -> list:
+        """
+        재방문 시간이 된 상품의 (url, keyword) 목록을 가져온다
+        """
+        limit = limit or self.settings['DISPATCH_BATCH']
+        due = self.pop_due_script(keys=[self.queue_key], args=[time.time(), limit])
+
+        pipe = self.redis.pipeline(transaction=False)
+        for pcode in due:
+            pipe.hget(self.state_key.format(pcode=pcode), 'url')
+            pipe.smembers(self.keywords_key.format(pcode=pcode))
+        states = pipe.execute()
+
+        ret = []
+        for url, keywords in zip(states[0::2], states[1::2]):
+            if not url:
+                continue
+            for keyword in sorted(keywords):
+                ret.append((url, keyword))
+
+        return ret
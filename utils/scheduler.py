@@ -0,0 +1,124 @@
+import pickle
+import logging
+import functools
+from random import uniform
+from datetime import timedelta
+
+from rq import Queue, get_current_job
+from rq.job import Job
+from rq_scheduler import Scheduler
+
+import config
+from utils.rate_limiter import RetryLater, deferring
+from utils.metrics import metrics
+
+
+class JobPayloadTooLarge(ValueError):
+    pass
+
+
+def check_job_payload(func, *args) -> int:
+    """
+    Redis 에 저장될 job 인자의 크기를 확인한다. 허용 크기를 넘으면 JobPayloadTooLarge 를 발생시킨다
+    """
+    size = len(pickle.dumps(args, protocol=pickle.HIGHEST_PROTOCOL))
+    if size > config.SCHEDULE['MAX_JOB_PAYLOAD']:
+        raise JobPayloadTooLarge(f'{func} job payload too large: {size} bytes')
+
+    return size
+
+
+def enqueue(queue: Queue, func, *args, job_timeout=None, result_ttl=None):
+    """
+    job 인자 크기를 확인한 후 queue 에 넣는다
+    """
+    check_job_payload(func, *args)
+
+    with metrics().timer('enqueue', queue=queue.name, func=func):
+        job = queue.enqueue(func, *args,
+                            job_timeout=job_timeout or config.SCHEDULE['JOB_TIMEOUT'],
+                            result_ttl=result_ttl or config.SCHEDULE['RESULT_TTL'])
+    metrics().increment('jobs_enqueued', queue=queue.name, func=func)
+
+    return job
+
+
+def enqueue_many(queue: Queue, func, args_list: list, job_timeout=None, result_ttl=None) -> int:
+    """
+    여러 job 을 하나의 Redis pipeline 으로 queue 에 넣고, 넣은 job 수를 반환한다
+    """
+    if not args_list:
+        return 0
+
+    job_timeout = job_timeout or config.SCHEDULE['JOB_TIMEOUT']
+    result_ttl = result_ttl or config.SCHEDULE['RESULT_TTL']
+    for args in args_list:
+        check_job_payload(func, *args)
+
+    with metrics().timer('enqueue', queue=queue.name, func=func):
+        # Queue.enqueue_many 를 지원하는 rq 버전에서는 그대로 사용한다
+        if hasattr(queue, 'enqueue_many'):
+            jobs = [Queue.prepare_data(func, args=args, timeout=job_timeout, result_ttl=result_ttl)
+                    for args in args_list]
+            enqueued = len(queue.enqueue_many(jobs))
+        else:
+            with queue.connection.pipeline() as pipe:
+                for args in args_list:
+                    job = Job.create(func, args=args, connection=queue.connection,
+                                     timeout=job_timeout, result_ttl=result_ttl, origin=queue.name)
+                    queue.enqueue_job(job, pipeline=pipe)
+                pipe.execute()
+            enqueued = len(args_list)
+    metrics().increment('jobs_enqueued', enqueued, queue=queue.name, func=func)
+
+    return enqueued
+
+
+def enqueue_in(queue: Queue, seconds: float, func, *args, job_timeout=None, result_ttl=None, meta: dict = None):
+    """
+    rq-scheduler 로 seconds 초 후에 실행될 job 을 예약한다
+    worker 는 대기하지 않고 다른 job 을 처리할 수 있다
+    예약한 job 은 rqscheduler 프로세스가 queue 에 넣으므로 worker 와 함께 실행해야 한다(Dockerfile 참고)
+    """
+    check_job_payload(func, *args)
+
+    scheduler = Scheduler(queue=queue, connection=queue.connection)
+
+    # 같은 시각에 예약된 job 이 한번에 실행되지 않도록 지연 시간을 조금씩 분산한다
+    seconds = seconds + uniform(0, seconds * config.SCHEDULE['JITTER'])
+
+    with metrics().timer('enqueue', queue=queue.name, func=func):
+        job = scheduler.enqueue_in(timedelta(seconds=seconds), func, *args,
+                                   timeout=job_timeout or config.SCHEDULE['JOB_TIMEOUT'],
+                                   job_result_ttl=result_ttl or config.SCHEDULE['RESULT_TTL'], meta=meta)
+    metrics().increment('jobs_scheduled', queue=queue.name, func=func)
+
+    return job
+
+
+def deferrable(func):
+    """
+    요청 한도를 넘거나 서버 오류가 발생해 RetryLater 가 발생한 job 을 실패 처리하지 않고,
+    retry_after 초 이후로 같은 인자로 다시 예약한다
+    job 안에서는 토큰이나 재시도를 기다리지 않으므로 worker 는 대기하지 않고 다른 job 을 처리한다
+    서버 오류의 재시도 횟수는 job meta 에 기록하여 다시 예약한 job 에서도 HTTP['RETRY_TOTAL'] 을 넘지 않도록 한다
+    """
+    @functools.wraps(func)
+    def wrapper(*args):
+        job = get_current_job()
+        retries = job.meta.get('retries', 0) if job is not None else 0
+        try:
+            # 단계별 시간의 합과 비교하여 기록되지 않은 대기 시간을 확인할 수 있도록 job 전체 시간을 기록한다
+            with metrics().timer('job', func=func.__name__), deferring(retries):
+                return func(*args)
+        except RetryLater as e:
+            metrics().increment('jobs_deferred', func=func.__name__, reason=type(e).__name__)
+            if job is None:
+                raise
+
+            queue = Queue(job.origin, connection=job.connection)
+            meta = {'retries': retries if e.retries is None else e.retries}
+            enqueue_in(queue, e.retry_after, f'{func.__module__}.{func.__name__}', *args, meta=meta)
+            logging.info(f'{func.__name__} deferred {e.retry_after:.2f}s | {repr(e)}')
+
+    return wrapper
@@ -0,0 +1,211 @@
+import os
+import time
+import logging
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import config
+from utils.proxy import proxy_pool, proxy_id, is_proxy_ok
+from utils.rate_limiter import rate_limiter, job_retries, RetryLater
+from utils.metrics import metrics, proxy_label
+
+
+class SessionPool:
+    """
+    프로세스 단위로 공유하는 HTTP Session 풀
+    (proxy, host) 조합마다 Session 을 하나씩 두어 keep-alive 연결을 재사용한다
+    """
+    def __init__(self, settings: dict = None):
+        self.settings = settings or config.HTTP
+        self.sessions = {}
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _timeout(self) -> tuple:
+        return self.settings['CONNECT_TIMEOUT'], self.settings['READ_TIMEOUT']
+
+    def _adapter(self) -> HTTPAdapter:
+        # 응답 상태에 따른 재시도는 요청 한도를 다시 확인하도록 request 에서 하므로, adapter 는 연결 오류만 재시도한다
+        retry = Retry(total=self.settings['RETRY_TOTAL'],
+                      read=0,
+                      status=0,
+                      backoff_factor=self.settings['RETRY_BACKOFF_FACTOR'],
+                      raise_on_status=False)
+
+        return HTTPAdapter(pool_connections=self.settings['POOL_CONNECTIONS'],
+                           pool_maxsize=self.settings['POOL_MAXSIZE'],
+                           max_retries=retry)
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = self._adapter()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        return session
+
+    def _check_fork(self) -> None:
+        """
+        fork 된 자식 프로세스에서는 부모의 소켓을 공유하지 않도록 Session 을 새로 만든다
+        """
+        if self.pid != os.getpid():
+            self.sessions = {}
+            self.pid = os.getpid()
+            self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url: str, proxies: dict = None) -> tuple:
+        parsed_url = urlparse(url)
+        proxy = None
+        if proxies:
+            proxy = proxies.get(parsed_url.scheme)
+
+        return proxy, parsed_url.netloc
+
+    def session(self, url: str, proxies: dict = None) -> requests.Session:
+        self._check_fork()
+        key = self.key(url, proxies)
+
+        session = self.sessions.get(key)
+        if session is None:
+            with self._lock:
+                session = self.sessions.get(key)
+                if session is None:
+                    session = self._new_session()
+                    self.sessions[key] = session
+
+        return session
+
+    def request(self, method: str, url: str, proxies: dict = None, endpoint: str = None,
+                **kwargs) -> requests.Response:
+        """
+        endpoint 는 요청 시간 metric 의 label 이며, 없으면 host 를 사용한다
+        stream=True 요청의 시간은 header 를 받을 때까지이며, 본문을 읽는 시간은 포함하지 않는다
+        RETRY_STATUS_FORCELIST 의 응답은 RETRY_TOTAL 번까지 다시 요청하며, 재시도마다 요청 한도의 토큰을 얻는다
+        deferrable job 안에서는 backoff 를 기다리지 않고 RetryLater 를 발생시켜 job 을 다시 예약한다
+        """
+        kwargs.setdefault('timeout', self._timeout())
+        session = self.session(url, proxies)
+
+        proxy, host = self.key(url, proxies)
+        proxy = proxy_id(proxy) if proxy else None
+        endpoint = endpoint or host
+
+        # job 안에서는 다시 예약된 횟수부터 센다
+        retries = job_retries()
+        retry = retries or 0
+        while True:
+            response = self._send(session, method, url, proxies, host, proxy, endpoint, **kwargs)
+            if response.status_code not in self.settings['RETRY_STATUS_FORCELIST'] \
+                    or retry >= self.settings['RETRY_TOTAL']:
+                return response
+
+            response.close()
+            backoff = self.settings['RETRY_BACKOFF_FACTOR'] * (2 ** retry)
+            retry += 1
+            if retries is not None:
+                raise RetryLater(f'{method} {url} responded {response.status_code}', backoff, retry)
+
+            time.sleep(backoff)
+
+    def _send(self, session: requests.Session, method: str, url: str, proxies: dict, host: str, proxy: str,
+              endpoint: str, **kwargs) -> requests.Response:
+        # 모든 프로세스가 공유하는 host, proxy 별 요청 한도를 확인한다
+        waited = rate_limiter().acquire(host, proxy)
+        metrics().observe('rate_limit_wait', waited, endpoint=endpoint)
+
+        start = time.time()
+        try:
+            response = session.request(method, url, proxies=proxies, **kwargs)
+        except requests.RequestException as e:
+            elapsed = time.time() - start
+            metrics().observe('fetch', elapsed, endpoint=endpoint, proxy=proxy_label(proxy))
+            metrics().increment('fetch_errors', endpoint=endpoint, proxy=proxy_label(proxy), status=type(e).__name__)
+            if proxies:
+                proxy_pool().report(proxies, elapsed, False)
+            raise
+
+        # proxy 별 응답 시간과 오류를 기록하여 proxy 선택에 반영한다
+        elapsed = time.time() - start
+        metrics().observe('fetch', elapsed, endpoint=endpoint, proxy=proxy_label(proxy))
+        if response.status_code >= 400:
+            metrics().increment('fetch_errors', endpoint=endpoint, proxy=proxy_label(proxy),
+                                status=response.status_code)
+        if proxies:
+            proxy_pool().report(proxies, elapsed, is_proxy_ok(response.status_code))
+
+        return response
+
+    def get(self, url: str, proxies: dict = None, endpoint: str = None, **kwargs) -> requests.Response:
+        return self.request('GET', url, proxies=proxies, endpoint=endpoint, **kwargs)
+
+    def post(self, url: str, proxies: dict = None, endpoint: str = None, **kwargs) -> requests.Response:
+        return self.request('POST', url, proxies=proxies, endpoint=endpoint, **kwargs)
+
+    @staticmethod
+    def _connection_pools(session: requests.Session) -> list:
+        """
+        Session 에 마운트된 adapter 에서 urllib3 connection pool 목록을 가져온다
+        """
+        pools = []
+        adapter = session.get_adapter('http://')
+        managers = [adapter.poolmanager] + list(adapter.proxy_manager.values())
+        for manager in managers:
+            for pool_key in manager.pools.keys():
+                pools.append(manager.pools.get(pool_key))
+
+        return pools
+
+    def stats(self) -> list:
+        """
+        pool 별 요청 수와 신규 연결 수, 재사용 횟수를 반환한다
+        """
+        ret = []
+        for (proxy, host), session in list(self.sessions.items()):
+            requests_count = 0
+            connections_count = 0
+            for pool in self._connection_pools(session):
+                requests_count += pool.num_requests
+                connections_count += pool.num_connections
+
+            # 로그에 proxy 인증 정보가 남지 않도록 host 만 기록한다
+            proxy_host = urlparse(proxy).hostname if proxy else None
+            ret.append({
+                'proxy': proxy_host,
+                'host': host,
+                'requests': requests_count,
+                'connections': connections_count,
+                'reused': max(requests_count - connections_count, 0)
+            })
+
+        return ret
+
+    def log_stats(self) -> None:
+        for stat in self.stats():
+            logging.info(f'session pool | proxy: {stat["proxy"]} | host: {stat["host"]}'
+                         f' | requests: {stat["requests"]} | connections: {stat["connections"]}'
+                         f' | reused: {stat["reused"]}')
+
+    def close(self) -> None:
+        with self._lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}
+
+
+_session_pool = None
+
+
+def session_pool() -> SessionPool:
+    """
+    프로세스 전역 SessionPool 을 반환한다
+    """
+    global _session_pool
+    if _session_pool is None:
+        _session_pool = SessionPool()
+
+    return _session_pool
@@ -1,11 +1,19 @@
+import functools
+
 from random_user_agent.user_agent import UserAgent
 from random_user_agent.params import SoftwareName, OperatingSystem
 
 
-def random_user_agent() -> str:
+@functools.lru_cache(maxsize=1)
+def user_agent_rotator() -> UserAgent:
+    """
+    user agent 목록을 읽는 데 수십 ms 가 걸리므로 프로세스마다 한번만 생성한다
+    """
     software_names = [SoftwareName.CHROME.value]
     operating_systems = [OperatingSystem.WINDOWS.value, OperatingSystem.MAC_OS_X.value]
 
-    user_agent_rotator = UserAgent(software_names=software_names, operating_systems=operating_systems, limit=100)
+    return UserAgent(software_names=software_names, operating_systems=operating_systems, limit=100)
 
-    return user_agent_rotator.get_random_user_agent()
+
+def random_user_agent() -> str:
+    return user_agent_rotator().get_random_user_agent()
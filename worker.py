@@ -1,27 +1,59 @@
-import re
 import time
-from random import uniform
+import logging
+import functools
+import itertools
 from datetime import datetime
 
-from bs4 import BeautifulSoup
+from pymongo.errors import BulkWriteError
 from rq import Queue
 
+import config
 from danawa.crawler import DanawaCrawler
-from connector.connector import MongoDBConnector
+from danawa.extractor import extractor
+from danawa.stream import stream_reviews
+from connector.connector import MongoDBConnector, registry
+from connector.sink import product_sink
+from connector.archive import archive_key, archive_page, archive_tee
+from utils.cursor import ReviewCursor
+from utils.dedupe import ProductDedupe, keyword_document
+from utils.fingerprint import ProductFingerprint, product_fingerprint, review_fingerprint
 from utils.hash import generator_chash
+from utils.revisit import RevisitScheduler, fingerprint
+from utils.scheduler import enqueue, enqueue_in, deferrable
+from utils.rate_limiter import RetryLater
+from utils.session import session_pool
+from utils.metrics import metrics
+from utils.profiler import profiled
 
 
-# comment Queue
+# product, comment Queue
+productQueue = Queue('high')
 commentQueue = Queue('low')
 
+# MongoDB 중복키 오류 코드
+DUPLICATE_KEY_ERROR = 11000
 
+
+@deferrable
+@profiled
 def product_parser(url, keyword):
     """
     개별 상품 페이지를 파싱하여 저장한다
+    크롤링에 실패하면 dedupe claim 을 지워, window 안에 다시 검색된 키워드가 기다리던 키워드와 함께 크롤링되도록 한다
     """
-    # 상품 페이지 파싱 전 딜레이를 준다
-    time.sleep(uniform(45, 60))
-
+    try:
+        crawl_product(url, keyword)
+    except RetryLater:
+        # 같은 인자로 다시 예약되므로 claim 을 유지한다
+        raise
+    except Exception:
+        product = ProductDedupe.product_key(url)
+        if product:
+            ProductDedupe().release(product)
+        raise
+
+
+def crawl_product(url, keyword):
     dc = DanawaCrawler()
 
     # 빈 링크인 경우 함수를 종료한다
@@ -32,131 +64,21 @@ def product_parser(url, keyword):
     # 상품 상세 주소가 다른 사이트로 연결 시킨다면 함수를 중지한다
     if main_html.url.startswith('http://prod.danawa.com/bridge/'):
         return
-    else:
-        main_html_bs = BeautifulSoup(main_html.content, 'lxml')
 
-    # 크롤링 시작 시간
-    crawlAtTimestamp = int(time.mktime((datetime.now()).timetuple()))
+    archive_page('product', archive_key(dc.pcode), main_html.content, url)
 
-    # 상품 이름 파싱
-    try:
-        product_name = main_html_bs.find('div', {'class': 'top_summary'}).find('h3').get_text()
-    except AttributeError:
-        product_name = None
+    page_extractor = extractor()
+    with metrics().timer('parse', page='product'):
+        product_document = page_extractor.document(main_html.content, 'product')
+    with metrics().timer('extract', page='product'):
+        product_page = page_extractor.product_page(product_document)
 
-    # 상품 등록월 파싱
-    try:
-        product_registration_month = main_html_bs.find('div', {'class': 'summary_info'})\
-            .find('div', {'class': 'detail_summary'})\
-            .find('div', {'class': 'thumb_area'})\
-            .find('div', {'class': 'made_info'})\
-            .find('span', {'class': 'txt'})\
-            .get_text()
-    except AttributeError:
-        product_registration = None
-    else:
-        try:
-            product_registration_month = product_registration_month.split(':')[1].strip()
-        except IndexError:
-            product_registration = None
-        else:
-            product_registration = int(time.mktime(datetime.strptime(product_registration_month, '%Y.%m').timetuple()))
-
-    # 상품 제조사 파싱
-    try:
-        product_maker = main_html_bs.find('div', {'class': 'summary_info'})\
-            .find('div', {'class': 'detail_summary'})\
-            .find('div', {'class': 'thumb_area'})\
-            .find('span', {'id': 'makerTxtArea'})\
-            .get_text(strip=True)
-    except AttributeError:
-        product_maker = None
-    else:
-        try:
-            product_maker = product_maker.split(':')[1].strip()
-        except:
-            product_maker = None
+    # 크롤링 시작 시간
+    crawlAtTimestamp = int(time.mktime((datetime.now()).timetuple()))
 
     # 상품 가격비교 요청과 상품 상세정보를 가져오기 위한 Script 내의 변수 파싱
-    try:
-        scripted_data = main_html_bs.find_all('script', {'src': False})
-    except AttributeError:
-        raise AttributeError('Script parse failed...stopped parse product')
-    else:
-        unscripted_data = dc.parsed_html_script(scripted_data)
-
-    # 상품 페이지의 가격순위 Summary 파싱
-    lowest_list = []
-    try:
-        price_lowest_summary = main_html_bs.find('div', {'class': 'lowest_area'}) \
-            .find('div', {'class': 'lowest_list'}) \
-            .find('table', {'class': 'lwst_tbl'}) \
-            .find('tbody', {'class': 'high_list'}) \
-            .find_all('tr')
-    except AttributeError:
-        # 가격정보가 없는 상품의 경우 빈 값으로 채우고, 필드는 유지한다
-        lowest_list.append({
-            'mall': None,
-            'price': None,
-            'shipping': None,
-            'benefit': None,
-            'option': None,
-            'summary_rank': None}
-        )
-    else:
-        for summary_rank, lowest in enumerate(price_lowest_summary, 1):
-            if lowest.get('class'):
-                option = lowest.get('class')[0].strip()
-            else:
-                option = None
-
-            try:
-                mall = lowest.find('td', {'class': 'mall'}).find('img')['alt'].strip()
-            except AttributeError:
-                try:
-                    mall = lowest.find('td', {'class': 'mall'})\
-                        .find('div', {'class': 'logo_over'})\
-                        .find('a').get_text(strip=True)
-                except AttributeError:
-                    mall = None
-            except TypeError:
-                try:
-                    mall = lowest.find('td', {'class': 'mall'}) \
-                        .find('div', {'class': 'logo_over'}) \
-                        .find('a').get_text(strip=True)
-                except AttributeError:
-                    mall = None
-
-            try:
-                price = lowest.find('td', {'class': 'price'}).find('span', {'class': 'txt_prc'}).find('em').get_text().strip()
-            except AttributeError:
-                price = None
-            else:
-                price = price.replace(',', '').replace('원', '')
-
-            try:
-                shipping = lowest.find('td', {'class': 'ship'}).find('span', {'class': 'stxt'}).get_text().strip()
-            except AttributeError:
-                shipping = None
-            else:
-                shipping = shipping.replace(',', '').replace('원', '')
-
-            if lowest.find('td', {'class': 'bnfit'}).find('a'):
-                benefit = lowest.find('td', {'class': 'bnfit'}).find('a').get_text().strip()
-            else:
-                benefit = None
-
-            obj = {
-                'mall': mall,
-                'price': price,
-                'shipping': shipping,
-                'benefit': benefit,
-                'option': option,
-                'summary_rank': summary_rank
-            }
-            lowest_list.append(obj)
-
-    price_summary = lowest_list
+    unscripted_data = dc.parsed_html_script(product_page['scripts'])
+    price_summary = product_page['priceSummary']
 
     # foreign key 용도의 id 생성
     fid = f'{dc.pcode}_{dc.cate}'
@@ -187,158 +109,421 @@ def product_parser(url, keyword):
         '_id': product_uid,
         'fkey': fid,
         'query': keyword,
-        'brands': product_maker,
-        'productName': product_name,
+        'brands': product_page['brands'],
+        'productName': product_page['productName'],
         'priceSummary': price_summary,
-        'publishedAtTimestamp': product_registration,
+        'publishedAtTimestamp': product_page['publishedAtTimestamp'],
         'crawlAtTimestamp': crawlAtTimestamp,
         'sectionCategory': sectionCategory,
         'category': category,
         'subCategory': subCategory
     }
 
-    conn = MongoDBConnector().conn()
-    collection = conn['']['']
-
-    # 상품 정보 - Upsert MongoDB
-    collection.replace_one({'_id': product_info['_id']}, product_info, upsert=True)
+    # 같은 상품을 검색한 다른 키워드의 문서도 함께 저장한다
+    # 이후 검색되는 키워드가 상품 정보를 재사용할 수 있도록 키워드 목록보다 먼저 상품 정보를 저장한다
+    keywords = {keyword}
+    dedupe = ProductDedupe()
+    product = dedupe.product_key(url)
+    if product:
+        dedupe.store_document(product, product_info)
+        keywords |= dedupe.keywords(product)
+
+    # 가격정보 변경 여부로 다음 크롤링 시간을 정한다
+    RevisitScheduler().record_crawl(dc.pcode, url, keywords, fingerprint(price_summary))
+
+    # 상품명, 제조사, 가격정보가 바뀌지 않았다면 아직 저장하지 않은 키워드 문서만 저장한다
+    product_hash = product_fingerprint(product_info)
+    product_changes = ProductFingerprint(fid)
+    changed, changed_keywords, review_due = product_changes.check(product_hash, keywords)
+    metrics().increment('products_changed' if changed else 'products_unchanged')
+    metrics().increment('product_writes_skipped', len(keywords) - len(changed_keywords))
+
+    # 상품 정보 - 버퍼에 모아서 Bulk Upsert MongoDB
+    # fingerprint 는 키워드 문서가 모두 저장된 후 기록하여, 저장에 실패한 상품을 바뀌지 않은 상품으로 건너뛰지 않는다
+    sink = product_sink()
+    sink.add_many([keyword_document(product_info, product_keyword) for product_keyword in changed_keywords],
+                  on_stored=functools.partial(product_changes.record_product, product_hash, changed_keywords, changed))
+    # 기본 rq worker 는 job 마다 fork 한 프로세스를 종료하므로 job 이 끝나기 전에 저장한다
+    if not registry.persistent:
+        sink.flush()
 
     # 코맨트 파싱은 별도로 처리하기 위해 큐에 삽입한다
-    commentQueue.enqueue('worker.comment_scrape_and_save', dc, fid, job_timeout=43200, result_ttl=86400)
+    # 크롤러 객체 대신 상품 descriptor 만 전달하여 worker 에서 크롤러를 다시 생성한다
+    # 바뀌지 않은 상품은 REVIEW_CHECK_INTERVAL 마다 리뷰 수를 확인한다
+    if review_due:
+        enqueue(commentQueue, 'worker.comment_scrape_and_save', dc.descriptor(), fid)
+    else:
+        metrics().increment('review_jobs_skipped')
+
+    session_pool().log_stats()
+
+
+@profiled
+def product_alias(product, keyword, url=None):
+    """
+    window 안에 이미 크롤링한 상품은 상품 페이지를 다시 요청하지 않고 저장된 상품 정보로 키워드 문서를 저장한다
+    저장된 상품 정보가 만료되었거나 없다면 키워드가 빠지지 않도록 상품 페이지를 크롤링한다
+    """
+    product_info = ProductDedupe().document(product)
+    if not product_info:
+        if url:
+            enqueue(productQueue, 'worker.product_parser', url, keyword)
+        else:
+            logging.warning(f'{product} alias document not found | {keyword}')
+        return
+
+    sink = product_sink()
+    sink.add(keyword_document(product_info, keyword))
+    if not registry.persistent:
+        sink.flush()
+
 
+def review_counter_id(fkey, source) -> str:
+    return f'{fkey}:{source}'
 
-def comment_save(danawa_comment_list, fkey, collection):
+
+def stored_review_filter(fkey, source) -> dict:
     """
-    댓글을 MongoDB 에 있는지 검사한 후 insert 한다
+    (fkey, source) 의 저장된 댓글을 찾는 조건
+    source 필드가 없던 기존 댓글은 review 필드로 다나와 리뷰('danawa')와 쇼핑몰 리뷰(쇼핑몰명)를 구분한다
     """
+    if source == 'danawa':
+        legacy_filter = {'source': {'$exists': False}, 'review': 'danawa'}
+    else:
+        legacy_filter = {'source': {'$exists': False}, 'review': {'$exists': True, '$nin': ['danawa', None]}}
+
+    return {'fkey': fkey, '$or': [{'source': source}, legacy_filter]}
+
+
+def review_counter(collection, counter_collection, fkey, source) -> dict:
+    """
+    (fkey, source) 별로 저장된 댓글 수와 가장 최근 댓글 hash 를 counter 문서에서 가져온다
+    counter 가 없거나, 댓글 insert 후 counter 를 증가시키지 못한 채 job 이 중단된 경우(dirty)에는
+    저장된 댓글 수를 다시 세어 counter 를 맞춘다
+    """
+    counter = counter_collection.find_one({'_id': review_counter_id(fkey, source)})
+    if counter and 'count' in counter and not counter.get('dirty'):
+        return counter
+
+    stored_count = collection.count_documents(stored_review_filter(fkey, source))
+    counter_collection.update_one({'_id': review_counter_id(fkey, source)},
+                                  {'$set': {'count': stored_count}, '$unset': {'dirty': ''}}, upsert=True)
+    if counter and counter.get('dirty'):
+        logging.info(f'{fkey} {source} review counter reconciled: {counter.get("count")} -> {stored_count}')
+
+    counter = dict(counter or {'_id': review_counter_id(fkey, source)}, count=stored_count)
+    counter.pop('dirty', None)
+
+    return counter
+
+
+def comment_save(danawa_comment_list, fkey, source, collection, counter_collection) -> tuple:
+    """
+    페이지 단위로 댓글 hash 를 생성하여 한번에 insert 한다
+    이미 저장된 댓글은 중복키 오류로 확인하고 무시하며, insert 된 개수만큼 댓글 counter 를 증가시킨다
+    insert 된 댓글 수와 중복 댓글 수를 반환한다
+    """
+    crawlAtTimestamp = int(time.mktime((datetime.now()).timetuple()))
+
+    documents = {}
     for danawa_comment in danawa_comment_list:
         # 댓글의 comment hash 값을 생성한다
         chash = generator_chash(danawa_comment, fkey)
 
-        # 댓글이 존재하지 않는 경우 insert 한다
-        if not collection.find_one({'_id': chash}):
-            danawa_comment['_id'] = chash
-            danawa_comment['fkey'] = fkey
-            danawa_comment['crawlAtTimestamp'] = int(time.mktime((datetime.now()).timetuple()))
+        danawa_comment['_id'] = chash
+        danawa_comment['fkey'] = fkey
+        danawa_comment['source'] = source
+        danawa_comment['crawlAtTimestamp'] = crawlAtTimestamp
+        documents[chash] = danawa_comment
 
-            collection.insert_one(danawa_comment)
+    # 같은 페이지 안에서 hash 가 같은 댓글은 중복으로 센다
+    duplicate_count = len(danawa_comment_list) - len(documents)
+    if not documents:
+        return 0, duplicate_count
 
+    # insert 와 counter 증가 사이에 job 이 중단되면 다음 review_counter 에서 다시 세도록 표시한다
+    counter_id = review_counter_id(fkey, source)
+    counter_collection.update_one({'_id': counter_id}, {'$set': {'dirty': True}}, upsert=True)
+    try:
+        with metrics().timer('store', target='review'):
+            result = collection.insert_many(list(documents.values()), ordered=False)
+    except BulkWriteError as e:
+        write_errors = e.details['writeErrors']
+        # 중복키 오류가 아닌 오류가 있다면 그대로 발생시킨다
+        if any(error['code'] != DUPLICATE_KEY_ERROR for error in write_errors):
+            raise
+
+        inserted_count = e.details['nInserted']
+        duplicate_count += len(write_errors)
+    else:
+        inserted_count = len(result.inserted_ids)
 
-def comment_scrape_and_save(dc, fid):
-    """
-    상품의 다나와 리뷰와 쇼핑몰 리뷰를 크롤링하여 저장한다
-    """
-    conn = MongoDBConnector().conn()
-    collection = conn['']['']
+    counter_collection.update_one({'_id': counter_id}, {'$inc': {'count': inserted_count}, '$unset': {'dirty': ''}},
+                                  upsert=True)
 
-    # 상품 리뷰: 다나와 리뷰 파싱
-    danawa_review_html = dc.read_danawa_review()
-    danawa_review_bs = BeautifulSoup(danawa_review_html.content, 'lxml')
+    metrics().increment('comments_inserted', inserted_count, source=source)
+    metrics().increment('comments_duplicated', duplicate_count, source=source)
+
+    return inserted_count, duplicate_count
 
-    # 다나와 리뷰와 쇼핑몰 리뷰 카운팅
-    danawa_review_count = 0
-    mall_review_count = 0
-
-    review_tab_check = danawa_review_bs.find('div', {'class': 'sub_tab sub_tab_v2'}).find_all('li', {'class': 'tab_item'})
-    if review_tab_check:
-        for review in review_tab_check:
-            danawa_tab = review.find('a', {'id': 'danawa-prodBlog-productOpinion-button-tab-productOpinion'})
-            mall_tab = review.find('a', {'id': 'danawa-prodBlog-productOpinion-button-tab-companyReview'})
-            if danawa_tab:
-                try:
-                    danawa_review_count = danawa_tab.find('span', {'class': 'cen_w'}).strong.get_text()
-                except AttributeError:
-                    continue
-                else:
-                    danawa_review_count = danawa_review_count.replace(',', '')
-
-            if mall_tab:
-                try:
-                    mall_review_count = mall_tab.find('span', {'class': 'cen_w'}).strong.get_text()
-                except AttributeError:
-                    continue
-                else:
-                    mall_review_count = mall_review_count.replace(',', '')
-
-    # 이 상품에 대한 저장된 댓글의 개수를 가져온다
-    collection_danawa_comment_count = collection.find({'fkey': fid, 'source': 'danawa'}).count()
 
+def review_page_count(review_count: int, stored_count: int) -> int:
+    """
+    저장된 댓글 수와 리뷰 수의 차이로 크롤링할 페이지 수를 계산한다
+    """
     # 댓글 수가 저장된 개수와 차이가 없거나, 저장된 댓글이 더 많은 경우 추가로 요청하지 않는다
-    if collection_danawa_comment_count >= int(danawa_review_count):
-        pass
+    if stored_count >= review_count:
+        return 0
+
+    diff_comment_count = review_count - stored_count
+    page_size = config.REVIEW['PAGE_SIZE']
+    if diff_comment_count % page_size != 0:
+        return int(diff_comment_count / page_size) + 1
     else:
-        diff_danawa_comment_count = int(danawa_review_count) - int(collection_danawa_comment_count)
-        # 댓글 크롤링을 위한 페이지 수 설정
-        if int(diff_danawa_comment_count) % 10 != 0:
-            comment_page_count = int(int(diff_danawa_comment_count)/10) + 1
-        else:
-            comment_page_count = int(int(diff_danawa_comment_count)/10)
+        return int(diff_comment_count / page_size)
 
-        # 댓글 페이지 수에 따른 최대 Limit 수 조정
-        dc.comment_page_limit = comment_page_count
 
-        page = 1
+def comment_batches(comments, size: int):
+    """
+    댓글 목록이나 ReviewStream 을 size 개씩 나누어 반환한다
+    """
+    comments = iter(comments)
+    while True:
+        batch = list(itertools.islice(comments, size))
+        if not batch:
+            return
 
-        # Page 1부터 댓글 파싱
-        while page <= dc.comment_page_limit:
-            # page 1은 댓글 카운팅을 위해 요청하였으니 추가로 요청하지 않는다
-            if not page == 1:
-                danawa_review_html = dc.read_danawa_review(page=page)
-                danawa_review_bs = BeautifulSoup(danawa_review_html.content, 'lxml')
+        yield batch
 
-            danawa_review_check = danawa_review_bs.find('div', {'class': 'danawa_review'})
-            if danawa_review_check:
-                comment_list = danawa_review_check.find('div', {'class': 'post_comments'})\
-                    .find('ul')\
-                    .find_all('li', id=re.compile('^danawa-prodBlog-productOpinion-list-self-\d+$'))
 
-                danawa_comment_inner_list = dc.parsed_danawa_review(comment_list)
-                comment_save(danawa_comment_inner_list, fid, collection)
+def save_review_page(comments, fid, source, page, limit, collection, counter_collection) -> bool:
+    """
+    리뷰 페이지의 댓글을 저장하고, 다음 페이지를 계속 크롤링할지 여부를 반환한다
+    리뷰는 최신순으로 요청하므로 incremental 모드에서는 이미 저장된 댓글만 있는 페이지에서 중단한다
+    comments 는 ReviewStream 일 수 있으므로 REVIEW['SAVE_BATCH'] 개씩 읽으며 저장한다
+    """
+    incremental = config.REVIEW['INCREMENTAL']
+
+    newest_comment = None
+    newest_chash = None
+    comment_count = 0
+    inserted_count = 0
+    duplicate_count = 0
+    for batch in comment_batches(comments, config.REVIEW['SAVE_BATCH']):
+        if page == 1 and newest_comment is None:
+            newest_comment = batch[0]
+            newest_chash = generator_chash(newest_comment, fid)
+            counter = counter_collection.find_one({'_id': review_counter_id(fid, source)}, {'newestChash': True})
+            # 가장 최근 댓글이 마지막 크롤링 때와 같다면 새 댓글이 없으므로 저장하지 않는다
+            if incremental and counter and counter.get('newestChash') == newest_chash:
+                logging.info(f'{fid} {source} review newest comment unchanged')
+                return False
+
+        batch_inserted_count, batch_duplicate_count = comment_save(batch, fid, source, collection, counter_collection)
+        comment_count += len(batch)
+        inserted_count += batch_inserted_count
+        duplicate_count += batch_duplicate_count
+
+    logging.info(f'{fid} {source} review page: {page} of {limit}'
+                 f' | inserted: {inserted_count} | duplicates: {duplicate_count}')
+
+    if newest_chash:
+        counter_collection.update_one({'_id': review_counter_id(fid, source)},
+                                      {'$set': {'newestChash': newest_chash,
+                                                'newestAtTimestamp': newest_comment['publishedAtTimestamp']}},
+                                      upsert=True)
+
+    if incremental and comment_count and not inserted_count:
+        return False
+
+    return True
+
+
+def crawler(descriptor) -> DanawaCrawler:
+    """
+    job 인자로 받은 descriptor 로 크롤러를 생성한다
+    이전 버전에서 크롤러 객체를 그대로 넣은 job 도 처리한다
+    """
+    if isinstance(descriptor, DanawaCrawler):
+        # 이전 버전 크롤러는 proxy 등 바뀐 속성을 갖고 있지 않으므로, 상품 정보만 가져와 크롤러를 다시 생성한다
+        legacy = vars(descriptor)
+        descriptor = {key: legacy.get(key) for key in DanawaCrawler.descriptor_keys}
+        descriptor['v'] = DanawaCrawler.descriptor_version
 
-            else:
-                # 계산된 page 수 범위안에 있으나, 실제 댓글 페이지가 비어 있는 경우 Loop 탈출
-                if 'NO_CONTENT' in danawa_review_bs.find('body').get_text(strip=True):
-                    break
+    return DanawaCrawler.from_descriptor(descriptor)
 
-            page += 1
-            # 크롤링 시 딜레이를 준다
-            time.sleep(uniform(60, 65))
 
-    # 상품 리뷰: 쇼핑몰 리뷰 파싱
+def schedule_review_page(dc, fid, source, page, limit, owner) -> None:
+    """
+    리뷰 페이지 cursor 를 저장하고, 다음 페이지 job 을 지연 시간 이후로 예약한다
+    owner 는 cursor 를 가져간 job chain 으로, 다음 페이지 job 에 그대로 전달한다
+    """
+    cursor = ReviewCursor(fid, source)
+    if page > limit:
+        cursor.clear()
+        return
 
-    # 이 상품에 대한 저장된 댓글의 개수를 가져온다
-    collection_mall_comment_count = collection.find({'fkey': fid, 'source': 'mall'}).count()
+    cursor.set(page, limit, owner)
+    enqueue_in(commentQueue, config.SCHEDULE['REVIEW_PAGE_DELAY'],
+               'worker.review_page_scrape', dc.descriptor(), fid, source, page, limit, owner)
 
-    if collection_mall_comment_count >= int(mall_review_count):
-        pass
-    else:
-        diff_mall_comment_count = int(mall_review_count) - int(collection_mall_comment_count)
 
-        # 댓글 크롤링을 위한 페이지 수 설정
-        if int(diff_mall_comment_count) % 10 != 0:
-            comment_page_count = int(int(diff_mall_comment_count)/10) + 1
-        else:
-            comment_page_count = int(int(diff_mall_comment_count)/10)
+@deferrable
+@profiled
+def comment_scrape_and_save(descriptor, fid):
+    """
+    상품의 다나와 리뷰와 쇼핑몰 리뷰 개수를 확인하여 크롤링할 페이지 수를 계산하고,
+    페이지 단위 job 을 예약한다
+    """
+    dc = crawler(descriptor)
 
-        # 댓글 페이지 수에 따른 최대 Limit 수 조정
-        dc.comment_page_limit = comment_page_count
+    conn = MongoDBConnector().conn()
+    collection = conn['']['']
+    counter_collection = conn['']['review_counters']
 
-        # 오른쪽 부분의 상품 댓글 파싱
-        # 댓글 페이지에서 최초 Page 1에 대한 댓글 파싱
-        page = 1
+    # 상품 리뷰: 다나와 리뷰 파싱
+    danawa_review_html = dc.read_danawa_review()
+    archive_page('danawa_review', archive_key(dc.pcode, 1), danawa_review_html.content, danawa_review_html.url)
+
+    page_extractor = extractor()
+    with metrics().timer('parse', page='danawa_review'):
+        danawa_review_document = page_extractor.document(danawa_review_html.content, 'danawa_review')
 
-        # Page 1부터 댓글 파싱
-        while page <= dc.comment_page_limit:
-            mall_review_html = dc.read_mall_review(page)
-            mall_review_bs = BeautifulSoup(mall_review_html.content, 'lxml')
+    # 다나와 리뷰와 쇼핑몰 리뷰 카운팅
+    with metrics().timer('extract', page='review_counts'):
+        danawa_review_count, mall_review_count = page_extractor.review_counts(danawa_review_document)
+
+    # 리뷰 수가 바뀐 상품은 다음 크롤링 시간을 앞당긴다
+    review_hash = review_fingerprint(danawa_review_count, mall_review_count)
+    RevisitScheduler().record_reviews(dc.pcode, review_hash)
+
+    product_changes = ProductFingerprint(fid)
+    reviews_changed = product_changes.reviews_changed(review_hash)
+    if not reviews_changed:
+        metrics().increment('reviews_unchanged')
+
+    for source, review_count in (('danawa', danawa_review_count), ('mall', mall_review_count)):
+        cursor = ReviewCursor(fid, source)
+
+        # 이미 진행 중인 리뷰 크롤링이 있다면 새로 예약하지 않는다
+        if cursor.is_running():
+            continue
+
+        # 중단된 cursor 가 있다면 저장된 페이지부터 이어서 진행한다
+        # 다시 예약되어 대기 중인 이전 chain 의 job 은 owner 가 바뀌었으므로 실행되지 않는다
+        stopped_cursor = cursor.get()
+        if stopped_cursor:
+            owner = cursor.claim(stopped_cursor['page'], stopped_cursor['limit'], stopped_cursor['owner'])
+            if owner:
+                schedule_review_page(dc, fid, source, stopped_cursor['page'], stopped_cursor['limit'], owner)
+            continue
+
+        # 리뷰 수가 마지막 확인 때와 같다면 저장된 댓글 수를 조회하지 않는다
+        if not reviews_changed:
+            continue
+
+        # 이 상품에 대한 저장된 댓글의 개수를 가져온다
+        counter = review_counter(collection, counter_collection, fid, source)
+        comment_page_count = review_page_count(review_count, counter['count'])
+        if not comment_page_count:
+            continue
+
+        # 이전에 크롤링한 상품은 이미 저장된 페이지에서 중단하므로,
+        # 삭제된 리뷰 등으로 개수가 맞지 않는 경우를 위해 한 페이지를 더 허용한다
+        if config.REVIEW['INCREMENTAL'] and counter.get('newestChash'):
+            comment_page_count += 1
+
+        # 같은 상품을 동시에 확인한 다른 job 이 먼저 시작했다면 새로 예약하지 않는다
+        owner = cursor.claim(1, comment_page_count)
+        if not owner:
+            continue
 
-            comment_list = mall_review_bs.find('div', {'class': 'mall_review'})\
-                .find('div', {'class': 'area_right'})\
-                .find('ul', {'class': 'rvw_list'})\
-                .find_all('li')
+        page = 1
+        # 다나와 리뷰 page 1은 댓글 카운팅을 위해 요청하였으니 바로 저장한다
+        if source == 'danawa':
+            with metrics().timer('extract', page='danawa_review'):
+                danawa_comment_inner_list = page_extractor.danawa_review(danawa_review_document)
+            if danawa_comment_inner_list is None:
+                cursor.clear()
+                continue
+            if not save_review_page(danawa_comment_inner_list, fid, source, page, comment_page_count,
+                                    collection, counter_collection):
+                cursor.clear()
+                continue
+            page = 2
+
+        schedule_review_page(dc, fid, source, page, comment_page_count, owner)
+
+    # 리뷰 페이지를 예약한 후에 기록하여, 실패한 job 은 다음 크롤링에서 리뷰 수가 바뀐 것으로 보고 다시 확인한다
+    product_changes.record_reviews(review_hash)
+
+    session_pool().log_stats()
+
+
+@deferrable
+@profiled
+def review_page_scrape(descriptor, fid, source, page, limit, owner=None):
+    """
+    리뷰 페이지를 REVIEW_PAGE_BATCH 개씩 크롤링하여 저장하고 다음 페이지를 예약한다
+    cursor 를 다른 chain 이 가져간 경우 이어서 진행하지 않는다
+    """
+    if not ReviewCursor(fid, source).owned_by(owner):
+        metrics().increment('review_chain_superseded', source=source)
+        return
 
-            danawa_comment_inner_list = dc.parsed_mall_review(comment_list)
-            comment_save(danawa_comment_inner_list, fid, collection)
+    dc = crawler(descriptor)
 
-            page += 1
-            time.sleep(uniform(60, 65))
+    conn = MongoDBConnector().conn()
+    collection = conn['']['']
+    counter_collection = conn['']['review_counters']
+
+    page_extractor = extractor()
+    stream = config.PARSER['STREAM_REVIEWS']
+    last_page = min(page + config.SCHEDULE['REVIEW_PAGE_BATCH'] - 1, limit)
+    while page <= last_page:
+        if source == 'danawa':
+            review_html = dc.read_danawa_review(page=page, stream=stream)
+        else:
+            review_html = dc.read_mall_review(page, stream=stream)
+
+        with review_html:
+            page_type = f'{source}_review'
+            if stream:
+                # 응답을 chunk 단위로 읽으며 댓글 li 가 닫힐 때마다 저장할 댓글을 반환한다
+                comment_inner_list = stream_reviews(review_html, page_type, config.PARSER['STREAM_CHUNK_SIZE'],
+                                                    archive_tee(page_type, archive_key(dc.pcode, page), review_html.url))
+            else:
+                archive_page(page_type, archive_key(dc.pcode, page), review_html.content, review_html.url)
+                with metrics().timer('parse', page=page_type):
+                    review_document = page_extractor.document(review_html.content, page_type)
+                with metrics().timer('extract', page=page_type):
+                    if source == 'danawa':
+                        comment_inner_list = page_extractor.danawa_review(review_document)
+                    else:
+                        comment_inner_list = page_extractor.mall_review(review_document)
+
+            # 댓글 페이지가 비어 있다면 남은 페이지를 예약하지 않는다
+            if comment_inner_list is None:
+                ReviewCursor(fid, source).clear()
+                return
+
+            saved = save_review_page(comment_inner_list, fid, source, page, limit, collection, counter_collection)
+            # 스트리밍 페이지는 저장하며 파싱하므로, 저장과 응답 대기를 제외한 파싱, 추출 시간을 따로 기록한다
+            if stream:
+                metrics().observe('parse', comment_inner_list.seconds, page=f'{source}_review_stream')
+
+            # 이미 저장된 댓글만 있는 페이지라면 남은 페이지를 예약하지 않는다
+            if not saved:
+                ReviewCursor(fid, source).clear()
+                return
+
+        # 스트리밍으로 읽은 페이지는 모두 읽은 후에 댓글이 없는 페이지인지 알 수 있다
+        if stream and comment_inner_list.empty:
+            ReviewCursor(fid, source).clear()
+            return
+
+        page += 1
+
+    schedule_review_page(dc, fid, source, page, limit, owner)
+
+    session_pool().log_stats()